@@ -31,6 +31,46 @@ def create_app():
     login_manager.init_app(app)
     login_manager.login_view = "auth.login"
 
+    # 公開一覧などの描画済み HTML キャッシュ
+    from app.services.cache_service import page_cache
+    page_cache.init_app(app)
+
+    # 閲覧・コピー数のバッファ（ワーカーごとに溜めてまとめて DB に反映）
+    from app.services.stats_service import template_stats
+    template_stats.init_app(app)
+
+    # GET で書き込まないための、チェックリスト要約の再計算キュー
+    from app.services.summary_queue import summary_queue
+    summary_queue.init_app(app)
+
+    # AI によるプラン生成ジョブ（リクエストのワーカーを AI の応答待ちで塞がない）
+    from app.services.plan_job_service import plan_jobs
+    plan_jobs.init_app(app)
+
+    # 同じ条件の AI 生成結果を使い回すキャッシュ
+    from app.services.ai_cache import ai_cache
+    ai_cache.init_app(app)
+
+    # Gemini のクライアントとモデルをプロセス内で使い回す
+    from app.services.gemini_client import gemini_client
+    gemini_client.init_app(app)
+
+    # AI の生成を行うプロバイダ（AI_PROVIDER: gemini / stub）
+    from app.services.ai_provider import ai_provider
+    ai_provider.init_app(app)
+
+    # AI 呼び出しごとの時間・サイズ・結果の計測
+    from app.services.ai_metrics import ai_metrics
+    ai_metrics.init_app(app)
+
+    # AI 呼び出しの流量制限（全ワーカー共通）
+    from app.services.ai_limiter import ai_limiter
+    ai_limiter.init_app(app)
+
+    # プラン作成直後の持ち物リストの先読み
+    from app.services.checklist_prefetch import checklist_prefetch
+    checklist_prefetch.init_app(app)
+
     # --- 循環参照を防ぐため、ここ(関数内)でモデルとBlueprintをインポート ---
     
     # Userモデルのインポート (user_loaderのため)
@@ -1,6 +1,7 @@
 # app/forms/plan_form.py
 from flask_wtf import FlaskForm
 from wtforms import (
+    BooleanField,
     StringField,
     TextAreaField,
     DateField,
@@ -62,4 +63,7 @@ class PlanCreateForm(FlaskForm):
         ],
         option_widget=widgets.CheckboxInput(),
         widget=widgets.ListWidget(prefix_label=False),
-    )
\ No newline at end of file
+    )
+
+    # 同じ条件の生成結果があっても使わずに AI で作り直す
+    regenerate = BooleanField("同じ条件でも新しく作り直す", default=False)
@@ -1,3 +1,3 @@
 from app.models.user import User
-from app.models.plan import Plan,TransportSnapshot,HotelSnapshot,Schedule,Template,Share
-from app.models.checklist import Checklist,ChecklistItem,Item,Category
+from app.models.plan import Plan,TransportSnapshot,HotelSnapshot,Schedule,Template,Share,TemplateSearchDocument,Tag,TemplateTag,TemplateStats,PlanGenerationJob,AIGenerationCacheEntry,AICallMetric
+from app.models.checklist import Checklist,ChecklistItem,Item,Category,ChecklistSummaryJob
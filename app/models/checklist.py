@@ -1,5 +1,11 @@
 from app.extensions import db
 
+# 先読み（app/services/checklist_prefetch.py）で作ったチェックリストの状態。
+# 利用者が生成ボタンを押すまでは一覧・詳細・コピーの対象にしない
+CHECKLIST_PREFETCHING = "prefetching"
+CHECKLIST_PREFETCHED = "prefetched"
+PREFETCH_STATUSES = (CHECKLIST_PREFETCHING, CHECKLIST_PREFETCHED)
+
 class Checklist(db.Model):
     __tablename__ = "checklists"
 
@@ -74,4 +80,17 @@ class Category(db.Model):
     updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now(), nullable=False)
 
     items = db.relationship("Item", back_populates="category")
-    checklist_items = db.relationship("ChecklistItem", back_populates="category")
\ No newline at end of file
+    checklist_items = db.relationship("ChecklistItem", back_populates="category")
+
+class ChecklistSummaryJob(db.Model):
+    """
+    テンプレートのチェックリスト要約（checklist_summary_json）の再計算待ち。
+    plan_id ごとに 1 行だけ持ち、app/services/summary_queue.py のワーカーが処理して削除する。
+    """
+    __tablename__ = "checklist_summary_jobs"
+
+    plan_id = db.Column(db.Integer, db.ForeignKey("plans.id", ondelete="CASCADE"), primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    last_error = db.Column(db.Text)
+    enqueued_at = db.Column(db.DateTime, server_default=db.func.now(), nullable=False, index=True)
@@ -1,6 +1,7 @@
 # app/models/plan.py
 from datetime import datetime
 from app.extensions import db
+from sqlalchemy import DDL, event, func, literal_column
 from sqlalchemy.ext.mutable import MutableDict
 
 class Plan(db.Model):
@@ -11,7 +12,7 @@ class Plan(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), nullable=False)
     
     title = db.Column(db.String(255), nullable=False, default="無題のプラン")
-    destination = db.Column(db.String(255), nullable=False)
+    destination = db.Column(db.String(255), nullable=False, index=True)
     departure = db.Column(db.String(255), nullable=False)
     start_date = db.Column(db.Date, nullable=False)
     days = db.Column(db.Integer, nullable=False)
@@ -40,6 +41,12 @@ class Plan(db.Model):
 
 class Template(db.Model):
     __tablename__ = 'templates'
+    __table_args__ = (
+        # 公開一覧のキーセットページング (visibility, created_at, template_id) 用
+        db.Index("ix_templates_visibility_created_at_id", "visibility", "created_at", "template_id"),
+        # 公開一覧の日数ファセット（絞り込み・件数集計）用
+        db.Index("ix_templates_visibility_days", "visibility", "days"),
+    )
 
     # 定義書 No.1: templateId
     template_id = db.Column(db.Integer, primary_key=True)
@@ -85,6 +92,13 @@ class Template(db.Model):
     flag_b = db.Column(db.Boolean, default=False)
     publish_date = db.Column(db.Date)
 
+    # 一覧カード用の要約（保存・交通手段/宿泊先の選択時に更新）
+    summary_transport = db.Column(db.String(255))
+    summary_transport_type = db.Column(db.String(50))
+    summary_hotel_name = db.Column(db.String(255))
+    summary_hotel_price = db.Column(db.Integer)
+    summary_stay_locations = db.Column(db.JSON)
+
     # 定義書 No.12: displayVersion
     display_version = db.Column(db.Integer, default=1, nullable=False)
 
@@ -95,6 +109,104 @@ class Template(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     
     shares = db.relationship("Share", back_populates="template", cascade="all, delete-orphan")
+    search_document = db.relationship(
+        "TemplateSearchDocument", back_populates="template", uselist=False, cascade="all, delete-orphan"
+    )
+    # tags（カンマ区切り）を正規化したもの。公開一覧のタグ絞り込みに使う
+    tag_links = db.relationship("TemplateTag", back_populates="template", cascade="all, delete-orphan")
+    # 閲覧・コピー数と人気スコア（app/services/stats_service.py で集計）
+    stats = db.relationship("TemplateStats", back_populates="template", uselist=False, cascade="all, delete-orphan")
+
+
+class Tag(db.Model):
+    __tablename__ = "tags"
+
+    tag_id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False, unique=True)
+
+    template_links = db.relationship("TemplateTag", back_populates="tag")
+
+
+class TemplateTag(db.Model):
+    __tablename__ = "template_tags"
+    __table_args__ = (
+        # タグ → テンプレートの絞り込み・件数集計用
+        db.Index("ix_template_tags_tag_id_template_id", "tag_id", "template_id"),
+    )
+
+    template_id = db.Column(
+        db.Integer, db.ForeignKey("templates.template_id", ondelete="CASCADE"), primary_key=True
+    )
+    tag_id = db.Column(db.Integer, db.ForeignKey("tags.tag_id", ondelete="CASCADE"), primary_key=True)
+
+    template = db.relationship("Template", back_populates="tag_links")
+    tag = db.relationship("Tag", back_populates="template_links")
+
+
+class TemplateStats(db.Model):
+    """
+    テンプレートの閲覧数・コピー数と時間減衰つきの人気スコア。
+    score は log(Σ 重み × 2^((発生時刻 - 基準時刻) / 半減期)) で、新しいイベントほど大きく効く。
+    値が時刻とともに単調に増えるだけなので、再計算しなくても score の大小がそのまま人気順になる。
+    """
+    __tablename__ = "template_stats"
+    __table_args__ = (
+        # 公開一覧の人気順キーセットページング (score, template_id) 用
+        db.Index("ix_template_stats_score_template_id", "score", "template_id"),
+    )
+
+    template_id = db.Column(
+        db.Integer, db.ForeignKey("templates.template_id", ondelete="CASCADE"), primary_key=True
+    )
+    view_count = db.Column(db.Integer, nullable=False, default=0)
+    copy_count = db.Column(db.Integer, nullable=False, default=0)
+    score = db.Column(db.Float, nullable=False, default=0.0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    template = db.relationship("Template", back_populates="stats")
+
+
+class TemplateSearchDocument(db.Model):
+    """テンプレート検索用の n-gram トークン（app/services/search_service.py で生成）"""
+    __tablename__ = "template_search_documents"
+
+    template_id = db.Column(
+        db.Integer, db.ForeignKey("templates.template_id", ondelete="CASCADE"), primary_key=True
+    )
+    tokens = db.Column(db.Text, nullable=False, default="")
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    template = db.relationship("Template", back_populates="search_document")
+
+
+# PostgreSQL: tokens の tsvector に GIN インデックスを張る
+db.Index(
+    "ix_template_search_documents_tsv",
+    func.to_tsvector(literal_column("'simple'"), TemplateSearchDocument.tokens),
+    postgresql_using="gin",
+).ddl_if(dialect="postgresql")
+
+# SQLite: FTS5 の外部コンテンツテーブルとトリガーで tokens を全文検索できるようにする
+TEMPLATE_SEARCH_FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS template_search_fts USING fts5("
+    "tokens, content='template_search_documents', content_rowid='template_id')",
+    "CREATE TRIGGER IF NOT EXISTS template_search_documents_ai AFTER INSERT ON template_search_documents BEGIN "
+    "INSERT INTO template_search_fts(rowid, tokens) VALUES (new.template_id, new.tokens); END",
+    "CREATE TRIGGER IF NOT EXISTS template_search_documents_ad AFTER DELETE ON template_search_documents BEGIN "
+    "INSERT INTO template_search_fts(template_search_fts, rowid, tokens) VALUES ('delete', old.template_id, old.tokens); END",
+    "CREATE TRIGGER IF NOT EXISTS template_search_documents_au AFTER UPDATE ON template_search_documents BEGIN "
+    "INSERT INTO template_search_fts(template_search_fts, rowid, tokens) VALUES ('delete', old.template_id, old.tokens); "
+    "INSERT INTO template_search_fts(rowid, tokens) VALUES (new.template_id, new.tokens); END",
+]
+for _statement in TEMPLATE_SEARCH_FTS_DDL:
+    event.listen(
+        TemplateSearchDocument.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite")
+    )
+event.listen(
+    TemplateSearchDocument.__table__,
+    "before_drop",
+    DDL("DROP TABLE IF EXISTS template_search_fts").execute_if(dialect="sqlite"),
+)
 
 class Share(db.Model):
     __tablename__ = "shares"
@@ -152,3 +264,91 @@ class HotelSnapshot(db.Model):
     is_selected = db.Column(db.Boolean, default=False, nullable=False)
 
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class PlanGenerationJob(db.Model):
+    """
+    AI によるプラン生成の依頼。作成画面からは積むだけにして、
+    app/services/plan_job_service.py のワーカーが AI 呼び出し・ホテル検索・保存を行う。
+    status: queued → running → succeeded / failed
+    """
+    __tablename__ = "plan_generation_jobs"
+
+    job_id = db.Column(db.String(36), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default="queued")
+    # 作成画面の入力値（destination, departure, start_date, days, purpose_raw, options）
+    params = db.Column(db.JSON, nullable=False)
+    plan_id = db.Column(db.Integer, db.ForeignKey("plans.id", ondelete="SET NULL"), nullable=True)
+    error = db.Column(db.Text)
+    # ストリーミング生成の途中経過 [{"event": "title" | "transport" | "day", "key": ..., "data": ...}, ...]
+    progress = db.Column(db.JSON)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+
+class AIGenerationCacheEntry(db.Model):
+    """
+    AI の生成結果のキャッシュ（app/services/ai_cache.py）。
+    cache_key は入力を正規化したもののハッシュで、kind は生成の種類（"plan" など）。
+    """
+    __tablename__ = "ai_generation_cache"
+
+    cache_key = db.Column(db.String(64), primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)
+    response = db.Column(db.JSON, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
+class AICallMetric(db.Model):
+    """
+    AI 呼び出し 1 回の計測値（app/services/ai_metrics.py）。
+    function は ai_service の関数名、outcome は ok / repaired / error / timeout / invalid_json / empty / rate_limited。
+    trace_id が同じ行は同じリクエスト（またはプラン生成ジョブ）の中の呼び出し。
+    queue_seconds は呼び出し枠（app/services/ai_limiter.py）が空くのを待った時間（wall_seconds には含まない）。
+    """
+    __tablename__ = "ai_call_metrics"
+
+    id = db.Column(db.Integer, primary_key=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    trace_id = db.Column(db.String(64))
+    function = db.Column(db.String(50), nullable=False)
+    provider = db.Column(db.String(20), nullable=False)
+    model = db.Column(db.String(100))
+    outcome = db.Column(db.String(20), nullable=False)
+    wall_seconds = db.Column(db.Float, nullable=False)
+    ttfb_seconds = db.Column(db.Float)
+    parse_seconds = db.Column(db.Float)
+    queue_seconds = db.Column(db.Float)
+    prompt_chars = db.Column(db.Integer, nullable=False, default=0)
+    response_chars = db.Column(db.Integer, nullable=False, default=0)
+    prompt_tokens = db.Column(db.Integer)
+    response_tokens = db.Column(db.Integer)
+    error = db.Column(db.Text)
+
+
+class AIRateLimit(db.Model):
+    """
+    AI 呼び出しのトークンバケット（app/services/ai_limiter.py）。全ワーカーで 1 行を共有し、行ロックを取って更新する。
+    tokens は refilled_at の時点で残っている呼び出し回数。
+    """
+    __tablename__ = "ai_rate_limits"
+
+    name = db.Column(db.String(50), primary_key=True)
+    tokens = db.Column(db.Float, nullable=False)
+    refilled_at = db.Column(db.DateTime, nullable=False)
+
+
+class AIRateLease(db.Model):
+    """
+    AI 呼び出しの枠（app/services/ai_limiter.py）。state が running の行は実行中、waiting の行は空きを待っている呼び出し。
+    ワーカーが落ちて返却されなかった枠は expires_at を過ぎたら数えない。
+    """
+    __tablename__ = "ai_rate_leases"
+
+    lease_id = db.Column(db.String(32), primary_key=True)
+    name = db.Column(db.String(50), nullable=False)
+    state = db.Column(db.String(20), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
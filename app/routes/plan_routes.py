@@ -2,15 +2,27 @@ import re
 import json
 import os
 import math
-from datetime import datetime, date, timedelta
+import hashlib
+import time
+from datetime import datetime, date, timedelta, timezone
 from uuid import uuid4
+from urllib.parse import urlencode
 
 # app/routes/plan_routes.py
-from flask import Blueprint, render_template, redirect, url_for, request, flash, session, current_app, jsonify
-from app.services.db_service import PlanDBService
+from flask import Blueprint, render_template, redirect, url_for, request, flash, session, current_app, jsonify, make_response, Response, stream_with_context
+from markupsafe import Markup
+from app.services.db_service import PlanDBService, PUBLIC_SORTS
+from app.services.cache_service import page_cache, PUBLIC_PLANS_NAMESPACE, SHARE_VIEWS_NAMESPACE, invalidate_public_plans
+from app.services.stats_service import template_stats
+from app.services.summary_queue import summary_queue
+from app.services.plan_view_service import PlanDetailViewModel
+from app.services.share_export import build_share_page, refresh_template_exports, remove_exports
+from app.services.plan_job_service import plan_jobs, JOB_SUCCEEDED, JOB_FAILED, JOB_FINISHED
+from app.services.checklist_prefetch import checklist_prefetch, TAKE_PENDING, TAKE_READY
+from app.services.ai_limiter import AIRateLimitError
 from app.forms.plan_form import PlanCreateForm
 from flask_login import current_user
-from app.services import ai_service, hotel_service, db_service
+from app.services import ai_service, db_service
 from app.models.user import User
 from app.extensions import db
 # 修正: Checklist関連のモデルをインポート
@@ -22,7 +34,7 @@ plan_bp = Blueprint("plan", __name__, url_prefix="/plans")
 
 @plan_bp.before_request
 def require_login():
-    if request.endpoint == "plan.share_view":
+    if request.endpoint in ("plan.share_view", "plan.share_json", "plan.share_view_ping"):
         return None
     if current_user.is_authenticated or session.get("user_id"):
         return None
@@ -31,10 +43,56 @@ def require_login():
     return redirect(url_for("auth.login"))
 
 
-def paginate_items(items, page, per_page):
-    total_items = len(items)
+def resolve_page(total_items, page, per_page):
+    """総件数から総ページ数を求め、page を 1〜総ページ数 に収める。"""
     total_pages = max(1, math.ceil(total_items / per_page)) if total_items else 1
     page = max(1, min(page or 1, total_pages))
+    return page, total_pages
+
+
+def build_etag(*parts):
+    """表示内容を決める値の組から ETag を作る。"""
+    return hashlib.sha1("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+
+def latest_timestamp(*values):
+    """Last-Modified 用に、更新日時（UTC の naive datetime）のうち最新のものを秒単位で返す。"""
+    stamps = [value for value in values if value]
+    if not stamps:
+        return None
+    return max(stamps).replace(microsecond=0, tzinfo=timezone.utc)
+
+
+def set_validators(response, etag, last_modified):
+    """ETag / Last-Modified / Cache-Control を付ける。"""
+    response.set_etag(etag, weak=True)
+    if last_modified:
+        response.last_modified = last_modified
+    # ヘッダーのログイン表示が閲覧者ごとに違うため共有キャッシュには載せず、毎回再検証させる
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add("Cookie")
+    return response
+
+
+def not_modified_response(etag, last_modified):
+    """
+    If-None-Match / If-Modified-Since が現在の内容と一致すれば、描画せずに 304 を返す。
+    一致しなければ None。
+    """
+    if request.if_none_match:
+        matched = request.if_none_match.contains_weak(etag)
+    elif last_modified and request.if_modified_since:
+        matched = last_modified <= request.if_modified_since
+    else:
+        matched = False
+    if not matched:
+        return None
+    return set_validators(make_response("", 304), etag, last_modified)
+
+
+def paginate_items(items, page, per_page):
+    page, total_pages = resolve_page(len(items), page, per_page)
     start = (page - 1) * per_page
     end = start + per_page
     return items[start:end], page, total_pages
@@ -64,29 +122,62 @@ def build_pagination(current_page, total_pages):
     return output
 
 
-def resolve_selected_hotel(plan):
-    if not plan:
-        return None
-    hotel_json = plan.hotel or {}
-    candidates = hotel_json.get("candidates", []) or []
-    selected_id = hotel_json.get("selected_id")
+def attach_card_fields(templates, transit_label="transport", hotel_fallback="選択中"):
+    """
+    Template に保存済みのカード要約（summary_* カラム）から、カード表示用の
+    transport_summary / hotel_name を設定する（追加のクエリは発行しない）。
+    """
+    for tpl in templates:
+        # ===== 交通手段 =====
+        if transit_label == "type" and tpl.summary_transport_type:
+            tpl.transport_summary = tpl.summary_transport_type
+        else:
+            tpl.transport_summary = tpl.summary_transport or ""
+
+        # ===== ホテル名 =====
+        tpl.hotel_name = tpl.summary_hotel_name or hotel_fallback
+
+def parse_public_filters(args):
+    """公開一覧のファセット絞り込み（days / tag / destination）をクエリ文字列から取り出す。"""
+    filters = {
+        "days": args.get("days", type=int),
+        "tag": db_service.normalize_tag(args.get("tag", "")),
+        "destination": args.get("destination", "").strip(),
+    }
+    return {key: value for key, value in filters.items() if value}
+
+
+def build_facet_groups(facets, filters, q="", sort="new"):
+    """
+    ファセット件数を画面表示用のリンク一覧にする。
+    選択中の値をもう一度押すとその絞り込みを解除する（ページ位置はリセット）。
+    """
+    groups = []
+    for key, facet_key, title, label in (
+        ("days", "days", "日数", lambda value: f"{value}日間"),
+        ("tag", "tags", "タグ", lambda value: f"#{value}"),
+        ("destination", "destinations", "行き先", lambda value: value),
+    ):
+        options = []
+        for value, count in facets.get(facet_key, []):
+            selected = filters.get(key) == value
+            args = {k: v for k, v in filters.items() if k != key}
+            if not selected:
+                args[key] = value
+            if q:
+                args["q"] = q
+            elif sort != "new":
+                args["sort"] = sort
+            options.append({
+                "label": label(value),
+                "count": count,
+                "selected": selected,
+                "url": url_for("plan.public_plan_list", **args),
+            })
+        if options:
+            groups.append({"title": title, "options": options})
+    return groups
 
-    selected_hotel = None
-    if selected_id is not None:
-        selected_hotel = next(
-            (c for c in candidates if str(c.get("id")) == str(selected_id)),
-            None,
-        )
-    if not selected_hotel:
-        selected_hotel = next(
-            (c for c in candidates if c.get("is_selected")),
-            None,
-        )
-    if not selected_hotel:
-        snapshot = HotelSnapshot.query.filter_by(plan_id=plan.id, is_selected=True).first()
-        if snapshot:
-            selected_hotel = {"name": snapshot.name, "price": snapshot.price}
-    return selected_hotel
 
 # ----------------------------------------
 #  プラン一覧（トップ）
@@ -120,50 +211,24 @@ def plan_list():
         )
 
     print("ユーザIDあり:", user_id)
-    templates = PlanDBService.get_all_templates_by_user_id(user_id=user_id)
     if q:
-        q_lower = q.casefold()
-        templates = [
-            tpl for tpl in templates
-            if q_lower in (tpl.public_title or "").casefold()
-        ]
-
-    templates_page, page, total_pages = paginate_items(templates, page, page_size)
+        # 検索語がある場合は n-gram インデックスで関連度順に検索する
+        templates_page, total_items = PlanDBService.search_templates(
+            q, user_id=user_id, page=page, per_page=page_size
+        )
+        page, total_pages = resolve_page(total_items, page, page_size)
+        if not templates_page and total_items:
+            templates_page, _ = PlanDBService.search_templates(q, user_id=user_id, page=page, per_page=page_size)
+    else:
+        # 件数・ページ切り出しは SQL 側で行う
+        total_items = PlanDBService.count_templates_by_user_id(user_id)
+        page, total_pages = resolve_page(total_items, page, page_size)
+        templates_page = PlanDBService.get_templates_page_by_user_id(user_id, page=page, per_page=page_size)
 
     # --------------------------
-    # ★ テンプレートごとに追加情報を付ける
+    # ★ テンプレートに保存済みの要約からカード表示用の情報を付ける
     # --------------------------
-    for tpl in templates_page:
-        # ===== 交通手段 =====
-        plan = PlanDBService.get_plan_by_id(tpl.plan_id, user_id)
-        if plan:
-            selected_transit = PlanDBService.get_selected_transit(plan.id, user_id)
-            if selected_transit:
-                tpl.transport_summary = selected_transit.transport_method
-            else:
-                # itinerary_outline_json から抽出
-                traffic_methods = []
-                outline = tpl.itinerary_outline_json or {}
-                days = []
-                if isinstance(outline, dict):
-                    days = outline.get("days", [])
-                for d in days:
-                    tm = d.get("traffic_method")
-                    if tm and tm not in traffic_methods:
-                        traffic_methods.append(tm)
-                tpl.transport_summary = " / ".join(traffic_methods) if traffic_methods else ""
-        else:
-            tpl.transport_summary = ""
-
-        # ===== ホテル名（新規追加）=====
-        # Plan を取得
-        plan = PlanDBService.get_plan_by_id(tpl.plan_id, user_id)
-        if not plan:
-            tpl.hotel_name = "未設定"
-            continue
-
-        selected_hotel = resolve_selected_hotel(plan)
-        tpl.hotel_name = selected_hotel.get("name") if selected_hotel and selected_hotel.get("name") else "選択中"
+    attach_card_fields(templates_page)
 
     return render_template(
         "plan/list.html",
@@ -180,7 +245,12 @@ def plan_list():
 @plan_bp.route("/public", methods=["GET"])
 def public_plan_list():
     q = request.args.get("q", "").strip()
+    cursor = request.args.get("cursor") or None
     page = request.args.get("page", 1, type=int)
+    filters = parse_public_filters(request.args)
+    # 並び順（検索時は関連度順なので使わない）
+    sort = request.args.get("sort", "new")
+    sort = sort if sort in PUBLIC_SORTS else "new"
     page_size = 8
 
     # アプリとしての「有効なユーザID」を決める
@@ -198,71 +268,72 @@ def public_plan_list():
         print("ユーザIDなし（完全未ログイン＆ゲストも未作成）")
         return render_template(
             "plan/public_list.html",
-            plans=[],
+            results_html=None,
             query=q,
-            result_count=0,
+            filters=filters,
             active_nav="public",
             show_login_link=True,
-            page=1,
-            total_pages=1,
-            pagination=[],
         )
 
     print("ユーザIDあり:", user_id)
-    try :
 
-        templates = PlanDBService.get_public_templates()
+    def render_results():
+        nonlocal page
+        prev_cursor = next_cursor = None
+        total_pages = 1
         if q:
-            q_lower = q.casefold()
-            templates = [
-                tpl for tpl in templates
-                if q_lower in (tpl.public_title or "").casefold()
-            ]
+            # 検索は n-gram インデックスで関連度順（ページ番号で移動）
+            templates_page, total_items = PlanDBService.search_templates(
+                q, public_only=True, page=page, per_page=page_size, filters=filters
+            )
+            page, total_pages = resolve_page(total_items, page, page_size)
+            if not templates_page and total_items:
+                templates_page, _ = PlanDBService.search_templates(
+                    q, public_only=True, page=page, per_page=page_size, filters=filters
+                )
+        else:
+            # (created_at, template_id) のキーセットページング（深いページでも先頭と同じコスト）
+            templates_page, prev_cursor, next_cursor = PlanDBService.get_public_templates_page(
+                cursor=cursor, per_page=page_size, filters=filters, sort=sort
+            )
 
-        templates_page, page, total_pages = paginate_items(templates, page, page_size)
+        # ファセット件数（日数・タグ・行き先）は SQL の GROUP BY で集計する
+        facets = PlanDBService.get_public_facets(filters, q=q)
 
         # --------------------------
-        # ★ Template ごとに表示用フィールドを作る
+        # ★ Template に保存済みの要約から表示用フィールドを作る
         # --------------------------
-        for tpl in templates_page:
-            # ===== 交通手段まとめ =====
-            plan = Plan.query.get(tpl.plan_id)  # 公開なので user_id で絞らない
-            if plan:
-                selected_transit = PlanDBService.get_selected_transit(plan.id, tpl.user_id)
-                if selected_transit:
-                    tpl.transport_summary = selected_transit.type
-                else:
-                    # itinerary_outline_json から抽出
-                    traffic_methods = []
-                    outline = tpl.itinerary_outline_json or {}
-                    days = []
-                    if isinstance(outline, dict):
-                        days = outline.get("days", [])
-                    for d in days:
-                        tm = d.get("traffic_method")
-                        if tm and tm not in traffic_methods:
-                            traffic_methods.append(tm)
-                    tpl.transport_summary = " / ".join(traffic_methods) if traffic_methods else ""
-            else:
-                tpl.transport_summary = ""
+        attach_card_fields(templates_page, transit_label="type", hotel_fallback="未設定")
 
-            # ===== ホテル名（Plan 経由で取得） =====
-            if plan and plan.hotel:
-                selected_hotel = resolve_selected_hotel(plan)
-                tpl.hotel_name = selected_hotel.get("name") if selected_hotel and selected_hotel.get("name") else "選択中"
-            else:
-                tpl.hotel_name = "未設定"
+        return render_template(
+            "plan/_public_results.html",
+            plans=templates_page,
+            query=q,
+            filters=filters,
+            sort=sort,
+            facet_groups=build_facet_groups(facets, filters, q, sort),
+            prev_cursor=prev_cursor,
+            next_cursor=next_cursor,
+            page=page,
+            total_pages=total_pages,
+            pagination=build_pagination(page, total_pages) if q else [],
+        )
+
+    try :
+        # 一覧部分はユーザーに依存しないため、検索語・ページ単位でキャッシュする
+        # 人気順はスコアの反映（バックグラウンド）では無効化せず、TTL で入れ替わるのに任せる
+        cache_key = f"q={q}&page={page}" if q else f"sort={sort}&cursor={cursor or ''}"
+        if filters:
+            cache_key += "&" + urlencode(sorted(filters.items()))
+        results_html = page_cache.get_or_render(PUBLIC_PLANS_NAMESPACE, cache_key, render_results)
 
         return render_template(
             "plan/public_list.html",
-            plans=templates_page,
+            results_html=Markup(results_html),
             query=q,
-            result_count=len(templates),
+            filters=filters,
             active_nav="public",
             show_login_link=show_login_link,
-            page=page,
-            total_pages=total_pages,
-            pagination=build_pagination(page, total_pages),
         )
 
     except Exception as e:
@@ -270,14 +341,11 @@ def public_plan_list():
         flash("表示されるデータがありませんでした")
         return render_template(
             "plan/public_list.html",
-            plans=[],              # エラー時は空リスト
+            results_html=None,     # エラー時は空表示
             query=q,
-            result_count=0,
+            filters=filters,
             active_nav="public",
             show_login_link=show_login_link,
-            page=1,
-            total_pages=1,
-            pagination=[],
         )
 
 @plan_bp.route("/<int:template_id>/delete", methods=["POST"])
@@ -293,6 +361,7 @@ def delete_plan(template_id):
         return redirect(url_for("plan.plan_list"))
 
     plan = Plan.query.filter_by(id=template.plan_id, user_id=user_id).first()
+    share_tokens = [share.url_token for share in template.shares]
 
     try:
         if plan:
@@ -300,6 +369,8 @@ def delete_plan(template_id):
         else:
             db.session.delete(template)
         db.session.commit()
+        invalidate_public_plans()
+        remove_exports(share_tokens)
         flash("プランを削除しました。", "success")
     except Exception as e:
         db.session.rollback()
@@ -411,7 +482,10 @@ def stay_select():
 
         hotel_json["selected_id"] = selected_id
         plan.hotel = hotel_json
+        templates = PlanDBService.refresh_plan_template_summaries(plan.id)
         db.session.commit()
+        invalidate_public_plans()
+        refresh_template_exports(templates)
         # flash("????????????????????????", "success")
         return redirect(url_for("plan.stay_confirm"))
 
@@ -456,6 +530,9 @@ def stay_select():
                 "selected_id": selected_snapshot_id or selected_id,
             }
             plan.hotel = hotel_json
+            # 選択中のホテルは HotelSnapshot から移しただけで、一覧カードの要約・共有ページ
+            # （resolve_selected_hotel が HotelSnapshot にフォールバックする）の表示は変わらないため、
+            # ここでは要約の作り直し・静的出力・一覧キャッシュの無効化はしない（選択の変更は POST で行う）
             db.session.commit()
             selected_id = hotel_json.get("selected_id")
 
@@ -676,6 +753,8 @@ def schedule_update():
         if schedule:
             schedule.daily_plan_json = new_schedule_data
             db.session.commit()
+            # 編集前の日程で先読みした持ち物リストは使わない
+            checklist_prefetch.cancel(plan_id)
             return jsonify({"status": "success", "redirect": url_for("plan.schedule_list")})
         else:
             return jsonify({"error": "スケジュールが見つかりません"}), 404
@@ -797,107 +876,118 @@ def share_plan():
 
 @plan_bp.route("/share/<token>", methods=["GET"])
 def share_view(token):
-    share = PlanDBService.get_share_by_token(token)
-    if not share:
+    is_logged_in = current_user.is_authenticated
+
+    def render_page():
+        # Template・Plan・選択中の交通手段/ホテル・チェックリストをまとめて取得して描画する
+        page = build_share_page(token, is_logged_in=is_logged_in)
+        if page is None:
+            return None
+        html, _, view = page
+        if view["summary_from_checklist"]:
+            summary_queue.enqueue(view["template"].plan_id, view["template"].user_id)
+        return html
+
+    def current_validators():
+        # 更新日時とバージョンから ETag / Last-Modified を作る。共有がなければ None
+        version = PlanDBService.get_template_version(token=token)
+        if not version:
+            return None
+        checklist_version = PlanDBService.get_checklist_version(version["plan_id"])
+        etag = build_etag(
+            "share", token, version["template_id"], version["display_version"],
+            version["template_updated_at"], version["plan_updated_at"], *checklist_version,
+            current_user.get_id() if is_logged_in else "",
+        )
+        last_modified = latest_timestamp(
+            version["template_updated_at"], version["plan_updated_at"], checklist_version[1]
+        )
+        return etag, last_modified
+
+    def render_entry():
+        # 未ログイン向けのキャッシュに入れる内容（描画結果と ETag / 更新日時）
+        validators = current_validators()
+        if validators is None:
+            return None
+        etag, last_modified = validators
+        html = render_page()
+        if html is None:
+            return None
+        return json.dumps({
+            "etag": etag,
+            "last_modified": last_modified.isoformat() if last_modified else None,
+            "html": html,
+        }, ensure_ascii=False)
+
+    # 閲覧数はページが表示されたあとに share_view_ping で数える（Caddy が静的スナップショットを返した場合も含めるため）
+    if is_logged_in:
+        # ヘッダーにユーザー名が出るため、ログイン中はキャッシュせず、変わっていなければ 304 を返す
+        validators = current_validators()
+        if validators is None:
+            flash("チェックリストが存在しません", "warning")
+            return redirect(url_for("plan.plan_list"))
+        etag, last_modified = validators
+        response = not_modified_response(etag, last_modified)
+        if response is not None:
+            return response
+        html = render_page()
+    else:
+        # 未ログインの閲覧者には同じ内容を返すので、トークン単位でキャッシュする。
+        # 表示内容が変わると export_share / remove_exports がエントリを消すため、ヒット時は DB を読まない
+        entry = page_cache.get_or_render(SHARE_VIEWS_NAMESPACE, token, render_entry)
+        if entry is None:
+            flash("チェックリストが存在しません", "warning")
+            return redirect(url_for("plan.plan_list"))
+        entry = json.loads(entry)
+        etag = entry["etag"]
+        last_modified = datetime.fromisoformat(entry["last_modified"]) if entry["last_modified"] else None
+        response = not_modified_response(etag, last_modified)
+        if response is not None:
+            return response
+        html = entry["html"]
+    if html is None:
         flash("チェックリストが存在しません", "warning")
         return redirect(url_for("plan.plan_list"))
+    return set_validators(make_response(html), etag, last_modified)
 
-    template = share.template
-    plan = Plan.query.get(template.plan_id) if template else None
-
-    # 日数（Template 優先、なければ Plan.days）
-    template_days = template.days or plan.days
-    template_note = template.short_note or "説明が設定されていません。"
-    
-    # まず、選択された交通手段を取得
-    selected_transit = PlanDBService.get_selected_transit(plan.id, template.user_id)
-    if selected_transit:
-        traffic_methods = [selected_transit.transport_method]
-    else:
-        # 選択されていない場合、itinerary_outline_json から抽出
-        if template.itinerary_outline_json:
-            itinerary_outline = template.itinerary_outline_json
-            days_data = []
-            if isinstance(itinerary_outline, dict):
-                days_data = itinerary_outline.get("days", [])
-            for d in days_data:
-                tm = d.get("traffic_method")
-                if tm:
-                    traffic_methods.append(tm)
-            # 重複排除
-            traffic_methods = list(dict.fromkeys(traffic_methods))
-
-    # --- 宿泊先（Plan.hotel JSON から） ---
-    selected_hotel = resolve_selected_hotel(plan)
-    if selected_hotel and selected_hotel.get("name"):
-        accommodation_label = selected_hotel.get("name")
-        hotel_price = selected_hotel.get("price")
-    else:
-        accommodation_label = "選択中です"
-        hotel_price = None
-
-    # --- メタ情報 ---
-    created_on_str = (
-        plan.created_at.strftime("%Y-%m-%d %H:%M")
-        if getattr(plan, "created_at", None)
-        else ""
+@plan_bp.route("/share/<token>/view", methods=["POST"])
+def share_view_ping(token):
+    """
+    共有ページの閲覧を 1 回数える（ページの plan_share.js が表示後に sendBeacon で送る）。
+    未ログインの閲覧者には Caddy が静的スナップショットを返し share_view を通らないため、閲覧数はここで数える。
+    """
+    version = PlanDBService.get_template_version(token=token)
+    if not version:
+        return "", 404
+    # 人気順のための閲覧数（DB への反映はバックグラウンドでまとめて行う）
+    template_stats.record_view(version["template_id"])
+    return "", 204
+
+@plan_bp.route("/share/<token>.json", methods=["GET"])
+def share_json(token):
+    """共有ページの内容を JSON で返す（静的スナップショットがない場合に Caddy から回ってくる）。"""
+    version = PlanDBService.get_template_version(token=token)
+    if not version:
+        return jsonify({"status": "error", "message": "共有プランが見つかりません。"}), 404
+
+    checklist_version = PlanDBService.get_checklist_version(version["plan_id"])
+    etag = build_etag(
+        "share_json", token, version["template_id"], version["display_version"],
+        version["template_updated_at"], version["plan_updated_at"], *checklist_version,
     )
+    last_modified = latest_timestamp(
+        version["template_updated_at"], version["plan_updated_at"], checklist_version[1]
+    )
+    template_stats.record_view(version["template_id"])
 
-    packing_summary = template.checklist_summary_json or {}
-    if not packing_summary or (not packing_summary.get("essential") and not packing_summary.get("extra")):
-        summary = PlanDBService.get_checklist_summary(plan.id, template.user_id)
-        if summary.get("items_total", 0) > 0:
-            packing_summary = summary
-
-    # 共有ビューでは常にチェックリスト形式で表示
-    checklist_display = {
-        "essential": [
-            {"id": f"guest_essential_{i}", "name": item["name"], "quantity": item.get("quantity", 1), "unit": item.get("unit", ""), "is_checked": False}
-            for i, item in enumerate(packing_summary.get("essential", []))
-        ],
-        "extra": [
-            {"id": f"guest_extra_{i}", "name": item["name"], "quantity": item.get("quantity", 1), "unit": item.get("unit", ""), "is_checked": False}
-            for i, item in enumerate(packing_summary.get("extra", []))
-        ]
-    }
-    display_total = len(checklist_display.get("essential", [])) + len(checklist_display.get("extra", []))
-
-    meta = {
-        "created_on": created_on_str,
-        "price": f"{hotel_price}円 / 泊" if hotel_price is not None else "",
-        "items_total": display_total,
-    }
-
-    # --- 主な滞在場所 ---
-    stay_locations = []
-    if template.itinerary_outline_json:
-        itinerary_outline = template.itinerary_outline_json
-        days_data = []
-        if isinstance(itinerary_outline, dict):
-            days_data = itinerary_outline.get("days", [])
-        for d in days_data:
-            for place in d.get("places", []):
-                stay_locations.append(place)
-    stay_locations = list(dict.fromkeys(stay_locations))
-
-    display_title = template.public_title or plan.title or plan.destination or "プラン"
+    response = not_modified_response(etag, last_modified)
+    if response is not None:
+        return response
 
-    is_logged_in = current_user.is_authenticated
-
-    return render_template("plan/share_view.html", 
-        template=template, 
-        plan=plan, 
-        share_url=request.url,
-        template_days=template_days,
-        traffic_methods=traffic_methods,
-        accommodation_label=accommodation_label,
-        meta=meta,
-        stay_locations=stay_locations,
-        checklist_display=checklist_display,
-        template_note=template_note,
-        display_title=display_title,
-        is_logged_in=is_logged_in
-    )
+    page = build_share_page(token)
+    if page is None:
+        return jsonify({"status": "error", "message": "共有プランが見つかりません。"}), 404
+    return set_validators(jsonify(page[1]), etag, last_modified)
 
 @plan_bp.route("/checklists", methods=["GET"])
 def checklist_list():
@@ -1091,6 +1181,9 @@ def reorder_checklist(plan_id):
         # Service層を呼び出し。
         # 内部で「.id」を使っている箇所があれば、Service側で「.checklist_item_id」に修正が必要です。
         success = PlanDBService.reorder_checklist_items(plan_id, dragged_id, target_id, user_id=user_id)
+        if success:
+            # 共有ページの並び順も変わるため、静的出力と未ログイン向けキャッシュを作り直す
+            refresh_template_exports(Template.query.filter_by(plan_id=plan_id).all())
         
         return jsonify({'success': bool(success)})
     except Exception as e:
@@ -1118,6 +1211,17 @@ def checklist_generate():
         if not plan:
             return jsonify({"error": "対象のプランが見つかりません。"}), 404
 
+        # 先読み済みの持ち物リストがあればそのまま使う（app/services/checklist_prefetch.py）。
+        # 先読み中なら待たずに 202 を返し、画面が送り直す（wait=False なら先読みを取り消してここで生成する）
+        payload = request.get_json(silent=True) or {}
+        status, _ = checklist_prefetch.take(plan.id, wait=payload.get("wait", True) is not False)
+        if status == TAKE_READY:
+            return jsonify({"status": "success", "redirect_url": url_for("plan.checklist_list")})
+        if status == TAKE_PENDING:
+            response = jsonify({"status": "pending", "retry_after": 1, "wait_seconds": checklist_prefetch.wait_seconds})
+            response.headers["Retry-After"] = "1"
+            return response, 202
+
         schedule_obj = PlanDBService.get_schedule_by_id(plan_id, user_id)
         if not schedule_obj:
             return jsonify({"error": "スケジュールの取得に失敗しました。"}), 404
@@ -1144,6 +1248,11 @@ def checklist_generate():
         else:
             return jsonify({"error": "持ち物リストの保存中にエラーが発生しました。"}), 500
 
+    except AIRateLimitError as e:
+        # AI の呼び出し枠が空かなかった（app/services/ai_limiter.py）。時間をおけば成功する
+        response = jsonify({"error": str(e)})
+        response.headers["Retry-After"] = str(e.retry_after or 1)
+        return response, 503
     except Exception as e:
         current_app.logger.error(f"Checklist generation failed: {e}")
         import traceback
@@ -1158,120 +1267,59 @@ def plan_detail(template_id):
     else:
         user_id = session.get("user_id")
 
-    # --- Template を主役に取得 ---
-    template = PlanDBService.get_all_templates_by_id(template_id=template_id)
+    # --- 条件付き GET: 閲覧できる場合だけ、更新日時とバージョンで未変更を判定する ---
+    version = PlanDBService.get_template_version(template_id=template_id)
+    etag = last_modified = None
+    if version and (version["visibility"] == "public" or (user_id and version["plan_user_id"] == user_id)):
+        owned = bool(user_id) and version["plan_user_id"] == user_id
+        checklist_version = PlanDBService.get_checklist_version(version["plan_id"])
+        etag = build_etag(
+            "detail", template_id, version["display_version"], version["template_updated_at"],
+            version["plan_updated_at"], *checklist_version, user_id or "", request.args.get("source", ""),
+        )
+        last_modified = latest_timestamp(
+            version["template_updated_at"], version["plan_updated_at"], checklist_version[1]
+        )
+        response = not_modified_response(etag, last_modified)
+        if response is not None:
+            if owned:
+                session["plan_id"] = version["plan_id"]
+            else:
+                template_stats.record_view(template_id)
+            return response
+
+    # --- Template を主役に、Plan・選択中の交通手段/ホテル・チェックリストをまとめて取得 ---
+    template = PlanDetailViewModel.load_template(template_id)
     if not template:
         print(f"指定されたテンプレートが存在しません: template_id={template_id}")
         flash("指定されたプランは存在しません。", "error")
         return redirect(url_for("plan.plan_list"))
 
-    # --- 可視性に応じて Plan の取得方法を切り替える ---
-    is_owned = False  # デフォルトは他人所有
-    plan = None
-
-    if template.visibility == "public":
-        plan = Plan.query.get(template.plan_id)
-        if user_id and plan:
-             is_owned = (plan.user_id == user_id)
-    
-    # public でない場合、または public だが上記で plan が取れなかった場合
-    if not plan:
-        # ログイン済み or ゲストセッションがあるかチェック
+    # --- 公開テンプレートは誰でも、非公開は自分のプランのみ閲覧できる ---
+    plan = template.plan
+    is_owned = bool(user_id) and plan is not None and plan.user_id == user_id
+    if template.visibility != "public" or not plan:
         if not user_id:
             # ログインを促すページにリダイレクト
             flash("このプランを閲覧するにはログインが必要です。", "info")
             # sessionに遷移先を保存
             session['next_url'] = url_for('plan.plan_detail', template_id=template_id)
             return redirect(url_for("auth.login_form"))
-        
-        # 自分自身のプランとして取得を試みる
-        plan = PlanDBService.get_plan_by_id(template.plan_id, user_id)
-        if plan:
-            is_owned = True
-
-    if not plan:
-        print(f"権限がないか、紐づくプランが存在しません: plan_id={template.plan_id}, user_id={user_id}")
-        flash("指定されたプランを閲覧する権限がありません。", "error")
-        return redirect(url_for("plan.plan_list"))
+        if not is_owned:
+            print(f"権限がないか、紐づくプランが存在しません: plan_id={template.plan_id}, user_id={user_id}")
+            flash("指定されたプランを閲覧する権限がありません。", "error")
+            return redirect(url_for("plan.plan_list"))
 
-    # 日数（Template 優先、なければ Plan.days）
-    template_days = template.days or plan.days
-    template_note = template.short_note or "説明が設定されていません。"
+    view = PlanDetailViewModel.build(template, viewer_id=user_id)
 
-    # --- 交通手段一覧を取得 ---
-    traffic_methods = []
-    
-    # まず、選択された交通手段を取得
-    selected_transit = PlanDBService.get_selected_transit(plan.id, template.user_id)
-    if selected_transit:
-        traffic_methods = [selected_transit.transport_method]
-    else:
-        # 選択されていない場合、itinerary_outline_json から抽出
-        if template.itinerary_outline_json:
-            itinerary_outline = template.itinerary_outline_json
-            days_data = []
-            if isinstance(itinerary_outline, dict):
-                days_data = itinerary_outline.get("days", [])
-            for d in days_data:
-                tm = d.get("traffic_method")
-                if tm:
-                    traffic_methods.append(tm)
-            # 重複排除
-            traffic_methods = list(dict.fromkeys(traffic_methods))
-
-    # --- 宿泊先（Plan.hotel JSON から） ---
-    selected_hotel = resolve_selected_hotel(plan)
-    if selected_hotel and selected_hotel.get("name"):
-        accommodation_label = selected_hotel.get("name")
-        hotel_price = selected_hotel.get("price")
-    else:
-        accommodation_label = "選択中です"
-        hotel_price = None
-
-    # --- メタ情報 ---
-    created_on_str = (
-        plan.created_at.strftime("%Y-%m-%d %H:%M")
-        if getattr(plan, "created_at", None)
-        else ""
-    )
-
-    packing_summary = template.checklist_summary_json or {}
-    if not packing_summary or (not packing_summary.get("essential") and not packing_summary.get("extra")):
-        summary = PlanDBService.get_checklist_summary(plan.id, template.user_id)
-        if summary.get("items_total", 0) > 0:
-            packing_summary = summary
-            if user_id == template.user_id:
-                template.checklist_summary_json = summary
-                template.items_count = summary.get("items_total", 0)
-                db.session.commit()
-
-    checklist_display = None
-    display_total = None
-    if is_owned:
-        checklist_display = PlanDBService.get_checklist_display(plan.id, user_id)
-        if checklist_display and (checklist_display.get("essential") or checklist_display.get("extra")):
-            display_total = len(checklist_display.get("essential", [])) + len(checklist_display.get("extra", []))
-    else:
-        # 所有者でない場合、checklist_display は None のまま（テーブル表示）
-        pass
-
-    meta = {
-        "created_on": created_on_str,
-        "price": f"{hotel_price}円 / 泊" if hotel_price is not None else "",
-        "items_total": display_total if display_total is not None else packing_summary.get("items_total", 0),
-    }
+    # 人気順のための閲覧数（自分のプランは数えない。DB への反映はバックグラウンドでまとめて行う）
+    if not is_owned:
+        template_stats.record_view(template.template_id)
 
-    # --- 主な滞在場所 ---
-    stay_locations = []
-    if template.itinerary_outline_json:
-        itinerary_outline = template.itinerary_outline_json
-        days_data = []
-        if isinstance(itinerary_outline, dict):
-            days_data = itinerary_outline.get("days", [])
-        for d in days_data:
-            for place in d.get("places", []):
-                stay_locations.append(place)
-    stay_locations = list(dict.fromkeys(stay_locations))
+    # 保存済みの要約が空だった場合は、表示はチェックリストから作った要約で行い、
+    # テンプレートへの保存は再計算キューに任せる（GET では書き込まない）
+    if view["summary_from_checklist"]:
+        summary_queue.enqueue(template.plan_id, template.user_id)
 
     source = request.args.get("source")
     if source == "public":
@@ -1284,24 +1332,25 @@ def plan_detail(template_id):
     if is_owned:
         session["plan_id"] = plan.id
 
-    display_title = template.public_title or plan.title or plan.destination or "プラン"
-
-    return render_template(
+    html = render_template(
         "plan/detail.html",
-        plan=plan,
-        template_days=template_days,
-        traffic_methods=traffic_methods,
-        accommodation_label=accommodation_label,
-        meta=meta,
-        stay_locations=stay_locations,
-        packing_summary=packing_summary,
-        checklist_display=checklist_display,
+        plan=view["plan"],
+        template_days=view["template_days"],
+        traffic_methods=view["traffic_methods"],
+        accommodation_label=view["accommodation_label"],
+        meta=view["meta"],
+        stay_locations=view["stay_locations"],
+        packing_summary=view["packing_summary"],
+        checklist_display=view["checklist_display"],
         is_owned=is_owned,
-        template_note=template_note,
-        display_title=display_title,
+        template_note=view["template_note"],
+        display_title=view["display_title"],
         active_nav=active_nav,
         template_id=template_id,  # 必要なら渡しておく
     )
+    if etag is None:
+        return html
+    return set_validators(make_response(html), etag, last_modified)
 
 # ----------------------------------------
 # 他人のプランをコピーして保存するルート
@@ -1366,56 +1415,22 @@ def plan_create_form():
             flash("セッションが切断されました。再度ログインしてください。", "danger")
             return redirect(url_for("auth.login"))
 
-        destination = form.destination.data
-        departure = form.departure.data
-        start_date = form.start_date.data
-        days = form.days.data
-        purpose_raw = form.purposes_raw.data
-        options = form.options.data
-        # flash(departure)
+        params = {
+            "destination": form.destination.data,
+            "departure": form.departure.data,
+            "start_date": form.start_date.data.isoformat(),
+            "days": form.days.data,
+            "purpose_raw": form.purposes_raw.data,
+            "options": form.options.data or [],
+            "regenerate": bool(form.regenerate.data),
+        }
 
         try:
-            # オプションの文字列化
-            travel_style_str = ", ".join(options) if options else "特になし"
-
-            ai_response = ai_service.generate_plan_from_inputs(
-                destination,
-                start_point=departure,
-                days=days,
-                purpose_raw=purpose_raw,
-                travel_style=travel_style_str
-            )
-            current_app.logger.info("aiからの返答：",ai_response)    
-            
-            plan_title, transit, schedule = format_json(ai_response=ai_response)
-
-            # 1. プランの保存
-            plan_id = PlanDBService.create_plan(
-                user_id=user_id,
-                destination=destination,
-                departure=departure,
-                start_date=start_date,
-                days=days,
-                purpose=purpose_raw,
-                options=options,
-                plan_title=plan_title
-            )
-            session["plan_id"] = plan_id
-
-            # 2. 交通手段候補の保存
-            PlanDBService.create_transit(plan_id, transit)
-
-            # 3. 日程の保存
-            PlanDBService.create_schedule(plan_id=plan_id, ai_schedule=schedule)
-            
-            # 4. ホテル情報の取得と保存
-            simplified_hotels = hotel_service.search_rakuten_hotels(destination)
-            PlanDBService.create_hotel(plan_id, simplified_hotels)
-
-            return redirect(url_for("plan.plan_transit"))
-
+            # AI の応答は待たずにジョブとして積み、作成画面からポーリングしてもらう
+            job = plan_jobs.submit(user_id, params)
         except Exception as e:
-            current_app.logger.error("Error generating plan", exc_info=True)
+            db.session.rollback()
+            current_app.logger.error("Error enqueueing plan generation", exc_info=True)
             flash(f"プラン生成中にエラーが発生しました: {e}", "danger")
             return (
                 render_template(
@@ -1426,7 +1441,21 @@ def plan_create_form():
                 ),
                 502,
             )
-    
+
+        if request.accept_mimetypes.best == "application/json":
+            return jsonify(job_status_payload(job)), 202
+        return redirect(url_for("plan.plan_create_form", job=job.job_id))
+
+    job = None
+    if request.method == "GET" and request.args.get("job"):
+        # 生成中のジョブがあれば、入力値を復元してローディング表示のままポーリングする
+        job = plan_jobs.get(request.args["job"], current_user.user_id if current_user.is_authenticated else session.get("user_id"))
+        if job:
+            params = dict(job.params)
+            params["start_date"] = date.fromisoformat(params["start_date"])
+            params["purposes_raw"] = params.pop("purpose_raw", None)
+            form = PlanCreateForm(data=params)
+
     if request.method == "POST" and not form.validate():
         flash("入力内容を確認してください。", "danger")
 
@@ -1435,13 +1464,94 @@ def plan_create_form():
         form=form, 
         need_options=need_options,           
         active_nav="plans",
+        job_status_url=url_for("plan.plan_job_status", job_id=job.job_id) if job else None,
+        job_events_url=url_for("plan.plan_job_events", job_id=job.job_id) if job else None,
     )
 
-def format_json(ai_response):
-    plan_title = ai_response.get("plan_title", "無題のプラン")
-    transit = ai_response.get("transport_options", {}) 
-    schedule = ai_response.get("itinerary", [])
-    return plan_title, transit, schedule
+
+def job_status_payload(job):
+    """プラン生成ジョブの状態を作成画面のポーリング用に返す。"""
+    payload = {
+        "job_id": job.job_id,
+        "status": job.status,
+        "status_url": url_for("plan.plan_job_status", job_id=job.job_id),
+    }
+    if job.status == JOB_SUCCEEDED:
+        payload["redirect"] = url_for("plan.plan_transit")
+    elif job.status == JOB_FAILED:
+        payload["message"] = job.error or "プラン生成中にエラーが発生しました。"
+    return payload
+
+
+@plan_bp.route("/jobs/<job_id>", methods=["GET"])
+def plan_job_status(job_id):
+    """プラン生成ジョブの状態（作成画面がポーリングする）。"""
+    user_id = current_user.user_id if current_user.is_authenticated else session.get("user_id")
+    job = plan_jobs.get(job_id, user_id)
+    if not job:
+        return jsonify({"status": "error", "message": "ジョブが見つかりません。"}), 404
+    if job.status == JOB_SUCCEEDED and job.plan_id:
+        # 交通手段選択画面以降はセッションの plan_id を使う
+        session["plan_id"] = job.plan_id
+    response = jsonify(job_status_payload(job))
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+
+def _sse(event, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+
+@plan_bp.route("/jobs/<job_id>/events", methods=["GET"])
+def plan_job_events(job_id):
+    """
+    プラン生成ジョブの途中経過（タイトル・交通手段・日程 1 日分）を Server-Sent Events で送る。
+    AI の応答を作り直すときは reset イベントを送り、作成画面はそれまでの表示を消す。
+    1 本の接続は PLAN_STREAM_MAX_SECONDS で閉じ、EventSource が Last-Event-ID つきで再接続して続きから受け取る。
+    完了時は status イベント（job_status_payload）を送る。plan_id のセッションへの保存は
+    ストリームの途中ではできないため、作成画面が /plans/jobs/<job_id> を 1 回呼んでから遷移する。
+    """
+    user_id = current_user.user_id if current_user.is_authenticated else session.get("user_id")
+    if not plan_jobs.get(job_id, user_id):
+        return jsonify({"status": "error", "message": "ジョブが見つかりません。"}), 404
+    try:
+        sent = int(request.headers.get("Last-Event-ID", -1)) + 1
+    except ValueError:
+        sent = 0
+    poll_seconds = current_app.config.get("PLAN_STREAM_POLL_SECONDS", 0.5)
+    max_seconds = current_app.config.get("PLAN_STREAM_MAX_SECONDS", 30)
+
+    def events():
+        nonlocal sent
+        deadline = time.monotonic() + max_seconds
+        yield "retry: 1000\n\n"
+        while True:
+            # ワーカーが別の接続で書いた途中経過を読むため、毎回トランザクションを終えて読み直す
+            db.session.rollback()
+            job = plan_jobs.get(job_id, user_id)
+            if job is None:
+                yield _sse("status", {"status": "error", "message": "ジョブが見つかりません。"})
+                return
+            progress = job.progress or []
+            for index in range(sent, len(progress)):
+                yield _sse(progress[index]["event"], progress[index], event_id=index)
+            sent = max(sent, len(progress))
+            if job.status in JOB_FINISHED:
+                yield _sse("status", job_status_payload(job))
+                return
+            if time.monotonic() >= deadline:
+                return
+            time.sleep(poll_seconds)
+
+    response = Response(stream_with_context(events()), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-store"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
 
 def _split_to_list(raw: str) -> list[str]:
     if not raw:
@@ -0,0 +1,185 @@
+"""
+AI の生成結果のキャッシュ。
+
+同じ条件（例: 東京発 京都 2日間・同じ希望）の生成は同じ結果を使い回し、Gemini を呼ばない。
+キーは入力を正規化（NFKC・空白の統一・大文字小文字・リストの順序）してからハッシュする。
+
+保存先は ai_generation_cache テーブル（ワーカー間・再起動後も共有）で、
+その前にプロセス内の LRU を置く。ヒット/ミスは kind ごとにプロセス内で数える。
+
+- AI_CACHE_ENABLED: False なら常に生成する（保存もしない）
+- AI_CACHE_TTL: 有効期間（秒）
+- AI_CACHE_MAXSIZE: テーブルに残す件数の上限（古いものから削除）
+- AI_CACHE_MEMORY_SIZE: プロセス内 LRU の件数
+"""
+import copy
+import hashlib
+import json
+import re
+import threading
+import unicodedata
+from datetime import datetime, timedelta
+
+from cachetools import LRUCache
+from flask import current_app
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.extensions import db
+from app.models.plan import AIGenerationCacheEntry
+
+_WHITESPACE = re.compile(r"\s+")
+_LIST_SEPARATOR = re.compile(r"[,、，\n\r]+")
+
+
+def normalize_value(value):
+    """キー用に値を正規化する（文字列は NFKC・空白の統一・小文字、リストは順序を無視）。"""
+    if isinstance(value, str):
+        return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", value)).strip().casefold()
+    if isinstance(value, (list, tuple, set)):
+        return sorted(json.dumps(normalize_value(v), ensure_ascii=False, sort_keys=True) for v in value)
+    if isinstance(value, dict):
+        return {str(k): normalize_value(v) for k, v in value.items()}
+    return value
+
+
+def split_list(value):
+    """"グルメ, 歴史" のような区切り文字列をリストにする（順序はキーの正規化で無視される）。"""
+    if isinstance(value, str):
+        return [part.strip() for part in _LIST_SEPARATOR.split(value) if part.strip()]
+    return value or []
+
+
+def digest(value):
+    """JSON にできる値の正規形のハッシュ（リストの順序は区別する。日程などをキーに含める場合に使う）。"""
+    canonical = json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def make_key(kind, **fields):
+    """生成の種類と入力値から、キャッシュのキー（sha256 の16進）を作る。"""
+    canonical = json.dumps(
+        {"kind": kind, "fields": normalize_value(fields)}, ensure_ascii=False, sort_keys=True, separators=(",", ":")
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class AIGenerationCache:
+    """Flask 拡張と同じく init_app で設定を読み込む、AI 生成結果キャッシュの窓口。"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = False
+        self._memory = LRUCache(maxsize=128)
+        self._stats = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get("AI_CACHE_ENABLED", True)
+        self.ttl = app.config.get("AI_CACHE_TTL", 7 * 24 * 3600)
+        self.maxsize = app.config.get("AI_CACHE_MAXSIZE", 5000)
+        self._memory = LRUCache(maxsize=app.config.get("AI_CACHE_MEMORY_SIZE", 128))
+        app.extensions["ai_cache"] = self
+
+    def get_or_generate(self, kind, key, generate, bypass=False, cacheable=None):
+        """
+        キャッシュがあればそれを返し、なければ generate() の結果を保存して返す。
+        bypass=True（作り直し）は読まずに生成し、結果で上書きする。
+        cacheable(value) が偽の結果（形式の崩れた応答など）は保存しない。
+        """
+        if not self.enabled:
+            return generate()
+        if bypass:
+            self._record(kind, "bypass")
+        else:
+            value = self.get(kind, key)
+            if value is not None:
+                return value
+
+        value = generate()
+        if value is not None and (cacheable is None or cacheable(value)):
+            self.set(kind, key, value)
+        return value
+
+    def get(self, kind, key):
+        now = datetime.utcnow()
+        with self._lock:
+            entry = self._memory.get(key)
+        if entry is not None and entry[0] > now:
+            self._record(kind, "memory_hits")
+            return copy.deepcopy(entry[1])
+
+        try:
+            row = db.session.execute(
+                select(AIGenerationCacheEntry.response, AIGenerationCacheEntry.expires_at).where(
+                    AIGenerationCacheEntry.cache_key == key,
+                    AIGenerationCacheEntry.expires_at > now,
+                )
+            ).first()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            current_app.logger.warning(f"AI cache read failed: {e}")
+            row = None
+        if row is None:
+            self._record(kind, "misses")
+            return None
+
+        with self._lock:
+            self._memory[key] = (row.expires_at, row.response)
+        self._record(kind, "db_hits")
+        return copy.deepcopy(row.response)
+
+    def set(self, kind, key, value):
+        """
+        結果を保存する。呼び出し元のセッションを commit しないよう、別の接続で書き込む。
+        期限切れと件数上限を超えた古いエントリもここで削除する。
+        """
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=self.ttl)
+        with self._lock:
+            self._memory[key] = (expires_at, copy.deepcopy(value))
+        table = AIGenerationCacheEntry.__table__
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(delete(table).where((table.c.cache_key == key) | (table.c.expires_at <= now)))
+                conn.execute(
+                    insert(table).values(
+                        cache_key=key, kind=kind, response=value, created_at=now, expires_at=expires_at
+                    )
+                )
+                overflow = conn.scalar(select(func.count()).select_from(table)) - self.maxsize
+                if overflow > 0:
+                    oldest = select(table.c.cache_key).order_by(table.c.created_at.asc()).limit(overflow)
+                    conn.execute(delete(table).where(table.c.cache_key.in_(oldest)))
+        except SQLAlchemyError as e:
+            current_app.logger.warning(f"AI cache write failed: {e}")
+            return False
+        self._record(kind, "stores")
+        return True
+
+    def clear_memory(self):
+        with self._lock:
+            self._memory.clear()
+
+    def _record(self, kind, event):
+        with self._lock:
+            stats = self._stats.setdefault(
+                kind, {"memory_hits": 0, "db_hits": 0, "misses": 0, "bypass": 0, "stores": 0}
+            )
+            stats[event] += 1
+
+    def stats(self):
+        """kind ごとの件数と hit_ratio（このプロセスでの集計）。"""
+        with self._lock:
+            result = {}
+            for kind, values in self._stats.items():
+                hits = values["memory_hits"] + values["db_hits"]
+                total = hits + values["misses"]
+                result[kind] = {**values, "hit_ratio": (hits / total) if total else 0.0}
+            return result
+
+
+ai_cache = AIGenerationCache()
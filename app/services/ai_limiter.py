@@ -0,0 +1,222 @@
+"""
+AI 呼び出しの流量制限（全ワーカー共通）。
+
+gunicorn の全ワーカーが同時に Gemini を呼ぶと、利用枠（1 分あたりのリクエスト数）を超えてエラーになる。
+ここでは DB の 1 行をトークンバケットとして全プロセスで共有し（行ロックを取って更新する）、
+あわせて同時に実行中の呼び出しの数も ai_rate_leases の行で数えて上限をかける。
+
+- 枠が空いていなければ AI_RATE_MAX_WAIT 秒まで待ち、それでも空かなければ AIRateLimitError
+  （0 なら待たずにすぐ AIRateLimitError）
+- ワーカーが落ちて返却されなかった枠は AI_RATE_LEASE_SECONDS を過ぎたら数えない
+- DB に書けない場合は制限をかけずに呼び出す（流量制限のせいで生成を止めない）
+
+- AI_RATE_LIMIT_ENABLED: True なら制限する（既定は False）
+- AI_RATE_PER_MINUTE: 1 分あたりの呼び出し回数（0 なら回数は制限しない）
+- AI_RATE_BURST: 続けて呼び出せる回数（バケットの大きさ）
+- AI_MAX_IN_FLIGHT: 全ワーカーで同時に実行する呼び出しの上限（0 なら制限しない）
+- AI_RATE_MAX_WAIT: 空きを待つ秒数
+- AI_RATE_LEASE_SECONDS: 実行中の枠の有効期限（AI のタイムアウトより長くする）
+
+待っている呼び出しの数・断った数・待ち時間はプロセスごとに stats() で、全ワーカー分は snapshot() で返す。
+待ち時間と断った呼び出しは ai_call_metrics にも残る（queue_seconds / outcome=rate_limited）。
+"""
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from app.extensions import db
+from app.models.plan import AIRateLease, AIRateLimit
+from app.services.ai_metrics import OUTCOME_RATE_LIMITED, SECONDS_BUCKETS, Histogram
+
+LEASE_RUNNING = "running"
+LEASE_WAITING = "waiting"
+
+# 待っている間に空きを確かめる間隔の上限（秒）
+POLL_SECONDS = 0.25
+
+
+class AIRateLimitError(Exception):
+    """AI の呼び出し枠が空かなかった。"""
+
+    def __init__(self, message="AIの利用が混み合っています。しばらくしてからもう一度お試しください。", retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AIRateLimiter:
+    """Flask 拡張と同じく init_app で設定を読み込む、AI 呼び出しの流量制限の窓口。"""
+
+    def __init__(self, app=None, name="gemini"):
+        self.app = None
+        self.name = name
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._stats = {"waiting": 0, "max_waiting": 0, "acquired": 0, "rejected": 0, "bypassed": 0}
+        self._queue_seconds = Histogram(SECONDS_BUCKETS)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get("AI_RATE_LIMIT_ENABLED", False)
+        self.per_minute = app.config.get("AI_RATE_PER_MINUTE", 60)
+        self.burst = app.config.get("AI_RATE_BURST", 10)
+        self.max_in_flight = app.config.get("AI_MAX_IN_FLIGHT", 8)
+        self.max_wait = app.config.get("AI_RATE_MAX_WAIT", 10)
+        self.lease_seconds = app.config.get("AI_RATE_LEASE_SECONDS", 150)
+        app.extensions["ai_limiter"] = self
+
+    @contextmanager
+    def slot(self, span=None):
+        """
+        呼び出し枠を 1 つ取り、with を抜けたら返す。空かなければ AIRateLimitError。
+        span（app/services/ai_metrics.py の AICallSpan）を渡すと待ち時間を記録し、断ったときは outcome を rate_limited にする。
+        """
+        if not self.enabled:
+            yield
+            return
+        try:
+            lease_id, waited = self.acquire()
+        except AIRateLimitError:
+            if span is not None:
+                span.outcome = OUTCOME_RATE_LIMITED
+            raise
+        if span is not None:
+            span.queued(waited)
+        try:
+            yield
+        finally:
+            if lease_id is not None:
+                self.release(lease_id)
+
+    def acquire(self):
+        """
+        枠が空くまで（最大 AI_RATE_MAX_WAIT 秒）待って取る。
+        戻り値: (枠の ID, 待った秒数)。DB に書けなかった場合の枠の ID は None。
+        """
+        started = time.monotonic()
+        deadline = started + (self.max_wait or 0)
+        lease_id = uuid4().hex
+        with self._lock:
+            self._stats["waiting"] += 1
+            self._stats["max_waiting"] = max(self._stats["max_waiting"], self._stats["waiting"])
+        try:
+            while True:
+                now = time.monotonic()
+                try:
+                    acquired, retry_after = self._try_acquire(lease_id, max(deadline - now, 0))
+                except IntegrityError:
+                    # 別のプロセスがバケットの行を同時に作った。作られた行を使ってやり直す
+                    continue
+                except SQLAlchemyError as e:
+                    self.app.logger.warning(f"AI rate limiter unavailable, calling without limit: {e}")
+                    self._count("bypassed")
+                    return None, time.monotonic() - started
+
+                if acquired:
+                    waited = time.monotonic() - started
+                    with self._lock:
+                        self._stats["acquired"] += 1
+                        self._queue_seconds.observe(waited)
+                    return lease_id, waited
+                if now + retry_after > deadline:
+                    self.release(lease_id)
+                    self._count("rejected")
+                    raise AIRateLimitError(retry_after=max(1, round(retry_after)))
+                time.sleep(min(retry_after, POLL_SECONDS, max(deadline - now, 0)))
+        finally:
+            with self._lock:
+                self._stats["waiting"] -= 1
+
+    def _try_acquire(self, lease_id, wait_seconds):
+        """
+        バケットの行をロックして 1 回分を取る。取れなければ待っている呼び出しとして登録する。
+        戻り値: (取れたかどうか, 次に空きそうになるまでの秒数)
+        """
+        now = datetime.utcnow()
+        limits = AIRateLimit.__table__
+        leases = AIRateLease.__table__
+        with db.engine.begin() as conn:
+            row = conn.execute(select(limits).where(limits.c.name == self.name).with_for_update()).first()
+            if row is None:
+                tokens = float(self.burst)
+                conn.execute(insert(limits).values(name=self.name, tokens=tokens, refilled_at=now))
+            else:
+                elapsed = max((now - row.refilled_at).total_seconds(), 0.0)
+                tokens = min(float(self.burst), row.tokens + elapsed * self.per_minute / 60)
+
+            conn.execute(delete(leases).where(leases.c.expires_at < now))
+            running = conn.scalar(
+                select(func.count()).select_from(leases).where(
+                    leases.c.name == self.name,
+                    leases.c.state == LEASE_RUNNING,
+                    leases.c.lease_id != lease_id,
+                )
+            )
+            has_token = not self.per_minute or tokens >= 1
+            has_slot = not self.max_in_flight or running < self.max_in_flight
+            acquired = has_token and has_slot
+            if acquired and self.per_minute:
+                tokens -= 1
+            conn.execute(update(limits).where(limits.c.name == self.name).values(tokens=tokens, refilled_at=now))
+
+            conn.execute(delete(leases).where(leases.c.lease_id == lease_id))
+            conn.execute(
+                insert(leases).values(
+                    lease_id=lease_id,
+                    name=self.name,
+                    state=LEASE_RUNNING if acquired else LEASE_WAITING,
+                    expires_at=now + timedelta(seconds=self.lease_seconds if acquired else wait_seconds + 1),
+                )
+            )
+
+        if acquired or not has_token:
+            retry_after = 0.0 if acquired else (1 - tokens) * 60 / self.per_minute
+        else:
+            # 実行中の呼び出しがいつ終わるかは分からないため、間隔をおいて確かめる
+            retry_after = POLL_SECONDS
+        return acquired, retry_after
+
+    def release(self, lease_id):
+        """枠を返す（待っている呼び出しとしての登録も消す）。"""
+        leases = AIRateLease.__table__
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(delete(leases).where(leases.c.lease_id == lease_id))
+        except SQLAlchemyError as e:
+            self.app.logger.warning(f"AI rate limiter release failed: lease_id={lease_id}: {e}")
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def stats(self):
+        """このプロセスの {"waiting", "max_waiting", "acquired", "rejected", "bypassed", "queue_seconds": {...}}"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["queue_seconds"] = self._queue_seconds.summary()
+        return stats
+
+    def snapshot(self):
+        """全ワーカー分の {"tokens", "running", "waiting"}（アプリコンテキスト内で呼ぶ）。"""
+        now = datetime.utcnow()
+        row = db.session.get(AIRateLimit, self.name)
+        tokens = None
+        if row is not None:
+            elapsed = max((now - row.refilled_at).total_seconds(), 0.0)
+            tokens = min(float(self.burst), row.tokens + elapsed * self.per_minute / 60)
+        counts = dict(
+            db.session.query(AIRateLease.state, func.count())
+            .filter(AIRateLease.name == self.name, AIRateLease.expires_at >= now)
+            .group_by(AIRateLease.state)
+            .all()
+        )
+        return {"tokens": tokens, "running": counts.get(LEASE_RUNNING, 0), "waiting": counts.get(LEASE_WAITING, 0)}
+
+
+ai_limiter = AIRateLimiter()
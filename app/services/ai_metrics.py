@@ -0,0 +1,339 @@
+"""
+AI 呼び出しの計測。
+
+プラン生成・持ち物リスト生成の 1 回ごとに、所要時間・最初の応答までの時間（TTFB）・
+プロンプト/応答の文字数とトークン数・json.loads の時間・結果（ok / repaired / error / timeout / invalid_json / empty / rate_limited）を記録する。
+repaired は応答を直して使えたもの（app/services/ai_response.py）、rate_limited は呼び出し枠が空かずに断ったもの
+（app/services/ai_limiter.py。枠が空くまで待った時間は queue_seconds）。
+
+- 関数・モデルごとのヒストグラムをプロセス内に持つ（stats() で p50/p95/p99 を返す）
+- 1 回ごとの値を ai_call_metrics テーブルに残す（ワーカー全体・期間ごとの集計は manage_data.py ai-metrics）
+- 同じリクエスト（またはプラン生成ジョブ）の呼び出しはトレースにまとめ、終わったときに 1 行のログにする。
+  リクエストでは Server-Timing ヘッダにも AI の合計時間を出す
+
+- AI_METRICS_ENABLED: False ならテーブルに書き込まない（ヒストグラムとログは残す）
+- AI_METRICS_RETENTION_DAYS: テーブルに残す日数（古い行は purge() で消す。
+  呼び出しごとには消さないため、cron などで manage_data.py ai-metrics --purge を定期的に実行する）
+"""
+import bisect
+import contextvars
+import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+from flask import current_app, g, has_request_context
+from google.api_core import exceptions as google_exceptions
+from sqlalchemy import delete, insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.extensions import db
+from app.models.plan import AICallMetric
+
+OUTCOME_OK = "ok"
+OUTCOME_REPAIRED = "repaired"
+OUTCOME_ERROR = "error"
+OUTCOME_TIMEOUT = "timeout"
+OUTCOME_INVALID_JSON = "invalid_json"
+OUTCOME_EMPTY = "empty"
+OUTCOME_RATE_LIMITED = "rate_limited"
+
+# ヒストグラムのバケットの上限（秒・文字数）
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+CHARS_BUCKETS = (250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+TOKENS_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000)
+
+HISTOGRAMS = {
+    "wall_seconds": SECONDS_BUCKETS,
+    "ttfb_seconds": SECONDS_BUCKETS,
+    "parse_seconds": SECONDS_BUCKETS,
+    "queue_seconds": SECONDS_BUCKETS,
+    "prompt_chars": CHARS_BUCKETS,
+    "response_chars": CHARS_BUCKETS,
+    "prompt_tokens": TOKENS_BUCKETS,
+    "response_tokens": TOKENS_BUCKETS,
+}
+
+_current_trace = contextvars.ContextVar("ai_trace", default=None)
+
+
+def percentile(values, q):
+    """値のリストの q 分位（0〜1、線形補間）。空なら None。"""
+    if not values:
+        return None
+    values = sorted(values)
+    position = (len(values) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+class Histogram:
+    """上限つきバケットのヒストグラム。分位数はバケット内を線形補間して推定する。"""
+
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.bounds[index - 1] if index > 0 else 0.0
+                upper = self.bounds[index] if index < len(self.bounds) else self.max
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": dict(zip([*map(str, self.bounds), "+Inf"], self.counts)),
+        }
+
+
+class AICallSpan:
+    """1 回の AI 呼び出しの計測値。AIMetrics.span() の中で値を埋める。"""
+
+    def __init__(self, function, provider, model, prompt):
+        self.span_id = uuid4().hex[:16]
+        self.function = function
+        self.provider = provider
+        self.model = model
+        self.prompt_chars = len(prompt or "")
+        self.prompt_tokens = None
+        self.response_chars = 0
+        self.response_tokens = None
+        self.ttfb_seconds = None
+        self.parse_seconds = None
+        self.queue_seconds = None
+        self.wall_seconds = None
+        self.outcome = None
+        self.error = None
+        self.trace_id = None
+        self._started = time.perf_counter()
+
+    def received(self, text):
+        """応答（ストリーミングなら 1 チャンク）を受け取ったときに呼ぶ。最初の 1 回が TTFB になる。"""
+        if text and self.ttfb_seconds is None:
+            self.ttfb_seconds = time.perf_counter() - self._started
+        self.response_chars += len(text or "")
+
+    def queued(self, seconds):
+        """呼び出し枠を待った時間を記録する。所要時間と TTFB は枠を取った時点から測り直す。"""
+        self.queue_seconds = seconds
+        self._started = time.perf_counter()
+
+    def set_tokens(self, prompt_tokens=None, response_tokens=None):
+        if prompt_tokens is not None:
+            self.prompt_tokens = prompt_tokens
+        if response_tokens is not None:
+            self.response_tokens = response_tokens
+
+    @contextmanager
+    def parsing(self):
+        """json.loads の時間を測る。解析できなければ outcome は invalid_json。"""
+        started = time.perf_counter()
+        try:
+            yield
+        except ValueError:
+            self.outcome = OUTCOME_INVALID_JSON
+            raise
+        finally:
+            self.parse_seconds = time.perf_counter() - started
+
+    def to_dict(self):
+        return {
+            "span_id": self.span_id,
+            "trace_id": self.trace_id,
+            "function": self.function,
+            "provider": self.provider,
+            "model": self.model,
+            "outcome": self.outcome,
+            "wall_seconds": self.wall_seconds,
+            "ttfb_seconds": self.ttfb_seconds,
+            "parse_seconds": self.parse_seconds,
+            "queue_seconds": self.queue_seconds,
+            "prompt_chars": self.prompt_chars,
+            "response_chars": self.response_chars,
+            "prompt_tokens": self.prompt_tokens,
+            "response_tokens": self.response_tokens,
+            "error": self.error,
+        }
+
+
+class AITrace:
+    """1 つのリクエスト（またはジョブ）の中の AI 呼び出しのまとまり。"""
+
+    def __init__(self, name, trace_id=None):
+        self.name = name
+        self.trace_id = trace_id or uuid4().hex
+        self.spans = []
+
+    def summary(self):
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "calls": len(self.spans),
+            "ai_seconds": sum(span.wall_seconds or 0.0 for span in self.spans),
+            "spans": [span.to_dict() for span in self.spans],
+        }
+
+
+def _classify(error):
+    if isinstance(error, (TimeoutError, google_exceptions.DeadlineExceeded)):
+        return OUTCOME_TIMEOUT
+    if isinstance(error, json.JSONDecodeError):
+        return OUTCOME_INVALID_JSON
+    return OUTCOME_ERROR
+
+
+class AIMetrics:
+    """Flask 拡張と同じく init_app で設定を読み込む、AI 呼び出しの計測の窓口。"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._outcomes = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get("AI_METRICS_ENABLED", True)
+        self.retention_days = app.config.get("AI_METRICS_RETENTION_DAYS", 30)
+        app.after_request(self._finish_request_trace)
+        app.extensions["ai_metrics"] = self
+
+    @contextmanager
+    def trace(self, name, trace_id=None):
+        """この中の AI 呼び出しを 1 つのトレースにまとめ、終わったときにログに出す（ジョブなど）。"""
+        current = AITrace(name, trace_id)
+        token = _current_trace.set(current)
+        try:
+            yield current
+        finally:
+            _current_trace.reset(token)
+            self._log_trace(current)
+
+    def _active_trace(self):
+        current = _current_trace.get()
+        if current is None and has_request_context():
+            # リクエストの中ではリクエストごとのトレースに入れる（after_request でログに出す）
+            current = g.get("ai_trace")
+            if current is None:
+                current = g.ai_trace = AITrace("request")
+        return current
+
+    @contextmanager
+    def span(self, function, provider, prompt):
+        """
+        AI 呼び出し 1 回を計測する。with の中で span.received() / span.parsing() などを呼ぶ。
+        例外で抜けたときは outcome を timeout / invalid_json / error にして例外はそのまま送る。
+        """
+        span = AICallSpan(function, provider.name, provider.model_name, prompt)
+        current = self._active_trace()
+        if current is not None:
+            span.trace_id = current.trace_id
+            current.spans.append(span)
+        try:
+            yield span
+        except Exception as e:
+            if span.outcome is None:
+                span.outcome = _classify(e)
+            span.error = str(e)[:500]
+            raise
+        else:
+            if span.outcome is None:
+                span.outcome = OUTCOME_OK
+        finally:
+            # 途中で読むのをやめたストリーム（GeneratorExit）なども失敗として数える
+            span.outcome = span.outcome or OUTCOME_ERROR
+            span.wall_seconds = time.perf_counter() - span._started
+            self.record(span)
+
+    def record(self, span):
+        """ヒストグラムに加え、テーブルに書き込む（呼び出し元のセッションは commit しない）。"""
+        key = (span.function, span.model)
+        with self._lock:
+            histograms = self._histograms.setdefault(
+                key, {name: Histogram(bounds) for name, bounds in HISTOGRAMS.items()}
+            )
+            for name, histogram in histograms.items():
+                value = getattr(span, name)
+                if value is not None:
+                    histogram.observe(value)
+            outcomes = self._outcomes.setdefault(key, {})
+            outcomes[span.outcome] = outcomes.get(span.outcome, 0) + 1
+
+        if not self.enabled:
+            return
+        values = span.to_dict()
+        values.pop("span_id")
+        values["created_at"] = datetime.utcnow()
+        table = AICallMetric.__table__
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(insert(table).values(**values))
+        except SQLAlchemyError as e:
+            current_app.logger.warning(f"AI metrics write failed: {e}")
+
+    def purge(self, now=None):
+        """AI_METRICS_RETENTION_DAYS より古い行を消す（アプリコンテキスト内で呼ぶ）。戻り値: 消した件数"""
+        if not self.retention_days:
+            return 0
+        cutoff = (now or datetime.utcnow()) - timedelta(days=self.retention_days)
+        table = AICallMetric.__table__
+        with db.engine.begin() as conn:
+            return conn.execute(delete(table).where(table.c.created_at < cutoff)).rowcount
+
+    def _log_trace(self, current):
+        if current.spans and self.app is not None:
+            self.app.logger.info(f"ai_trace {json.dumps(current.summary(), ensure_ascii=False)}")
+
+    def _finish_request_trace(self, response):
+        current = g.pop("ai_trace", None)
+        if current is not None and current.spans:
+            summary = current.summary()
+            response.headers.add("Server-Timing", f"ai;desc=\"{summary['calls']} calls\";dur={summary['ai_seconds'] * 1000:.1f}")
+            self._log_trace(current)
+        return response
+
+    def stats(self):
+        """{(関数, モデル): {"outcomes": {...}, 指標名: {"count", "sum", "p50", "p95", "p99", "buckets"}}}（このプロセスの集計）"""
+        with self._lock:
+            return {
+                key: {
+                    "outcomes": dict(self._outcomes.get(key, {})),
+                    **{name: histogram.summary() for name, histogram in histograms.items()},
+                }
+                for key, histograms in self._histograms.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._outcomes.clear()
+
+
+ai_metrics = AIMetrics()
@@ -0,0 +1,277 @@
+"""
+AI の生成を行うプロバイダの切り替え。
+
+ai_service のプラン生成・持ち物リスト生成は、ここで選んだプロバイダに
+(用途, システムプロンプト, ユーザープロンプト, 入力値) を渡して JSON の文字列を受け取る。
+キャッシュ・JSON の解析・ストリーミングの途中経過は ai_service 側で共通に行う。
+
+- AI_PROVIDER: "gemini"（既定）または "stub"
+- gemini は用途ごとに response_schema（app/services/ai_response.py）と出力トークンの上限を渡す
+  - AI_RESPONSE_SCHEMA: False ならスキーマを渡さない（JSON であることだけを指定する）
+  - AI_PLAN_MAX_OUTPUT_TOKENS / AI_CHECKLIST_MAX_OUTPUT_TOKENS: 出力トークンの上限（超えた分は打ち切られ、ai_response で修復する）
+- stub は Gemini を呼ばずに、入力値から決まった形式どおりの JSON を返す（負荷試験・プロファイル用）
+  - AI_STUB_LATENCY: 1 回の応答にかける秒数
+  - AI_STUB_LATENCY_PER_1K_CHARS: プロンプト 1000 文字ごとに足す秒数（入力の長さによる遅れを真似る）
+  - AI_STUB_JITTER: 応答時間のばらつき（AI_STUB_LATENCY に対する割合。0.2 なら ±20%）
+  - AI_STUB_ERROR_RATE: 失敗させる割合（0.0〜1.0）
+  - AI_STUB_CHUNKS: ストリーミング時に応答を分ける数
+  - AI_STUB_SEED: 乱数のシード（同じシード・同じ呼び出し順なら同じ遅延・同じ失敗になる）
+"""
+import hashlib
+import json
+import random
+import threading
+import time
+
+from google.generativeai import GenerationConfig
+
+from app.services.ai_response import CHECKLIST_RESPONSE_SCHEMA, PLAN_RESPONSE_SCHEMA
+from app.services.gemini_client import DEFAULT_MODEL, gemini_client
+
+TASK_PLAN = "plan"
+TASK_CHECKLIST = "checklist"
+
+RESPONSE_SCHEMAS = {TASK_PLAN: PLAN_RESPONSE_SCHEMA, TASK_CHECKLIST: CHECKLIST_RESPONSE_SCHEMA}
+
+
+class StubProviderError(Exception):
+    """スタブプロバイダが AI_STUB_ERROR_RATE に従って返す擬似的な失敗。"""
+
+
+class AIProvider:
+    """
+    プロバイダの共通インターフェース。
+    span（app/services/ai_metrics.py の AICallSpan）が渡されたら、分かる範囲でトークン数を記録する。
+    """
+
+    name = None
+    model_name = None
+
+    def generate_text(self, task, system_prompt, user_prompt, inputs, span=None):
+        """応答全体（JSON の文字列）を返す。"""
+        raise NotImplementedError
+
+    def stream_text(self, task, system_prompt, user_prompt, inputs, span=None):
+        """応答を少しずつ返すイテレータ。既定では全体を 1 回で返す。"""
+        yield self.generate_text(task, system_prompt, user_prompt, inputs, span=span)
+
+    def warm_up(self, system_prompts=()):
+        return 0.0
+
+
+def _chunk_text(chunk):
+    # 候補のない最後のチャンク（終了理由だけ）では .text が ValueError になる
+    try:
+        return chunk.text
+    except ValueError:
+        return ""
+
+
+class GeminiProvider(AIProvider):
+    """Gemini（app/services/gemini_client.py）で生成する。"""
+
+    name = "gemini"
+
+    def __init__(self, response_schema=True, max_output_tokens=None):
+        self.response_schema = response_schema
+        self.max_output_tokens = max_output_tokens or {}
+
+    @property
+    def model_name(self):
+        return getattr(gemini_client, "model_name", DEFAULT_MODEL)
+
+    def _config(self, task):
+        return GenerationConfig(
+            response_mime_type="application/json",
+            response_schema=RESPONSE_SCHEMAS.get(task) if self.response_schema else None,
+            max_output_tokens=self.max_output_tokens.get(task),
+        )
+
+    def _record_usage(self, response, span):
+        # ストリーミングでは最後のチャンクに全体の件数が入る
+        usage = getattr(response, "usage_metadata", None)
+        if span is not None and usage is not None:
+            span.set_tokens(
+                getattr(usage, "prompt_token_count", None) or None,
+                getattr(usage, "candidates_token_count", None) or None,
+            )
+
+    def generate_text(self, task, system_prompt, user_prompt, inputs, span=None):
+        response = gemini_client.generate(system_prompt, user_prompt, generation_config=self._config(task))
+        self._record_usage(response, span)
+        return response.text
+
+    def stream_text(self, task, system_prompt, user_prompt, inputs, span=None):
+        response = gemini_client.generate(system_prompt, user_prompt, generation_config=self._config(task), stream=True)
+        for chunk in response:
+            self._record_usage(chunk, span)
+            yield _chunk_text(chunk)
+
+    def warm_up(self, system_prompts=()):
+        return gemini_client.warm_up(system_prompts)
+
+
+_TRANSPORT_METHODS = {
+    "価格重視": [("夜行バス + 徒歩", 8000, 480, 1), ("高速バス + 電車", 9500, 420, 2)],
+    "速度重視": [("新幹線 + 電車", 25000, 180, 3), ("飛行機 + 電車", 28000, 150, 2)],
+    "おすすめ": [("飛行機（LCC） + 電車", 15000, 240, 3), ("新幹線（早割） + バス", 19000, 210, 2)],
+    "車利用": [("自家用車（高速道路利用）", 12000, 420, 0), ("レンタカー（高速道路利用）", 16000, 400, 0)],
+}
+_ACTIVITIES = [
+    ("{destination}駅 到着", "駅から徒歩"),
+    ("ランチ：{destination}名物", "徒歩5分"),
+    ("{destination}の名所を散策", "バス（約15分）"),
+    ("地元の市場でお土産探し", "徒歩10分"),
+    ("カフェで休憩", "徒歩3分"),
+    ("美術館・資料館を見学", "タクシー（約10分）"),
+    ("夕食：郷土料理", "徒歩5分"),
+    ("ホテル チェックイン", "駅から徒歩"),
+]
+_CHECKLIST = [
+    ("貴重品", ["財布", "スマホ", "身分証明書"], ["モバイルバッテリー", "交通系ICカード"]),
+    ("衣類", ["下着（{days}日分）"], ["Tシャツ（{days}日分）", "羽織もの", "パジャマ"]),
+    ("バス用品、コスメ", ["歯ブラシ", "日焼け止め"], ["シャンプー", "化粧水", "ヘアブラシ"]),
+    ("その他", ["常備薬"], ["保険証", "折りたたみ傘", "エコバッグ", "虫よけスプレー"]),
+]
+
+
+class StubProvider(AIProvider):
+    """Gemini を呼ばずに、入力値から決まった内容（形式は本番の応答と同じ）の JSON を返す。"""
+
+    name = "stub"
+    model_name = "stub"
+
+    def __init__(self, latency=1.0, jitter=0.0, error_rate=0.0, chunks=20, seed=0, latency_per_1k_chars=0.0):
+        self.latency = latency
+        self.latency_per_1k_chars = latency_per_1k_chars
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.chunks = max(1, chunks)
+        self.seed = seed
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _draw(self, user_prompt):
+        """この呼び出しの (応答時間, 失敗させるか)。"""
+        with self._lock:
+            factor = 1.0 + self._random.uniform(-self.jitter, self.jitter) if self.jitter else 1.0
+            failed = self._random.random() < self.error_rate
+        latency = self.latency + self.latency_per_1k_chars * len(user_prompt or "") / 1000
+        return max(0.0, latency * factor), failed
+
+    def _rng(self, task, inputs):
+        # 同じ入力には同じ内容を返す
+        canonical = json.dumps([self.seed, task, inputs], ensure_ascii=False, sort_keys=True, default=str)
+        return random.Random(hashlib.sha256(canonical.encode("utf-8")).hexdigest())
+
+    def build(self, task, inputs):
+        """入力値から応答（dict）を作る。"""
+        rng = self._rng(task, inputs)
+        destination = inputs.get("destination") or "目的地"
+        days = int(inputs.get("days") or 1)
+        if task == TASK_PLAN:
+            return self._build_plan(rng, destination, days)
+        if task == TASK_CHECKLIST:
+            return self._build_checklist(rng, days)
+        raise ValueError(f"未対応の用途です: {task}")
+
+    def _build_plan(self, rng, destination, days):
+        transport_options = {}
+        for label, candidates in _TRANSPORT_METHODS.items():
+            method, cost, minutes, transit_count = rng.choice(candidates)
+            option = {"method": method, "estimated_cost": cost, "estimated_time": minutes}
+            if label != "車利用":
+                arrival = 7 * 60 + minutes
+                option.update(
+                    transit_count=transit_count,
+                    departure_time="07:00",
+                    arrival_time=f"{arrival // 60:02d}:{arrival % 60:02d}",
+                )
+            transport_options[label] = option
+
+        itinerary = []
+        for day in range(1, days + 1):
+            details = []
+            for index, (activity, notes) in enumerate(rng.sample(_ACTIVITIES, rng.randint(3, 5))):
+                details.append(
+                    {
+                        "time": f"{9 + index * 2:02d}:00",
+                        "activity": activity.format(destination=destination),
+                        "transport_notes": notes,
+                    }
+                )
+            itinerary.append({"day": day, "details": details})
+        return {
+            "plan_title": f"{destination}満喫 {days}日間の旅",
+            "transport_options": transport_options,
+            "itinerary": itinerary,
+        }
+
+    def _build_checklist(self, rng, days):
+        checklist = []
+        for category, required_items, items in _CHECKLIST:
+            checklist.append(
+                {
+                    "category": category,
+                    "required_items": [item.format(days=days) for item in required_items],
+                    "items": [item.format(days=days) for item in rng.sample(items, rng.randint(1, len(items)))],
+                }
+            )
+        return {"checklist": checklist}
+
+    def generate_text(self, task, system_prompt, user_prompt, inputs, span=None):
+        latency, failed = self._draw(user_prompt)
+        time.sleep(latency)
+        if failed:
+            raise StubProviderError("スタブプロバイダの擬似エラーです。")
+        return json.dumps(self.build(task, inputs), ensure_ascii=False)
+
+    def stream_text(self, task, system_prompt, user_prompt, inputs, span=None):
+        latency, failed = self._draw(user_prompt)
+        text = json.dumps(self.build(task, inputs), ensure_ascii=False)
+        size = -(-len(text) // self.chunks)
+        for start in range(0, len(text), size):
+            time.sleep(latency / self.chunks)
+            if failed and start >= len(text) // 2:
+                raise StubProviderError("スタブプロバイダの擬似エラーです。")
+            yield text[start:start + size]
+
+
+class AIProviderManager:
+    """Flask 拡張と同じく init_app で設定を読み込み、AI_PROVIDER のプロバイダを返す。"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.current = GeminiProvider()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        name = app.config.get("AI_PROVIDER", GeminiProvider.name)
+        if name == GeminiProvider.name:
+            self.current = GeminiProvider(
+                response_schema=app.config.get("AI_RESPONSE_SCHEMA", True),
+                max_output_tokens={
+                    TASK_PLAN: app.config.get("AI_PLAN_MAX_OUTPUT_TOKENS", 8192),
+                    TASK_CHECKLIST: app.config.get("AI_CHECKLIST_MAX_OUTPUT_TOKENS", 2048),
+                },
+            )
+        elif name == StubProvider.name:
+            self.current = StubProvider(
+                latency=app.config.get("AI_STUB_LATENCY", 1.0),
+                jitter=app.config.get("AI_STUB_JITTER", 0.0),
+                error_rate=app.config.get("AI_STUB_ERROR_RATE", 0.0),
+                chunks=app.config.get("AI_STUB_CHUNKS", 20),
+                seed=app.config.get("AI_STUB_SEED", 0),
+                latency_per_1k_chars=app.config.get("AI_STUB_LATENCY_PER_1K_CHARS", 0.0),
+            )
+        else:
+            raise ValueError(f"AI_PROVIDER の値が不正です: {name}")
+        app.extensions["ai_provider"] = self
+
+    def warm_up(self, system_prompts=()):
+        return self.current.warm_up(system_prompts)
+
+
+ai_provider = AIProviderManager()
@@ -0,0 +1,348 @@
+"""
+AI の応答（JSON）の検証と修復。
+
+Gemini の応答は response_schema を渡しても、出力上限での打ち切りやキーの欠け・型の違い
+（"約15,000円" や "2時間30分" など）が起こる。応答全体を捨てて作り直すと AI の費用と待ち時間が倍になるため、
+ここで直せるものは直し、使える部分（交通手段 1 件・日程 1 日分・持ち物のカテゴリ 1 つ）だけを残す。
+
+- repair_json: 前後の余計な文字（```json など）・末尾のカンマ・途中で切れた JSON を直して読む
+- normalize_plan / normalize_checklist: 型をそろえ、使えない要素を落とす
+- 使える日程（持ち物リストならカテゴリ）が 1 つもなければ AIResponseError（呼び出し元で作り直す）
+
+parse_plan_response / parse_checklist_response は (結果, 直した内容のリスト) を返す。リストが空なら応答はそのまま使えた。
+"""
+import json
+import re
+
+# GenerationConfig.response_schema に渡すスキーマ（OpenAPI のサブセット）
+_TRANSPORT_OPTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "method": {"type": "string"},
+        "estimated_cost": {"type": "integer", "nullable": True},
+        "estimated_time": {"type": "integer", "nullable": True},
+        "transit_count": {"type": "integer", "nullable": True},
+        "departure_time": {"type": "string", "nullable": True},
+        "arrival_time": {"type": "string", "nullable": True},
+    },
+    "required": ["method", "estimated_cost", "estimated_time"],
+}
+TRANSPORT_LABELS = ("価格重視", "速度重視", "おすすめ", "車利用")
+
+PLAN_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "plan_title": {"type": "string"},
+        "transport_options": {
+            "type": "object",
+            "properties": {label: _TRANSPORT_OPTION_SCHEMA for label in TRANSPORT_LABELS},
+            "required": list(TRANSPORT_LABELS),
+        },
+        "itinerary": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "day": {"type": "integer"},
+                    "details": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "time": {"type": "string"},
+                                "activity": {"type": "string"},
+                                "transport_notes": {"type": "string"},
+                            },
+                            "required": ["time", "activity"],
+                        },
+                    },
+                },
+                "required": ["day", "details"],
+            },
+        },
+    },
+    "required": ["plan_title", "transport_options", "itinerary"],
+}
+
+CHECKLIST_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "checklist": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "category": {"type": "string"},
+                    "required_items": {"type": "array", "items": {"type": "string"}},
+                    "items": {"type": "array", "items": {"type": "string"}},
+                },
+                "required": ["category", "required_items", "items"],
+            },
+        },
+    },
+    "required": ["checklist"],
+}
+
+_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$", re.IGNORECASE)
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+_HOURS_MINUTES = re.compile(r"(\d+(?:\.\d+)?)\s*時間(?:\s*(\d+)\s*分)?")
+_CLOCK = re.compile(r"^(\d{1,2})[:：](\d{2})")
+_ITEM_SEPARATORS = re.compile(r"[、,，\n]")
+
+
+class AIResponseError(ValueError):
+    """修復しても使えない応答。呼び出し元で作り直す。"""
+
+
+def repair_json(text):
+    """
+    JSON の文字列を読む。読めなければ前後の余計な文字・末尾のカンマ・途中での打ち切りを直して読み直す。
+    戻り値: (値, 直したかどうか)。直しても読めなければ AIResponseError。
+    """
+    text = (text or "").strip()
+    try:
+        return json.loads(text), False
+    except ValueError:
+        pass
+
+    text = _FENCE.sub("", text)
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        raise AIResponseError("応答に JSON が含まれていません。")
+    text = text[min(starts):]
+    try:
+        # 閉じたあとに余計な文字が続く場合
+        return json.JSONDecoder().raw_decode(text)[0], True
+    except ValueError:
+        pass
+
+    cleaned, cut_points = _scan(text)
+    # 完全な値で終わる位置から順に、開いたままの括弧を閉じて読めるものを探す
+    for cut, stack in reversed(cut_points):
+        candidate = cleaned[:cut].rstrip().rstrip(",") + "".join("}" if c == "{" else "]" for c in reversed(stack))
+        try:
+            return json.loads(candidate), True
+        except ValueError:
+            continue
+    raise AIResponseError("応答の JSON を修復できませんでした。")
+
+
+def _scan(text):
+    """
+    文字列の外の末尾のカンマ（"[1, 2,]" の 2 の後ろ）を取り除いた文字列と、
+    切っても値が欠けない位置 (位置, その時点で開いている括弧) のリストを返す。
+    """
+    chars = []
+    cut_points = []
+    stack = []
+    in_string = escape = False
+    for c in text:
+        if in_string:
+            chars.append(c)
+            if escape:
+                escape = False
+            elif c == "\\":
+                escape = True
+            elif c == '"':
+                in_string = False
+            continue
+        if c == '"':
+            in_string = True
+        elif c in "{[":
+            stack.append(c)
+        elif c in "}]":
+            if not stack:
+                break
+            # 直前のカンマを取り除く
+            while chars and chars[-1].isspace():
+                chars.pop()
+            if chars and chars[-1] == ",":
+                chars.pop()
+            stack.pop()
+            chars.append(c)
+            cut_points.append((len(chars), list(stack)))
+            if not stack:
+                break
+            continue
+        elif c == "," and stack:
+            cut_points.append((len(chars), list(stack)))
+        chars.append(c)
+    return "".join(chars), cut_points
+
+
+def _to_int(value):
+    """数値・"約15,000円" のような文字列を整数にする（読めなければ None）。"""
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return int(round(value))
+    match = _NUMBER.search(str(value).replace(",", "").replace("，", ""))
+    return int(round(float(match.group()))) if match else None
+
+
+def _to_minutes(value):
+    """分の数値・"2時間30分" / "90分" / "1.5時間" のような文字列を分にする（読めなければ None）。"""
+    if isinstance(value, str):
+        match = _HOURS_MINUTES.search(value)
+        if match:
+            return int(round(float(match.group(1)) * 60)) + int(match.group(2) or 0)
+    return _to_int(value)
+
+
+def _to_time(value):
+    """時刻を "HH:MM" の文字列にする（7 → "07:00"、"9:30" → "09:30"。それ以外の文字列はそのまま）。"""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)) and 0 <= value < 24:
+        return f"{int(value):02d}:00"
+    text = str(value).strip()
+    match = _CLOCK.match(text)
+    if match:
+        return f"{int(match.group(1)):02d}:{match.group(2)}" + text[match.end():]
+    return text or None
+
+
+def _to_text(value):
+    if value is None or isinstance(value, (dict, list)):
+        return None
+    return str(value).strip() or None
+
+
+def normalize_transport_option(option):
+    """交通手段 1 件の型をそろえる。手段（method）がなければ None。"""
+    if not isinstance(option, dict):
+        return None
+    method = _to_text(option.get("method"))
+    if method is None:
+        return None
+    normalized = {
+        "method": method,
+        "estimated_cost": _to_int(option.get("estimated_cost")),
+        "estimated_time": _to_minutes(option.get("estimated_time")),
+    }
+    if "transit_count" in option:
+        normalized["transit_count"] = _to_int(option.get("transit_count"))
+    for key in ("departure_time", "arrival_time"):
+        if key in option:
+            normalized[key] = _to_time(option.get(key))
+    return normalized
+
+
+def normalize_day(day, index):
+    """日程 1 日分の型をそろえる（index は 0 始まりの位置）。アクティビティが 1 つもなければ None。"""
+    if not isinstance(day, dict) or not isinstance(day.get("details"), list):
+        return None
+    details = []
+    for detail in day["details"]:
+        if not isinstance(detail, dict):
+            continue
+        activity = _to_text(detail.get("activity"))
+        if activity is None:
+            continue
+        normalized = {"time": _to_time(detail.get("time")) or "", "activity": activity}
+        notes = _to_text(detail.get("transport_notes"))
+        if notes is not None:
+            normalized["transport_notes"] = notes
+        details.append(normalized)
+    if not details:
+        return None
+    return {"day": _to_int(day.get("day")) or index + 1, "details": details}
+
+
+def normalize_plan(data):
+    """
+    プランの応答の型をそろえ、使えない交通手段・日程を落とす。
+    戻り値: (プラン, 直した内容のリスト)。使える日程がなければ AIResponseError。
+    """
+    if not isinstance(data, dict):
+        raise AIResponseError("応答がオブジェクトではありません。")
+    issues = []
+
+    title = _to_text(data.get("plan_title"))
+    if title is None:
+        issues.append("plan_title がありません")
+
+    transport_options = {}
+    raw_options = data.get("transport_options")
+    if not isinstance(raw_options, dict):
+        issues.append("transport_options がありません")
+        raw_options = {}
+    for label, option in raw_options.items():
+        normalized = normalize_transport_option(option)
+        if normalized is None:
+            issues.append(f"交通手段 {label} を除外しました")
+        else:
+            transport_options[label] = normalized
+
+    itinerary = []
+    raw_days = data.get("itinerary")
+    for index, day in enumerate(raw_days if isinstance(raw_days, list) else []):
+        normalized = normalize_day(day, index)
+        if normalized is None:
+            issues.append(f"日程 {index + 1} 件目を除外しました")
+        else:
+            itinerary.append(normalized)
+    if not itinerary:
+        raise AIResponseError("使える日程がありません。")
+
+    plan = {"plan_title": title or "無題のプラン", "transport_options": transport_options, "itinerary": itinerary}
+    if not issues and plan != data:
+        issues.append("型を修正しました")
+    return plan, issues
+
+
+def _item_names(value):
+    if isinstance(value, str):
+        value = _ITEM_SEPARATORS.split(value)
+    if not isinstance(value, list):
+        return []
+    names = []
+    for item in value:
+        if isinstance(item, dict):
+            item = item.get("name")
+        name = _to_text(item)
+        if name is not None and name not in names:
+            names.append(name)
+    return names
+
+
+def normalize_checklist(data):
+    """
+    持ち物リストの応答の型をそろえ、使えないカテゴリを落とす。
+    戻り値: ({"checklist": [...]}, 直した内容のリスト)。使えるカテゴリがなければ AIResponseError。
+    """
+    if isinstance(data, list):
+        data = {"checklist": data}
+    if not isinstance(data, dict) or not isinstance(data.get("checklist"), list):
+        raise AIResponseError("checklist がありません。")
+    issues = []
+    checklist = []
+    for index, category in enumerate(data["checklist"]):
+        name = _to_text(category.get("category")) if isinstance(category, dict) else None
+        required_items = _item_names(category.get("required_items")) if name else []
+        items = [item for item in _item_names(category.get("items")) if item not in required_items] if name else []
+        if not required_items and not items:
+            issues.append(f"カテゴリ {index + 1} 件目を除外しました")
+            continue
+        checklist.append({"category": name, "required_items": required_items, "items": items})
+    if not checklist:
+        raise AIResponseError("使えるカテゴリがありません。")
+
+    result = {"checklist": checklist}
+    if not issues and result != data:
+        issues.append("型を修正しました")
+    return result, issues
+
+
+def parse_plan_response(text):
+    """プランの応答を読んで検証する。戻り値: (プラン, 直した内容のリスト)"""
+    data, repaired = repair_json(text)
+    plan, issues = normalize_plan(data)
+    return plan, (["JSON を修復しました"] if repaired else []) + issues
+
+
+def parse_checklist_response(text):
+    """持ち物リストの応答を読んで検証する。戻り値: ({"checklist": [...]}, 直した内容のリスト)"""
+    data, repaired = repair_json(text)
+    checklist, issues = normalize_checklist(data)
+    return checklist, (["JSON を修復しました"] if repaired else []) + issues
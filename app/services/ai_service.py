@@ -2,22 +2,200 @@ import os
 import json
 import google.generativeai as genai # ★ OpenAI の代わりに Gemini をインポート
 import google.generativeai as genai
-from google.generativeai import GenerationConfig
 from flask import current_app # flask から current_app をインポート
+from app.services.ai_cache import ai_cache, digest, make_key, split_list
+from app.services.ai_limiter import AIRateLimitError, ai_limiter
+from app.services.ai_metrics import OUTCOME_EMPTY, OUTCOME_REPAIRED, ai_metrics
+from app.services.ai_provider import TASK_CHECKLIST, TASK_PLAN, ai_provider
+from app.services.ai_response import (
+    AIResponseError,
+    normalize_day,
+    normalize_transport_option,
+    parse_checklist_response,
+    parse_plan_response,
+)
+from app.services.json_stream import IncrementalJSONParser
+from app.services.prompt_compaction import compact_schedule, render_compact_schedule
+
+PLAN_SYSTEM_PROMPT = "あなたは日本の旅行プランを作成するプロのAIアシスタントです。"
+CHECKLIST_SYSTEM_PROMPT = "あなたは日本の旅行プランから旅行に必要な持ち物を提案するプロのAIアシスタントです。"
+SYSTEM_PROMPTS = (PLAN_SYSTEM_PROMPT, CHECKLIST_SYSTEM_PROMPT)
+
+PLAN_STREAM_PATTERNS = {
+    ("plan_title",): "title",
+    ("transport_options", "*"): "transport",
+    ("itinerary", "*"): "day",
+}
+
+def _plan_cache_key(destination, start_point, days, purpose_raw, **kwargs):
+    return make_key(
+        "plan",
+        destination=destination,
+        start_point=start_point,
+        days=int(days) if days is not None else None,
+        purpose=purpose_raw or "",
+        travel_style=split_list(kwargs.get("travel_style", "特になし")),
+    )
+
+
+def _is_cacheable_plan(value):
+    return isinstance(value, dict) and bool(value.get("itinerary"))
+
+
+def generate_plan_from_inputs(destination, start_point, days, purpose_raw, use_cache=True, **kwargs):
+    """
+    旅行プランを AI で生成する。同じ条件の生成結果があればそれを返す（app/services/ai_cache.py）。
+    use_cache=False（作り直し）はキャッシュを読まずに生成し、結果で上書きする。
+    """
+    return ai_cache.get_or_generate(
+        "plan",
+        _plan_cache_key(destination, start_point, days, purpose_raw, **kwargs),
+        lambda: _generate_plan_from_inputs(destination, start_point, days, purpose_raw, **kwargs),
+        bypass=not use_cache,
+        cacheable=_is_cacheable_plan,
+    )
+
+
+def plan_events(ai_response):
+    """生成済みのプランを、ストリーミング生成と同じ (名前, キー, 値) の並びにする。"""
+    if "plan_title" in ai_response:
+        yield "title", "plan_title", ai_response["plan_title"]
+    for key, option in (ai_response.get("transport_options") or {}).items():
+        yield "transport", key, option
+    for index, day in enumerate(ai_response.get("itinerary") or []):
+        yield "day", day.get("day", index + 1), day
+
+
+def stream_plan_from_inputs(destination, start_point, days, purpose_raw, use_cache=True, **kwargs):
+    """
+    旅行プランをストリーミングで生成する。
+    タイトル・交通手段 1 件・日程 1 日分ができるたびに ("title" | "transport" | "day", キー, 値) を返し、
+    最後に ("result", None, 全体) を返す。日程のキーは何日目か（day の値）。キャッシュがあればその内容を同じ順に返す。
+    応答が使えず作り直すときは ("reset", None, None) を返してから、作り直した応答の途中経過を最初から返す。
+    """
+    cache_key = _plan_cache_key(destination, start_point, days, purpose_raw, **kwargs)
+    if use_cache and ai_cache.enabled:
+        cached = ai_cache.get("plan", cache_key)
+        if cached is not None:
+            yield from plan_events(cached)
+            yield "result", None, cached
+            return
 
-def generate_plan_from_inputs(destination,start_point, days, purpose_raw, **kwargs):    
     try:
-        api_key = current_app.config['GEMINI_API_KEY']
-        
-        if not api_key:
-            raise ValueError("GEMINI_API_KEYが設定されていません。")
+        user_prompt = _plan_prompt(destination, start_point, days, purpose_raw, **kwargs)
+        provider = ai_provider.current
+        retries = _response_retries()
+        emitted = set()
+        for attempt in range(retries + 1):
+            if emitted:
+                # 前の応答の途中経過は使わない。受け取った側で表示を消してもらい、作り直した応答を最初から送る
+                yield "reset", None, None
+                emitted = set()
+            parser = IncrementalJSONParser(PLAN_STREAM_PATTERNS)
+            try:
+                with ai_metrics.span("stream_plan_from_inputs", provider, user_prompt) as span:
+                    with ai_limiter.slot(span):
+                        for text in provider.stream_text(
+                            TASK_PLAN,
+                            PLAN_SYSTEM_PROMPT,
+                            user_prompt,
+                            _plan_inputs(destination, start_point, days, purpose_raw, **kwargs),
+                            span=span,
+                        ):
+                            span.received(text)
+                            for name, key, value in parser.feed(text):
+                                value = _normalize_plan_event(name, key, value)
+                                if value is None:
+                                    continue
+                                if name == "day":
+                                    key = value["day"]
+                                if (name, key) not in emitted:
+                                    emitted.add((name, key))
+                                    yield name, key, value
 
-        genai.configure(api_key=api_key)
+                    result = _parse_response(span, parser.buffer, parse_plan_response)
+                break
+            except AIResponseError as e:
+                if attempt >= retries:
+                    raise
+                current_app.logger.warning(f"AIの応答が使えないため作り直します（{attempt + 1}回目）: {e}")
 
-        system_prompt = "あなたは日本の旅行プランを作成するプロのAIアシスタントです。"
+    except AIRateLimitError:
+        # 混雑は呼び出し元で 503 などにするため、包まずに送る
+        raise
+    except Exception as e:
+        current_app.logger.error(f"AIサービスでエラーが発生: {e}")
+        raise Exception(f"AIプランの生成に失敗しました: {e}")
 
-        current_app.logger.info("出発地点",start_point)
-        user_prompt = f"""
+    if ai_cache.enabled and _is_cacheable_plan(result):
+        ai_cache.set("plan", cache_key, result)
+    yield "result", None, result
+
+
+def _normalize_plan_event(name, key, value):
+    """ストリーミングの途中経過の型をそろえる（使えない交通手段・日程は None。日程の key は 0 始まりの位置）。"""
+    if name == "transport":
+        return normalize_transport_option(value)
+    if name == "day":
+        return normalize_day(value, key)
+    return value if isinstance(value, str) and value.strip() else None
+
+
+def _response_retries():
+    return current_app.config.get("AI_RESPONSE_RETRIES", 1)
+
+
+def _parse_response(span, text, parse):
+    """
+    応答を検証して返す（span の中で呼ぶ）。直して使えた場合は outcome を repaired にする。
+    空の応答・直しても使えない応答は AIResponseError。
+    """
+    if not (text or "").strip():
+        span.outcome = OUTCOME_EMPTY
+        raise AIResponseError("AIからの応答が空でした。")
+    with span.parsing():
+        result, issues = parse(text)
+    if issues:
+        span.outcome = OUTCOME_REPAIRED
+        current_app.logger.warning(f"AIの応答を修正して使います（{span.function}）: {', '.join(issues)}")
+    return result
+
+
+def _generate_json(function, task, system_prompt, user_prompt, inputs, parse):
+    """
+    AI_PROVIDER で選んだプロバイダで生成し、時間・サイズ・結果を記録する（app/services/ai_metrics.py）。
+    応答は parse（app/services/ai_response.py）で検証・修復し、直しても使えない場合だけ
+    AI_RESPONSE_RETRIES 回まで作り直す（API のエラーやタイムアウトは作り直さずにそのまま送る）。
+    呼び出し枠が空かなければ AIRateLimitError。
+    """
+    provider = ai_provider.current
+    retries = _response_retries()
+    for attempt in range(retries + 1):
+        try:
+            with ai_metrics.span(function, provider, user_prompt) as span:
+                # 全ワーカーで共有する呼び出し枠を取る（app/services/ai_limiter.py）
+                with ai_limiter.slot(span):
+                    text = provider.generate_text(task, system_prompt, user_prompt, inputs, span=span)
+                span.received(text)
+                return _parse_response(span, text, parse)
+        except AIResponseError as e:
+            if attempt >= retries:
+                raise
+            current_app.logger.warning(f"AIの応答が使えないため作り直します（{function} {attempt + 1}回目）: {e}")
+
+
+def _plan_inputs(destination, start_point, days, purpose_raw, **kwargs):
+    return {
+        "destination": destination,
+        "start_point": start_point,
+        "days": days,
+        "purpose": purpose_raw,
+        "travel_style": kwargs.get("travel_style", "特になし"),
+    }
+
+
+def _plan_prompt(destination, start_point, days, purpose_raw, **kwargs):
+    return f"""
         以下の条件に基づいて、日本の旅行プランを「主要交通手段の提案」「日程」を含む
         厳密なJSON形式で出力してください。
         
@@ -86,42 +264,74 @@ def generate_plan_from_inputs(destination,start_point, days, purpose_raw, **kwar
         """
 
 
-        generation_config = GenerationConfig(response_mime_type="application/json")
-        
-        model = genai.GenerativeModel(
-            model_name="gemini-2.5-flash-preview-09-2025",
-            system_instruction=system_prompt
-        )
+def _generate_plan_from_inputs(destination,start_point, days, purpose_raw, **kwargs):    
+    try:
+        current_app.logger.info("出発地点",start_point)
+        user_prompt = _plan_prompt(destination, start_point, days, purpose_raw, **kwargs)
 
-        response = model.generate_content(
+        return _generate_json(
+            "generate_plan_from_inputs",
+            TASK_PLAN,
+            PLAN_SYSTEM_PROMPT,
             user_prompt,
-            generation_config=generation_config
+            _plan_inputs(destination, start_point, days, purpose_raw, **kwargs),
+            parse_plan_response,
         )
 
-        if not response.text:
-            raise Exception("AIからの応答が空でした。")
-
-        ai_response_content = response.text
-            
-        return json.loads(ai_response_content)
-
+    except AIRateLimitError:
+        raise
     except Exception as e:
         current_app.logger.error(f"AIサービスでエラーが発生: {e}")
         raise Exception(f"AIプランの生成に失敗しました: {e}")
     
 
-def generate_item_list_from_plan(plan,schedule_json):    
-    try:
-        api_key = current_app.config['GEMINI_API_KEY']
-        
-        if not api_key:
-            raise ValueError("GEMINI_API_KEYが設定されていません。")
+def generate_item_list_from_plan(plan, schedule_json, use_cache=True):
+    """
+    プランと日程から持ち物リストを AI で生成する。
+    条件（行き先・出発地・日数・目的・オプション）と日程が同じ生成結果があればそれを返す
+    （コピーしたプランなど。app/services/ai_cache.py）。
+    日程は要約してからプロンプトに入れる（AI_CHECKLIST_COMPACT_PROMPT。app/services/prompt_compaction.py）ため、
+    キーも要約で作る（時刻や移動メモだけの編集では作り直さない）。
+    """
+    compact = _use_compact_checklist_prompt()
+    schedule_key = compact_schedule(schedule_json, days=plan.days) if compact else schedule_json
+    cache_key = make_key(
+        "checklist",
+        destination=plan.destination,
+        departure=plan.departure,
+        days=plan.days,
+        purpose=plan.purpose or "",
+        options=split_list(plan.options),
+        schedule=digest(schedule_key),
+        compact=compact,
+    )
+    return ai_cache.get_or_generate(
+        "checklist",
+        cache_key,
+        lambda: _generate_item_list_from_plan(plan, schedule_json, compact=compact),
+        bypass=not use_cache,
+        cacheable=lambda value: isinstance(value, dict) and bool(value.get("checklist")),
+    )
 
-        genai.configure(api_key=api_key)
 
-        system_prompt = "あなたは日本の旅行プランから旅行に必要な持ち物を提案するプロのAIアシスタントです。"
+def _use_compact_checklist_prompt():
+    return current_app.config.get("AI_CHECKLIST_COMPACT_PROMPT", True)
 
-        user_prompt = f"""
+
+def build_checklist_prompt(plan, schedule_json, compact=None):
+    """
+    持ち物リスト生成のユーザープロンプト。
+    compact=True なら日程を要約して入れ、False なら日程をそのまま入れる（None は設定に従う）。
+    """
+    if compact is None:
+        compact = _use_compact_checklist_prompt()
+    if compact:
+        schedule_label = "日程の要約（泊数と、日ごとの行き先 | 屋外/屋内 | シーン | 移動）"
+        schedule_text = "\n" + render_compact_schedule(compact_schedule(schedule_json, days=plan.days))
+    else:
+        schedule_label = "スケジュール"
+        schedule_text = schedule_json
+    return f"""
         以下の条件に基づいて、日本の旅行プランから持ち物リストを
         厳密なJSON形式で出力してください。
         
@@ -131,7 +341,7 @@ def generate_item_list_from_plan(plan,schedule_json):
         - 日数: {plan.days}
         - 目的: {plan.purpose}
         - オプション: {plan.options}
-        - スケジュール: {schedule_json}
+        - {schedule_label}: {schedule_text}
         
         # 出力JSON形式
         {{
@@ -160,30 +370,33 @@ def generate_item_list_from_plan(plan,schedule_json):
         }}
         """
 
-        generation_config = GenerationConfig(response_mime_type="application/json")
-        
-        model = genai.GenerativeModel(
-            model_name="gemini-2.5-flash-preview-09-2025",
-            system_instruction=system_prompt
-        )
 
-        response = model.generate_content(
+def _generate_item_list_from_plan(plan, schedule_json, compact=None):    
+    try:
+        user_prompt = build_checklist_prompt(plan, schedule_json, compact=compact)
+
+        parsed_response = _generate_json(
+            "generate_item_list_from_plan",
+            TASK_CHECKLIST,
+            CHECKLIST_SYSTEM_PROMPT,
             user_prompt,
-            generation_config=generation_config
+            {
+                "destination": plan.destination,
+                "departure": plan.departure,
+                "days": plan.days,
+                "purpose": plan.purpose,
+                "options": plan.options,
+            },
+            parse_checklist_response,
         )
-
-        if not response.text:
-            raise Exception("AIからの応答が空でした。")
-
-        ai_response_content = response.text
-
-        parsed_response = json.loads(ai_response_content)
         # ログは要点だけを出力（JSONが長すぎるため）
         checklist_info = f"カテゴリ数: {len(parsed_response.get('checklist', []))}"
         current_app.logger.info(f"aiからの返答 - {checklist_info}")
             
         return parsed_response
 
+    except AIRateLimitError:
+        raise
     except Exception as e:
         current_app.logger.error(f"AIサービスでエラーが発生: {e}")
         raise Exception(f"AIプランの生成に失敗しました: {e}")
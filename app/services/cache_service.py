@@ -0,0 +1,301 @@
+"""
+描画済み HTML 断片のキャッシュ。
+
+バックエンドは設定で切り替える（PAGE_CACHE_BACKEND）。
+- "sqlite": SQLite ファイルによるキャッシュ（同じホストの gunicorn ワーカー間で共有。既定）
+- "memory": cachetools.TTLCache によるプロセス内キャッシュ（ワーカーごとに独立）
+  ワーカーごとに別々のキャッシュになり、無効化も他のワーカーに届かないため、
+  gunicorn を複数ワーカーで動かす場合はキャッシュしない（gunicorn.conf.py の post_worker_init で切り替える）
+- "none":   キャッシュしない
+
+キーは namespace 単位で無効化でき、namespace ごとのヒット/ミス回数を記録する。
+
+SQLite は同時に 1 つしか書き込めないため、読み出し（ヒット）のたびには書き込まない。
+- ヒット/ミス回数はプロセス内で数え、PAGE_CACHE_STATS_FLUSH_INTERVAL 秒ごとにまとめて書き込む
+- 最後に使われた時刻（件数上限での追い出し順）は、PAGE_CACHE_TOUCH_INTERVAL 秒より古い場合だけ書き直す
+"""
+import atexit
+import os
+import sqlite3
+import threading
+import time
+
+from cachetools import TTLCache
+from flask import current_app
+
+
+class MemoryCacheStore:
+    """プロセス内の TTL キャッシュ。"""
+
+    def __init__(self, ttl, maxsize):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def get(self, namespace, key):
+        with self._lock:
+            return self._cache.get((namespace, key))
+
+    def set(self, namespace, key, value):
+        with self._lock:
+            self._cache[(namespace, key)] = value
+
+    def invalidate(self, namespace):
+        with self._lock:
+            for cache_key in [k for k in list(self._cache.keys()) if k[0] == namespace]:
+                self._cache.pop(cache_key, None)
+
+    def discard(self, namespace, key):
+        with self._lock:
+            self._cache.pop((namespace, key), None)
+
+    def record(self, namespace, hit):
+        with self._lock:
+            stats = self._stats.setdefault(namespace, {"hits": 0, "misses": 0})
+            stats["hits" if hit else "misses"] += 1
+
+    def stats(self):
+        with self._lock:
+            return {ns: dict(values) for ns, values in self._stats.items()}
+
+
+class SQLiteCacheStore:
+    """SQLite ファイルを使ったワーカー間共有キャッシュ。"""
+
+    def __init__(self, path, ttl, maxsize, touch_interval=None, stats_flush_interval=30):
+        self.path = path
+        self.ttl = ttl
+        self.maxsize = maxsize
+        # 既定は TTL の 1/4（それより短い間隔で読まれても last_used は書き直さない）
+        self.touch_interval = ttl / 4 if touch_interval is None else touch_interval
+        self.stats_flush_interval = stats_flush_interval
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._pending_stats = {}
+        self._stats_flushed_at = time.monotonic()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(page_cache)")]
+        if columns and "last_used" not in columns:
+            # last_used の無い古い形式のファイル。中身はキャッシュなので作り直す
+            conn.execute("DROP TABLE page_cache")
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS page_cache (
+                cache_key TEXT PRIMARY KEY,
+                namespace TEXT NOT NULL,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_page_cache_namespace ON page_cache (namespace);
+            CREATE INDEX IF NOT EXISTS ix_page_cache_expires_at ON page_cache (expires_at);
+            CREATE INDEX IF NOT EXISTS ix_page_cache_last_used ON page_cache (last_used);
+            CREATE TABLE IF NOT EXISTS page_cache_stats (
+                namespace TEXT PRIMARY KEY,
+                hits INTEGER NOT NULL DEFAULT 0,
+                misses INTEGER NOT NULL DEFAULT 0
+            );
+            """
+        )
+        atexit.register(self.flush_stats)
+
+    def _connect(self):
+        # fork 後やスレッドごとに接続を作り直す
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def _cache_key(namespace, key):
+        return f"{namespace}:{key}"
+
+    def get(self, namespace, key):
+        now = time.time()
+        cache_key = self._cache_key(namespace, key)
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT value, last_used FROM page_cache WHERE cache_key = ? AND expires_at > ?",
+            (cache_key, now),
+        ).fetchone()
+        if row is None:
+            return None
+        value, last_used = row
+        if last_used <= now - self.touch_interval:
+            conn.execute("UPDATE page_cache SET last_used = ? WHERE cache_key = ?", (now, cache_key))
+        return value
+
+    def set(self, namespace, key, value):
+        now = time.time()
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO page_cache (cache_key, namespace, value, expires_at, last_used) VALUES (?, ?, ?, ?, ?)",
+            (self._cache_key(namespace, key), namespace, value, now + self.ttl, now),
+        )
+        # 期限切れの削除と件数上限（最後に使われてから長いものから捨てる）
+        conn.execute("DELETE FROM page_cache WHERE expires_at <= ?", (now,))
+        conn.execute(
+            "DELETE FROM page_cache WHERE cache_key IN ("
+            "SELECT cache_key FROM page_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.maxsize,),
+        )
+
+    def invalidate(self, namespace):
+        self._connect().execute("DELETE FROM page_cache WHERE namespace = ?", (namespace,))
+
+    def discard(self, namespace, key):
+        self._connect().execute("DELETE FROM page_cache WHERE cache_key = ?", (self._cache_key(namespace, key),))
+
+    def record(self, namespace, hit):
+        with self._stats_lock:
+            counts = self._pending_stats.setdefault(namespace, [0, 0])
+            counts[0 if hit else 1] += 1
+            due = time.monotonic() - self._stats_flushed_at >= self.stats_flush_interval
+        if due:
+            self.flush_stats()
+
+    def flush_stats(self):
+        """プロセス内で数えたヒット/ミス回数をファイルに足し込む。戻り値: 書き込めたかどうか"""
+        with self._stats_lock:
+            pending, self._pending_stats = self._pending_stats, {}
+            self._stats_flushed_at = time.monotonic()
+        if not pending:
+            return True
+        try:
+            with self._connect() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany(
+                    "INSERT INTO page_cache_stats (namespace, hits, misses) VALUES (?, ?, ?) "
+                    "ON CONFLICT(namespace) DO UPDATE SET hits = hits + excluded.hits, misses = misses + excluded.misses",
+                    [(namespace, hits, misses) for namespace, (hits, misses) in pending.items()],
+                )
+        except sqlite3.Error:
+            # 書けなかった分は次の書き込みに回す
+            with self._stats_lock:
+                for namespace, (hits, misses) in pending.items():
+                    counts = self._pending_stats.setdefault(namespace, [0, 0])
+                    counts[0] += hits
+                    counts[1] += misses
+            return False
+        return True
+
+    def stats(self):
+        """全ワーカーの書き込み済みの回数に、このプロセスのまだ書き込んでいない回数を足したもの。"""
+        rows = self._connect().execute("SELECT namespace, hits, misses FROM page_cache_stats").fetchall()
+        result = {ns: {"hits": hits, "misses": misses} for ns, hits, misses in rows}
+        with self._stats_lock:
+            for namespace, (hits, misses) in self._pending_stats.items():
+                values = result.setdefault(namespace, {"hits": 0, "misses": 0})
+                values["hits"] += hits
+                values["misses"] += misses
+        return result
+
+
+class PageCache:
+    """Flask 拡張と同じく init_app で設定を読み込むキャッシュの窓口。"""
+
+    def __init__(self, app=None):
+        self.store = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        backend = app.config.get("PAGE_CACHE_BACKEND", "sqlite")
+        ttl = app.config.get("PAGE_CACHE_TTL", 60)
+        maxsize = app.config.get("PAGE_CACHE_MAXSIZE", 256)
+        if backend == "sqlite":
+            path = app.config.get("PAGE_CACHE_PATH") or os.path.join(app.instance_path, "page_cache.sqlite3")
+            self.store = SQLiteCacheStore(
+                path,
+                ttl=ttl,
+                maxsize=maxsize,
+                touch_interval=app.config.get("PAGE_CACHE_TOUCH_INTERVAL"),
+                stats_flush_interval=app.config.get("PAGE_CACHE_STATS_FLUSH_INTERVAL", 30),
+            )
+        elif backend == "memory":
+            self.store = MemoryCacheStore(ttl=ttl, maxsize=maxsize)
+        else:
+            self.store = None
+        app.extensions["page_cache"] = self
+
+    def use_workers(self, workers):
+        """
+        ワーカー数に合わせてバックエンドを確かめる。プロセス内キャッシュを複数ワーカーで使うと
+        ワーカーごとに内容が食い違う（無効化も届かない）ため、キャッシュしないようにして True を返す。
+        """
+        if workers > 1 and isinstance(self.store, MemoryCacheStore):
+            self.store = None
+            return True
+        return False
+
+    def get_or_render(self, namespace, key, render):
+        """キャッシュがあればそれを返し、なければ render() の結果を保存して返す（None は保存しない）。"""
+        if self.store is None:
+            return render()
+        try:
+            value = self.store.get(namespace, key)
+            self.store.record(namespace, value is not None)
+        except sqlite3.Error as e:
+            current_app.logger.warning(f"Page cache read failed: {e}")
+            return render()
+        if value is not None:
+            return value
+
+        value = render()
+        if value is None:
+            return None
+        try:
+            self.store.set(namespace, key, value)
+        except sqlite3.Error as e:
+            current_app.logger.warning(f"Page cache write failed: {e}")
+        return value
+
+    def invalidate(self, namespace):
+        if self.store is None:
+            return
+        try:
+            self.store.invalidate(namespace)
+        except sqlite3.Error as e:
+            current_app.logger.warning(f"Page cache invalidation failed: {e}")
+
+    def discard(self, namespace, key):
+        """namespace の中の 1 件だけを消す。"""
+        if self.store is None:
+            return
+        try:
+            self.store.discard(namespace, key)
+        except sqlite3.Error as e:
+            current_app.logger.warning(f"Page cache invalidation failed: {e}")
+
+    def stats(self):
+        """namespace ごとの {"hits", "misses", "hit_ratio"} を返す。"""
+        if self.store is None:
+            return {}
+        result = {}
+        for namespace, values in self.store.stats().items():
+            total = values["hits"] + values["misses"]
+            result[namespace] = {**values, "hit_ratio": (values["hits"] / total) if total else 0.0}
+        return result
+
+
+page_cache = PageCache()
+
+# 公開プラン一覧の namespace（テンプレートの公開・更新・削除で無効化する）
+PUBLIC_PLANS_NAMESPACE = "public_plans"
+
+
+def invalidate_public_plans():
+    page_cache.invalidate(PUBLIC_PLANS_NAMESPACE)
+
+
+# 共有ビュー（未ログイン向け）の namespace。キーは共有トークンで、ヒット時に DB を読まずに返せるよう
+# 描画結果と ETag / 更新日時をまとめて保存する。表示内容が変わるたびに静的出力と一緒に作り直すため、
+# share_export.export_share / remove_exports でトークンのエントリを消す
+SHARE_VIEWS_NAMESPACE = "share_views"
@@ -0,0 +1,161 @@
+"""
+持ち物リストの先読み。
+
+プラン生成ジョブが日程を保存したら、利用者が /plans/checklists で生成ボタンを押すのを待たずに
+ワーカースレッドで generate_item_list_from_plan を呼び、結果を status="prefetched" の Checklist として保存しておく。
+checklist_generate は先読み済みのものがあれば status を "draft" に変えてそのまま使う。
+先読み中なら待たずに "pending"（202）を返し、生成ボタンの画面が間をおいて同じリクエストを送り直す。
+
+先読み中・先読み済みの Checklist（PREFETCH_STATUSES）は一覧・詳細・コピーの対象にしない。
+日程を編集したら cancel() で先読みを取り消す（生成中なら、終わったときに保存しない）。
+
+- CHECKLIST_PREFETCH_ENABLED: True なら先読みする（既定は False）
+- CHECKLIST_PREFETCH_WORKERS: プロセスごとのワーカースレッド数。0 ならスレッドを使わず run() の明示呼び出しのみ
+- CHECKLIST_PREFETCH_WAIT: 生成ボタンが押されたときに先読み中なら、画面が送り直しながら待つ秒数
+  （過ぎたら wait=False で送り、先読みを取り消してその場で生成する）
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app.extensions import db
+from app.models.checklist import CHECKLIST_PREFETCHED, CHECKLIST_PREFETCHING, PREFETCH_STATUSES, Checklist
+from app.models.plan import Plan
+from app.services import ai_service
+from app.services.db_service import PlanDBService
+
+# take() の結果
+TAKE_READY = "ready"
+TAKE_PENDING = "pending"
+TAKE_NONE = "none"
+
+
+class ChecklistPrefetcher:
+    """Flask 拡張と同じく init_app で設定を読み込む、持ち物リスト先読みの窓口。"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get("CHECKLIST_PREFETCH_ENABLED", False)
+        self.workers = app.config.get("CHECKLIST_PREFETCH_WORKERS", 1)
+        self.wait_seconds = app.config.get("CHECKLIST_PREFETCH_WAIT", 10)
+        app.extensions["checklist_prefetch"] = self
+
+    def submit(self, plan_id):
+        """
+        先読みを積む（アプリコンテキスト内で呼ぶ）。status="prefetching" の Checklist を作ってワーカーに渡す。
+        既にチェックリストか先読みがあれば何もしない。戻り値: 作った Checklist（積まなかった場合は None）
+        """
+        if not self.enabled:
+            return None
+        plan = db.session.get(Plan, plan_id)
+        if plan is None or Checklist.query.filter_by(plan_id=plan_id).first() is not None:
+            return None
+        checklist = Checklist(plan_id=plan_id, title=f"{plan.title}の持ち物リスト", status=CHECKLIST_PREFETCHING)
+        db.session.add(checklist)
+        db.session.commit()
+        executor = self._get_executor()
+        if executor is not None:
+            executor.submit(self._run_in_context, checklist.checklist_id)
+        return checklist
+
+    def run(self, checklist_id):
+        """
+        先読みを 1 件実行する（アプリコンテキスト内で呼ぶ）。
+        生成が終わった時点でまだ "prefetching" のまま残っている（取り消されていない）場合だけ保存する。
+        戻り値: 保存したかどうか
+        """
+        checklist = db.session.get(Checklist, checklist_id)
+        if checklist is None or checklist.status != CHECKLIST_PREFETCHING:
+            return False
+        plan = checklist.plan
+        schedule = PlanDBService.get_schedule_by_id(plan.id, plan.user_id)
+        try:
+            if schedule is None:
+                raise ValueError("日程がありません。")
+            response = ai_service.generate_item_list_from_plan(plan, schedule.daily_plan_json)
+            if not response or "checklist" not in response:
+                raise ValueError("AIの応答に checklist がありません。")
+        except Exception as e:
+            self.app.logger.warning(f"Checklist prefetch failed: plan_id={plan.id}: {e}")
+            db.session.rollback()
+            self.cancel(plan.id)
+            return False
+
+        # 取り消し（行の削除）と競合しないよう、状態を条件にして更新できた場合だけ項目を保存する
+        claimed = Checklist.query.filter_by(checklist_id=checklist_id, status=CHECKLIST_PREFETCHING).update(
+            {"status": CHECKLIST_PREFETCHED}
+        )
+        if not claimed:
+            db.session.rollback()
+            return False
+        # add_items_to_checklist が状態の更新とまとめて commit する
+        return PlanDBService.add_items_to_checklist(checklist_id, response.get("checklist", []))
+
+    def take(self, plan_id, wait=True):
+        """
+        先読み済みのチェックリストを利用者のものにする（status を "draft" にする）。リクエストの中では待たない。
+        先読み中なら、wait が真なら TAKE_PENDING（呼び出し元は間をおいてやり直す）、偽なら取り消して TAKE_NONE。
+        戻り値: (TAKE_READY | TAKE_PENDING | TAKE_NONE, 使える Checklist または None)
+        TAKE_NONE の場合、呼び出し元は通常どおり生成する。
+        """
+        checklist = Checklist.query.filter(
+            Checklist.plan_id == plan_id, Checklist.status.in_(PREFETCH_STATUSES)
+        ).first()
+        if checklist is None:
+            return TAKE_NONE, None
+        if checklist.status == CHECKLIST_PREFETCHING:
+            if wait:
+                return TAKE_PENDING, None
+            self.cancel(plan_id)
+            return TAKE_NONE, None
+        # 同時に押された生成ボタンのリクエストとは、状態を条件にした更新で 1 つだけが使う
+        claimed = Checklist.query.filter_by(checklist_id=checklist.checklist_id, status=CHECKLIST_PREFETCHED).update(
+            {"status": "draft"}
+        )
+        db.session.commit()
+        if not claimed:
+            return TAKE_NONE, None
+        db.session.refresh(checklist)
+        return TAKE_READY, checklist
+
+    def cancel(self, plan_id):
+        """プランの先読み（先読み中・先読み済み）を取り消す。戻り値: 取り消した件数"""
+        checklists = Checklist.query.filter(
+            Checklist.plan_id == plan_id, Checklist.status.in_(PREFETCH_STATUSES)
+        ).all()
+        for checklist in checklists:
+            db.session.delete(checklist)
+        if checklists:
+            db.session.commit()
+        return len(checklists)
+
+    def _run_in_context(self, checklist_id):
+        try:
+            with self.app.app_context():
+                self.run(checklist_id)
+        except Exception as e:
+            self.app.logger.error(f"Checklist prefetch worker error: checklist_id={checklist_id}: {e}")
+
+    def _get_executor(self):
+        # gunicorn の fork 後はスレッドが引き継がれないため、プロセスごとに作る
+        if self.app is None or not self.workers:
+            return None
+        if self._executor_pid == os.getpid():
+            return self._executor
+        with self._lock:
+            if self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="checklist-prefetch")
+                self._executor_pid = os.getpid()
+            return self._executor
+
+
+checklist_prefetch = ChecklistPrefetcher()
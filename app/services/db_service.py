@@ -1,9 +1,226 @@
 from app.extensions import db, bcrypt
 from app.models.user import User
-from app.models.plan import Plan, Template, TransportSnapshot, Schedule, HotelSnapshot, Share
-from app.models.checklist import Checklist,ChecklistItem,Item,Category
+from app.models.plan import Plan, Template, TransportSnapshot, Schedule, HotelSnapshot, Share, Tag, TemplateTag, TemplateStats
+from app.models.checklist import Checklist,ChecklistItem,Item,Category,PREFETCH_STATUSES
+from app.services import search_service
+from app.services.cache_service import invalidate_public_plans
+from app.services.share_export import refresh_template_exports
+from app.services.stats_service import template_stats
 from flask_login import current_user
+from sqlalchemy import delete, func, select, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import contains_eager, joinedload
 from uuid import uuid4
+from datetime import datetime
+import base64
+import binascii
+import hashlib
+import json
+import re
+import unicodedata
+
+
+def escape_like(value):
+    """LIKE / ILIKE のワイルドカード文字をエスケープする（escape="\\" と組み合わせて使う）。"""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+_TAG_SEPARATOR = re.compile(r"[,、，\n\r]+")
+
+
+def split_tags(value):
+    """カンマ区切りの tags 文字列を、正規化したタグ名のリスト（重複なし・順序維持）にする。"""
+    names = []
+    for part in _TAG_SEPARATOR.split(unicodedata.normalize("NFKC", value or "")):
+        name = part.strip().lstrip("#").strip()[:100]
+        if name:
+            names.append(name)
+    return list(dict.fromkeys(names))
+
+
+def normalize_tag(value):
+    """絞り込みに指定されたタグ名を split_tags と同じ規則で正規化する（"＃京都" → "京都"。空なら ""）。"""
+    names = split_tags(value)
+    return names[0] if names else ""
+
+
+def _insert_tags_ignore(names):
+    """同じ名前のタグが既にあれば何もしない INSERT（別のリクエストが同時に同じタグを作っても失敗しない）。"""
+    dialect = postgresql if db.engine.dialect.name == "postgresql" else sqlite
+    return (
+        dialect.insert(Tag.__table__)
+        .values([{"name": name} for name in names])
+        .on_conflict_do_nothing(index_elements=["name"])
+    )
+
+
+def public_filter_clauses(filters, exclude=None):
+    """
+    公開一覧のファセット絞り込み条件を WHERE 句のリストにする。
+    filters: {"days": int, "tag": str, "destination": str}（値が空のものは無視）
+    exclude: 指定したファセットの条件は含めない（そのファセット自身の件数集計用）
+    """
+    filters = filters or {}
+    clauses = []
+    if filters.get("days") and exclude != "days":
+        clauses.append(Template.days == filters["days"])
+    tag = normalize_tag(filters.get("tag")) if exclude != "tag" else ""
+    if tag:
+        clauses.append(
+            Template.template_id.in_(
+                select(TemplateTag.template_id).join(Tag).where(Tag.name == tag)
+            )
+        )
+    if filters.get("destination") and exclude != "destination":
+        clauses.append(Template.plan_id.in_(select(Plan.id).where(Plan.destination == filters["destination"])))
+    return clauses
+
+
+PUBLIC_SORTS = ("new", "popular")
+
+
+def encode_cursor(template, direction="next", sort="new"):
+    """
+    公開一覧のキーセットページング用カーソル（並び順の値 + template_id + 方向）を不透明な文字列にする。
+    sort="new" は created_at、sort="popular" は人気スコア（TemplateStats.score）を値にする。
+    """
+    if sort == "popular":
+        value = template.stats.score if template.stats else 0.0
+    else:
+        value = template.created_at.isoformat()
+    payload = json.dumps(
+        {"c": value, "id": template.template_id, "d": direction, "s": sort},
+        separators=(",", ":"),
+    )
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor, sort="new"):
+    """encode_cursor の逆変換。不正なカーソルや並び順の違うカーソルは None を返す（先頭ページ扱い）。"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+        if payload.get("s", "new") != sort:
+            return None
+        return {
+            "value": float(payload["c"]) if sort == "popular" else datetime.fromisoformat(payload["c"]),
+            "template_id": int(payload["id"]),
+            "direction": "prev" if payload.get("d") == "prev" else "next",
+        }
+    except (ValueError, TypeError, KeyError, binascii.Error, UnicodeError, AttributeError):
+        return None
+
+
+_NOT_LOADED = object()
+
+
+def resolve_selected_hotel(plan, selected_snapshot=_NOT_LOADED):
+    """
+    Plan.hotel JSON から選択中のホテルを返す。見つからなければ HotelSnapshot にフォールバックする。
+    selected_snapshot に事前取得済みの HotelSnapshot（または None）を渡すと追加クエリを発行しない。
+    """
+    if not plan:
+        return None
+    hotel_json = plan.hotel or {}
+    candidates = hotel_json.get("candidates", []) or []
+    selected_id = hotel_json.get("selected_id")
+
+    selected_hotel = None
+    if selected_id is not None:
+        selected_hotel = next(
+            (c for c in candidates if str(c.get("id")) == str(selected_id)),
+            None,
+        )
+    if not selected_hotel:
+        selected_hotel = next(
+            (c for c in candidates if c.get("is_selected")),
+            None,
+        )
+    if not selected_hotel:
+        if selected_snapshot is _NOT_LOADED:
+            snapshot = HotelSnapshot.query.filter_by(plan_id=plan.id, is_selected=True).first()
+        else:
+            snapshot = selected_snapshot
+        if snapshot:
+            selected_hotel = {"name": snapshot.name, "price": snapshot.price}
+    return selected_hotel
+
+
+def outline_traffic_methods(itinerary_outline):
+    """itinerary_outline_json の days[].traffic_method を重複なしで抽出する。"""
+    traffic_methods = []
+    days = []
+    if isinstance(itinerary_outline, dict):
+        days = itinerary_outline.get("days", [])
+    for d in days:
+        tm = d.get("traffic_method")
+        if tm and tm not in traffic_methods:
+            traffic_methods.append(tm)
+    return traffic_methods
+
+
+def outline_stay_locations(itinerary_outline):
+    """itinerary_outline_json の days[].places を重複なしで抽出する。"""
+    stay_locations = []
+    days = []
+    if isinstance(itinerary_outline, dict):
+        days = itinerary_outline.get("days", [])
+    for d in days:
+        for place in d.get("places", []):
+            stay_locations.append(place)
+    return list(dict.fromkeys(stay_locations))
+
+
+def bump_display_version(template):
+    """表示内容が変わったことを示すためにテンプレートの display_version を上げる（共有ビュー・詳細の ETag に使う）。"""
+    template.display_version = (template.display_version or 1) + 1
+
+
+def _summary_values(template):
+    return (
+        template.summary_transport,
+        template.summary_transport_type,
+        template.summary_hotel_name,
+        template.summary_hotel_price,
+        template.summary_stay_locations,
+    )
+
+
+# 一覧カードでホテル名の代わりに出すラベル（ホテルの候補があるが名前が決まっていない場合）
+HOTEL_PENDING_LABEL = "選択中"
+
+
+def build_template_summary(template, plan, selected_transit, selected_hotel_snapshot):
+    """一覧カード用の要約カラム（Template.summary_*）の値を組み立てる。"""
+    if selected_transit:
+        transport = selected_transit.transport_method or ""
+        transport_type = selected_transit.type
+    else:
+        transport = " / ".join(outline_traffic_methods(template.itinerary_outline_json or {}))
+        transport_type = None
+
+    selected_hotel = resolve_selected_hotel(plan, selected_hotel_snapshot) if plan else None
+    if selected_hotel and selected_hotel.get("name"):
+        hotel_name = selected_hotel["name"]
+    elif selected_hotel or (plan and plan.hotel):
+        # 名前のないホテルが選ばれている・候補はあるがまだ選んでいない場合は、これまでの一覧と同じく「選択中」と出す
+        hotel_name = HOTEL_PENDING_LABEL
+    else:
+        hotel_name = None
+    try:
+        hotel_price = int(selected_hotel.get("price")) if selected_hotel and selected_hotel.get("price") not in (None, "", "None") else None
+    except (TypeError, ValueError):
+        hotel_price = None
+
+    return {
+        "summary_transport": transport if plan else "",
+        "summary_transport_type": transport_type if plan else None,
+        "summary_hotel_name": hotel_name or None,
+        "summary_hotel_price": hotel_price,
+        "summary_stay_locations": outline_stay_locations(template.itinerary_outline_json or {}),
+    }
 
 
 class UserDBService:
@@ -41,6 +258,70 @@ class PlanDBService:
             .all()
         )
     
+    @staticmethod
+    def _card_options():
+        """一覧カードで参照する Plan.start_date を同じ SELECT で JOIN して読み込む。"""
+        return joinedload(Template.plan).load_only(Plan.id, Plan.start_date)
+
+    @staticmethod
+    def _user_templates_query(user_id, q=None):
+        query = Template.query.filter(Template.user_id == user_id)
+        if q:
+            query = query.filter(Template.public_title.ilike(f"%{escape_like(q)}%", escape="\\"))
+        return query
+
+    @staticmethod
+    def count_templates_by_user_id(user_id, q=None):
+        """検索条件に一致するテンプレート件数を SQL の COUNT で取得する。"""
+        return PlanDBService._user_templates_query(user_id, q).count()
+
+    @staticmethod
+    def get_templates_page_by_user_id(user_id, q=None, page=1, per_page=8):
+        """
+        ユーザーのテンプレートを 1 ページ分だけ取得する。
+        検索（大文字小文字を区別しない部分一致）・並び替え・LIMIT/OFFSET は SQL 側で行う。
+        page はルート側の resolve_page で補正済みのものを渡す。
+        """
+        page = max(1, page or 1)
+        return (
+            PlanDBService._user_templates_query(user_id, q)
+            .options(PlanDBService._card_options())
+            .order_by(Template.created_at.desc(), Template.template_id.desc())
+            .limit(per_page)
+            .offset((page - 1) * per_page)
+            .all()
+        )
+
+    @staticmethod
+    def search_templates(q, user_id=None, public_only=False, page=1, per_page=8, filters=None):
+        """
+        タイトル・説明・タグ・日程中の地名を n-gram インデックスで検索する。
+        PostgreSQL では tsvector(GIN)、SQLite では FTS5 を使い、関連度順に 1 ページ分返す。
+        filters を指定するとファセット（日数・タグ・行き先）でも絞り込む。
+        戻り値: (templates, total)
+        """
+        return search_service.search_templates(
+            q,
+            user_id=user_id,
+            public_only=public_only,
+            page=page,
+            per_page=per_page,
+            clauses=public_filter_clauses(filters),
+        )
+
+    @staticmethod
+    def refresh_search_index(template_ids=None):
+        """検索ドキュメントを作り直す（template_ids 省略時は全件）。"""
+        query = Template.query
+        if template_ids is not None:
+            query = query.filter(Template.template_id.in_(template_ids))
+        count = 0
+        for template in query.all():
+            search_service.refresh_template_document(template)
+            count += 1
+        db.session.commit()
+        return count
+
     @staticmethod
     def get_public_templates():
         return (
@@ -49,6 +330,221 @@ class PlanDBService:
             .all()
         )
     
+    @staticmethod
+    def get_public_templates_page(cursor=None, per_page=8, filters=None, sort="new"):
+        """
+        公開テンプレートを (並び順の値, template_id) のキーセットで 1 ページ分取得する。
+        sort="new" は新着順 (created_at)、sort="popular" は人気順 (template_stats.score)。
+        OFFSET を使わないため、何ページ目でもインデックスの範囲走査 1 回で済む。
+        filters を指定するとファセット（日数・タグ・行き先）で絞り込む。
+        戻り値: (templates, prev_cursor, next_cursor)
+        """
+        sort = sort if sort in PUBLIC_SORTS else "new"
+        position = decode_cursor(cursor, sort)
+        query = Template.query.options(PlanDBService._card_options()).filter(
+            Template.visibility == "public", *public_filter_clauses(filters)
+        )
+        if sort == "popular":
+            # スコアはフラッシュ時に計算済みなので、リクエストごとの集計はしない
+            query = query.join(TemplateStats, TemplateStats.template_id == Template.template_id).options(
+                contains_eager(Template.stats)
+            )
+            sort_column = TemplateStats.score
+        else:
+            sort_column = Template.created_at
+        sort_key = tuple_(sort_column, Template.template_id)
+
+        if position and position["direction"] == "prev":
+            rows = (
+                query.filter(sort_key > tuple_(position["value"], position["template_id"]))
+                .order_by(sort_column.asc(), Template.template_id.asc())
+                .limit(per_page + 1)
+                .all()
+            )
+            has_prev = len(rows) > per_page
+            templates = list(reversed(rows[:per_page]))
+            has_next = True
+        else:
+            if position:
+                query = query.filter(sort_key < tuple_(position["value"], position["template_id"]))
+            rows = (
+                query.order_by(sort_column.desc(), Template.template_id.desc())
+                .limit(per_page + 1)
+                .all()
+            )
+            has_next = len(rows) > per_page
+            templates = rows[:per_page]
+            has_prev = position is not None
+
+        if not templates:
+            if position:
+                # 削除などで前後のデータが無くなった場合は先頭ページを返す
+                return PlanDBService.get_public_templates_page(None, per_page, filters, sort)
+            return [], None, None
+
+        prev_cursor = encode_cursor(templates[0], "prev", sort) if has_prev else None
+        next_cursor = encode_cursor(templates[-1], "next", sort) if has_next else None
+        return templates, prev_cursor, next_cursor
+
+    @staticmethod
+    def get_public_facets(filters=None, q=None, limit=10):
+        """
+        公開テンプレートのファセット件数を SQL の GROUP BY で集計する。
+        各ファセットは自身以外の絞り込み条件を適用した件数（選択を切り替えたときの件数）になる。
+        q を指定した場合は検索結果の中で集計する。
+        戻り値: {"days": [(日数, 件数)], "tags": [(タグ名, 件数)], "destinations": [(行き先, 件数)]}
+        """
+        base_clauses = [Template.visibility == "public"]
+        if q:
+            matched = search_service.matching_template_ids(q)
+            if matched is None:
+                return {"days": [], "tags": [], "destinations": []}
+            base_clauses.append(Template.template_id.in_(matched))
+
+        def where(facet):
+            return [*base_clauses, *public_filter_clauses(filters, exclude=facet)]
+
+        template_count = func.count(Template.template_id)
+        days = db.session.execute(
+            select(Template.days, template_count)
+            .where(Template.days.isnot(None), *where("days"))
+            .group_by(Template.days)
+            .order_by(Template.days.asc())
+        ).all()
+        tags = db.session.execute(
+            select(Tag.name, template_count)
+            .select_from(TemplateTag)
+            .join(Tag, Tag.tag_id == TemplateTag.tag_id)
+            .join(Template, Template.template_id == TemplateTag.template_id)
+            .where(*where("tag"))
+            .group_by(Tag.name)
+            .order_by(template_count.desc(), Tag.name.asc())
+            .limit(limit)
+        ).all()
+        destinations = db.session.execute(
+            select(Plan.destination, template_count)
+            .select_from(Template)
+            .join(Plan, Plan.id == Template.plan_id)
+            .where(*where("destination"))
+            .group_by(Plan.destination)
+            .order_by(template_count.desc(), Plan.destination.asc())
+            .limit(limit)
+        ).all()
+        return {
+            "days": [tuple(row) for row in days],
+            "tags": [tuple(row) for row in tags],
+            "destinations": [tuple(row) for row in destinations],
+        }
+
+    @staticmethod
+    def sync_template_tags(template):
+        """
+        テンプレートの tags 文字列をタグテーブル（tags / template_tags）に反映する（commit は呼び出し側で行う）。
+        新しいタグは INSERT ... ON CONFLICT DO NOTHING で作ってから読み直すため、同時に保存されても一意制約違反にならない。
+        """
+        names = split_tags(template.tags)
+        existing = {link.tag.name: link for link in template.tag_links}
+        missing = [name for name in names if name not in existing]
+        tags = {}
+        if missing:
+            db.session.execute(_insert_tags_ignore(missing))
+            tags = {tag.name: tag for tag in Tag.query.filter(Tag.name.in_(missing)).all()}
+        template.tag_links = [existing[name] if name in existing else TemplateTag(tag=tags[name]) for name in names]
+        return names
+
+    @staticmethod
+    def prune_unused_tags():
+        """どのテンプレートにも使われていないタグを削除する（commit は呼び出し側で行う）。戻り値: 削除した件数"""
+        result = db.session.execute(
+            delete(Tag).where(~Tag.tag_id.in_(select(TemplateTag.tag_id))),
+            execution_options={"synchronize_session": False},
+        )
+        return result.rowcount
+
+    @staticmethod
+    def refresh_template_tags(template_ids=None):
+        """タグテーブルを tags 文字列から作り直し、使われなくなったタグを消す（template_ids 省略時は全件）。"""
+        query = Template.query
+        if template_ids is not None:
+            query = query.filter(Template.template_id.in_(template_ids))
+        count = 0
+        for template in query.all():
+            PlanDBService.sync_template_tags(template)
+            count += 1
+        db.session.flush()
+        PlanDBService.prune_unused_tags()
+        db.session.commit()
+        return count
+
+    @staticmethod
+    def ensure_template_stats():
+        """template_stats の行が無いテンプレートに空の行を作る（人気順の一覧に載せるため）。"""
+        missing = Template.query.filter(
+            ~Template.template_id.in_(select(TemplateStats.template_id))
+        ).all()
+        for template in missing:
+            template.stats = TemplateStats()
+        db.session.commit()
+        return len(missing)
+
+    @staticmethod
+    def get_template_version(template_id=None, token=None):
+        """
+        条件付き GET（ETag / Last-Modified）の判定に使う値だけを 1 クエリで取得する。
+        ORM オブジェクトは作らない。token を指定した場合は共有トークンから引く。
+        戻り値: dict（template_id, user_id, visibility, display_version, template_updated_at,
+                plan_id, plan_user_id, plan_updated_at）または None
+        """
+        stmt = select(
+            Template.template_id,
+            Template.user_id,
+            Template.visibility,
+            Template.display_version,
+            Template.updated_at.label("template_updated_at"),
+            Plan.id.label("plan_id"),
+            Plan.user_id.label("plan_user_id"),
+            Plan.updated_at.label("plan_updated_at"),
+        ).join(Plan, Plan.id == Template.plan_id)
+        if token is not None:
+            stmt = stmt.join(Share, Share.template_id == Template.template_id).where(Share.url_token == token)
+        else:
+            stmt = stmt.where(Template.template_id == template_id)
+        row = db.session.execute(stmt.limit(1)).first()
+        return row._asdict() if row else None
+
+    @staticmethod
+    def get_checklist_version(plan_id):
+        """
+        チェックリスト項目の (状態のハッシュ, 最終更新日時)。所有者向け詳細の ETag に使う。
+        updated_at は SQLite では秒単位のため、同じ秒の中でのチェックの切り替えも見分けられるよう、
+        ETag には表示に使う列の値のハッシュを使う（項目がなければ (None, None)）。
+        """
+        rows = db.session.execute(
+            select(
+                ChecklistItem.checklist_item_id,
+                ChecklistItem.item_id,
+                ChecklistItem.category_id,
+                ChecklistItem.quantity,
+                ChecklistItem.is_required,
+                ChecklistItem.is_checked,
+                ChecklistItem.is_crowned,
+                ChecklistItem.is_deleted,
+                ChecklistItem.sort_order,
+                ChecklistItem.memo,
+                ChecklistItem.reason_list_json,
+                ChecklistItem.updated_at,
+            )
+            .join(Checklist, Checklist.checklist_id == ChecklistItem.checklist_id)
+            .where(Checklist.plan_id == plan_id, Checklist.status.not_in(PREFETCH_STATUSES))
+            .order_by(ChecklistItem.checklist_item_id)
+        ).all()
+        if not rows:
+            return None, None
+        digest = hashlib.sha1()
+        for row in rows:
+            digest.update(json.dumps(list(row[:-1]), ensure_ascii=False, default=str).encode("utf-8"))
+        return digest.hexdigest(), max(row.updated_at for row in rows)
+
     @staticmethod
     def get_private_templates(user_id):
         return Template.query.filter_by(user_id=user_id, visibility="private").all()
@@ -125,6 +621,80 @@ class PlanDBService:
             HotelSnapshot.is_selected.is_(True)
         ).first()
 
+    @staticmethod
+    def get_template_cards(templates, user_id=None):
+        """
+        一覧カード用の要約計算のために、テンプレート群に紐づく Plan・選択中の交通手段・選択中のホテルを
+        IN 句でまとめて取得する（テンプレート数に関係なくクエリ数は一定）。
+        user_id を指定した場合はそのユーザーの Plan のみを対象にする。
+        戻り値: {plan_id: {"plan": Plan, "transit": TransportSnapshot|None, "hotel": HotelSnapshot|None}}
+        """
+        plan_ids = list({tpl.plan_id for tpl in templates or [] if tpl.plan_id})
+        if not plan_ids:
+            return {}
+
+        plan_query = Plan.query.filter(Plan.id.in_(plan_ids))
+        if user_id is not None:
+            plan_query = plan_query.filter(Plan.user_id == user_id)
+        cards = {plan.id: {"plan": plan, "transit": None, "hotel": None} for plan in plan_query.all()}
+        if not cards:
+            return {}
+
+        transits = (
+            TransportSnapshot.query.filter(
+                TransportSnapshot.plan_id.in_(list(cards)),
+                TransportSnapshot.is_selected.is_(True),
+            )
+            .order_by(TransportSnapshot.id.asc())
+            .all()
+        )
+        for transit in transits:
+            if cards[transit.plan_id]["transit"] is None:
+                cards[transit.plan_id]["transit"] = transit
+
+        hotels = (
+            HotelSnapshot.query.filter(
+                HotelSnapshot.plan_id.in_(list(cards)),
+                HotelSnapshot.is_selected.is_(True),
+            )
+            .order_by(HotelSnapshot.id.asc())
+            .all()
+        )
+        for hotel in hotels:
+            if cards[hotel.plan_id]["hotel"] is None:
+                cards[hotel.plan_id]["hotel"] = hotel
+
+        return cards
+
+    @staticmethod
+    def refresh_template_summaries(templates):
+        """
+        テンプレートの一覧カード用要約（summary_* カラム）を再計算する（commit は呼び出し側で行う）。
+        関連データは get_template_cards でまとめて取得するため、件数に関係なくクエリ数は一定。
+        """
+        templates = [tpl for tpl in templates or [] if tpl is not None]
+        cards = PlanDBService.get_template_cards(templates)
+        for tpl in templates:
+            card = cards.get(tpl.plan_id) or {"plan": None, "transit": None, "hotel": None}
+            summary = build_template_summary(tpl, card["plan"], card["transit"], card["hotel"])
+            for key, value in summary.items():
+                setattr(tpl, key, value)
+        return templates
+
+    @staticmethod
+    def refresh_plan_template_summaries(plan_id):
+        """
+        プランに紐づくテンプレートの要約を再計算する（commit は呼び出し側で行う）。
+        要約が変わったテンプレートは表示バージョン（display_version）も上げる。
+        """
+        templates = Template.query.filter_by(plan_id=plan_id).all()
+        before = {tpl.template_id: _summary_values(tpl) for tpl in templates}
+        PlanDBService.refresh_template_summaries(templates)
+        for template in templates:
+            if _summary_values(template) != before[template.template_id]:
+                bump_display_version(template)
+        return templates
+
     @staticmethod
     def select_hotel(plan_id, hotel_snapshot_id, user_id=None):
         if user_id is None:
@@ -146,8 +716,12 @@ class PlanDBService:
 
             HotelSnapshot.query.filter_by(plan_id=plan_id).update({"is_selected": False})
             hotel.is_selected = True
+            db.session.flush()
+            templates = PlanDBService.refresh_plan_template_summaries(plan_id)
 
             db.session.commit()
+            invalidate_public_plans()
+            refresh_template_exports(templates)
             return True
         except Exception as e:
             db.session.rollback()
@@ -175,7 +749,11 @@ class PlanDBService:
 
             TransportSnapshot.query.filter_by(plan_id=plan_id).update({"is_selected": False})
             snapshot.is_selected = True
+            db.session.flush()
+            templates = PlanDBService.refresh_plan_template_summaries(plan_id)
             db.session.commit()
+            invalidate_public_plans()
+            refresh_template_exports(templates)
             return True
         except Exception as e:
             db.session.rollback()
@@ -317,6 +895,7 @@ class PlanDBService:
                     template.flag_b = flag_b_value
                 if publish_date is not None:
                     template.publish_date = publish_date_value
+                bump_display_version(template)
             else:
                 template = Template(
                     user_id=plan.user_id,
@@ -338,7 +917,14 @@ class PlanDBService:
                 )
                 db.session.add(template)
 
+            if template.stats is None:
+                template.stats = TemplateStats()
+            PlanDBService.refresh_template_summaries([template])
+            PlanDBService.sync_template_tags(template)
+            search_service.refresh_template_document(template)
             db.session.commit()
+            invalidate_public_plans()
+            refresh_template_exports([template])
             return template
         except Exception as e:
             db.session.rollback()
@@ -362,6 +948,8 @@ class PlanDBService:
             )
             db.session.add(share)
             db.session.commit()
+            invalidate_public_plans()
+            refresh_template_exports([template])
             return share
         except Exception as e:
             db.session.rollback()
@@ -434,6 +1022,7 @@ class PlanDBService:
         return Checklist.query.join(Plan).filter(
             Checklist.plan_id == plan_id,
             Plan.user_id == user_id,
+            Checklist.status.not_in(PREFETCH_STATUSES),
         ).first()
 
     @staticmethod
@@ -560,6 +1149,10 @@ class PlanDBService:
         if not checklist:
             return None
         checklist_items = PlanDBService.get_checklist_item_by_id(checklist.checklist_id)
+        return PlanDBService.build_checklist_display(checklist_items)
+
+    @staticmethod
+    def build_checklist_display(checklist_items):
         essentials = []
         extras = []
         for item in checklist_items or []:
@@ -590,7 +1183,9 @@ class PlanDBService:
         summary = PlanDBService.get_checklist_summary(plan_id, user_id)
         template.checklist_summary_json = summary
         template.items_count = summary.get("items_total", 0)
+        bump_display_version(template)
         db.session.commit()
+        refresh_template_exports([template])
         return True
     @staticmethod
     def copy_plan(plan_id, user_id):
@@ -660,7 +1255,9 @@ class PlanDBService:
                 db.session.add(new_hotel)
 
             # 6. チェックリストの複製
-            source_checklist = Checklist.query.filter_by(plan_id=plan_id).first()
+            source_checklist = Checklist.query.filter(
+                Checklist.plan_id == plan_id, Checklist.status.not_in(PREFETCH_STATUSES)
+            ).first()
             
             if source_checklist:
                 # チェックリスト本体
@@ -711,13 +1308,24 @@ class PlanDBService:
                     items_count=source_template.items_count,
                     essential_ratio=source_template.essential_ratio,
                     tags=source_template.tags,
+                    summary_transport=source_template.summary_transport,
+                    summary_transport_type=source_template.summary_transport_type,
+                    summary_hotel_name=source_template.summary_hotel_name,
+                    summary_hotel_price=source_template.summary_hotel_price,
+                    summary_stay_locations=source_template.summary_stay_locations,
                     visibility="private", # コピー後は非公開に戻す
                     display_version=1     # バージョンリセット
                 )
+                new_template.stats = TemplateStats()
                 db.session.add(new_template)
+                PlanDBService.sync_template_tags(new_template)
+                search_service.refresh_template_document(new_template)
                 # Share（共有URL）はコピーしません（新規発行が必要なため）
 
             db.session.commit()
+            if source_template:
+                # コピー数は人気スコアに使う（反映はバックグラウンドでまとめて行う）
+                template_stats.record_copy(source_template.template_id)
             return new_plan.id
 
         except Exception as e:
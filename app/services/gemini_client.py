@@ -0,0 +1,127 @@
+"""
+Gemini クライアントのプロセス単位の管理。
+
+genai.configure() と GenerativeModel の生成をリクエストごとに行わず、
+プロセスごとに 1 回だけ設定し、モデルはシステムプロンプトごとに作って使い回す。
+gunicorn の fork 後は gRPC のチャネルを引き継げないため、pid が変わったら作り直す
+（gunicorn.conf.py の post_worker_init から warm_up() を呼ぶと、最初のリクエストを待たずに準備できる）。
+
+- GEMINI_MODEL: 使うモデル名
+- GEMINI_TIMEOUT: 1 回の呼び出しの期限（秒）。接続と応答待ちを合わせた期限として gRPC に渡す
+"""
+import os
+import threading
+import time
+
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+from google.generativeai import client as genai_client
+
+DEFAULT_MODEL = "gemini-2.5-flash-preview-09-2025"
+
+
+class GeminiClientManager:
+    """Flask 拡張と同じく init_app で設定を読み込む、Gemini クライアントの窓口。"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self._lock = threading.Lock()
+        self._pid = None
+        self._models = {}
+        self._stats = {}
+        self._reset_stats()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.model_name = app.config.get("GEMINI_MODEL", DEFAULT_MODEL)
+        self.timeout = app.config.get("GEMINI_TIMEOUT", 60)
+        app.extensions["gemini_client"] = self
+
+    def _reset_stats(self):
+        self._stats = {
+            "configures": 0,
+            "configure_seconds": 0.0,
+            "models_built": 0,
+            "build_seconds": 0.0,
+            "client_seconds": 0.0,
+            "calls": 0,
+            "timeouts": 0,
+        }
+
+    def _api_key(self):
+        api_key = self.app.config.get("GEMINI_API_KEY") if self.app is not None else None
+        if not api_key:
+            raise ValueError("GEMINI_API_KEYが設定されていません。")
+        return api_key
+
+    def _ensure_configured(self):
+        # 呼び出し元でロックを取っていること
+        if self._pid == os.getpid():
+            return
+        started = time.perf_counter()
+        genai.configure(api_key=self._api_key())
+        self._models = {}
+        self._pid = os.getpid()
+        self._stats["configures"] += 1
+        self._stats["configure_seconds"] += time.perf_counter() - started
+
+    def get_model(self, system_prompt):
+        """システムプロンプトごとの GenerativeModel（プロセス内で使い回す）。"""
+        with self._lock:
+            self._ensure_configured()
+            model = self._models.get(system_prompt)
+            if model is None:
+                started = time.perf_counter()
+                model = genai.GenerativeModel(model_name=self.model_name, system_instruction=system_prompt)
+                self._models[system_prompt] = model
+                self._stats["models_built"] += 1
+                self._stats["build_seconds"] += time.perf_counter() - started
+            return model
+
+    def generate(self, system_prompt, user_prompt, generation_config=None, stream=False):
+        """
+        期限つきで generate_content を呼ぶ。期限切れは google.api_core の DeadlineExceeded になる。
+        stream=True なら応答を少しずつ受け取るイテレータを返す（期限はストリーム全体にかかる）。
+        """
+        model = self.get_model(system_prompt)
+        with self._lock:
+            self._stats["calls"] += 1
+        try:
+            return model.generate_content(
+                user_prompt,
+                generation_config=generation_config,
+                stream=stream,
+                request_options={"timeout": self.timeout},
+            )
+        except google_exceptions.DeadlineExceeded:
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise
+
+    def warm_up(self, system_prompts=()):
+        """
+        設定とモデル・gRPC クライアントの生成を先に済ませる（fork 後のワーカーで呼ぶ）。
+        API キーがない環境では何もしない。戻り値: かかった秒数
+        """
+        if self.app is None or not self.app.config.get("GEMINI_API_KEY"):
+            return 0.0
+        started = time.perf_counter()
+        for system_prompt in system_prompts:
+            self.get_model(system_prompt)
+        with self._lock:
+            client_started = time.perf_counter()
+            genai_client.get_default_generative_client()
+            self._stats["client_seconds"] += time.perf_counter() - client_started
+        elapsed = time.perf_counter() - started
+        self.app.logger.info(f"Gemini client warmed up in {elapsed:.3f}s (pid={os.getpid()})")
+        return elapsed
+
+    def stats(self):
+        """このプロセスでの設定・モデル/gRPC クライアント生成の回数と所要時間、呼び出し回数・期限切れ回数。"""
+        with self._lock:
+            return dict(self._stats, models_cached=len(self._models))
+
+
+gemini_client = GeminiClientManager()
@@ -25,7 +25,11 @@ def search_rakuten_hotels(keyword):
         }
         
         try:
-            response = requests.get(RAKUTEN_KEYWORD_SEARCH_URL, params=params)
+            response = requests.get(
+                RAKUTEN_KEYWORD_SEARCH_URL,
+                params=params,
+                timeout=current_app.config.get("RAKUTEN_TIMEOUT", 10),
+            )
             
             # 404 (Data Not Found) の場合は None を返して呼び出し元で判断させる
             if response.status_code == 404:
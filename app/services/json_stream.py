@@ -0,0 +1,119 @@
+"""
+ストリーミングで届く JSON を先頭から読み、指定した位置の値が閉じた時点で取り出す。
+
+AI のプラン生成は 1 つの JSON（plan_title / transport_options / itinerary）を少しずつ返すため、
+全体が届く前に「交通手段 1 件」「日程 1 日分」ができた時点で画面に出せるようにする。
+
+    parser = IncrementalJSONParser({("plan_title",): "title", ("transport_options", "*"): "transport", ("itinerary", "*"): "day"})
+    for chunk in chunks:
+        for name, key, value in parser.feed(chunk):
+            ...
+
+パターンはルートからのキー/インデックスの並びで、"*" は任意のキー・インデックスに一致する。
+"""
+import json
+
+
+class _Frame:
+    __slots__ = ("is_object", "start", "path", "key", "index", "expect_key")
+
+    def __init__(self, is_object, start, path):
+        self.is_object = is_object
+        self.start = start
+        self.path = path
+        self.key = None
+        self.index = 0
+        self.expect_key = is_object
+
+
+class IncrementalJSONParser:
+    """feed() に渡した文字列を続けて読み、パターンに一致する値が完成するたびに返す。"""
+
+    def __init__(self, patterns):
+        self.patterns = {tuple(pattern): name for pattern, name in patterns.items()}
+        self.buffer = ""
+        self._pos = 0
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._value_start = None
+
+    def feed(self, text):
+        """追加の文字列を読み、完成した (名前, 最後のキーまたはインデックス, 値) のリストを返す。"""
+        self.buffer += text
+        events = []
+        buffer = self.buffer
+        for i in range(self._pos, len(buffer)):
+            c = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    self._end_string(self._string_start, i, events)
+                continue
+
+            if not self._stack and c not in "{[":
+                # ルートの値が始まるまでの前置き（空白など）は読み飛ばす
+                continue
+            if c == '"':
+                self._in_string = True
+                self._string_start = i
+            elif c in "{[":
+                self._end_scalar(i, events)
+                path = self._child_path() if self._stack else ()
+                self._stack.append(_Frame(c == "{", i, path))
+            elif c in "}]":
+                self._end_scalar(i, events)
+                frame = self._stack.pop()
+                self._emit(frame.path, frame.start, i, events)
+            elif c == ",":
+                self._end_scalar(i, events)
+                top = self._stack[-1]
+                if top.is_object:
+                    top.expect_key = True
+                else:
+                    top.index += 1
+            elif c == ":":
+                self._stack[-1].expect_key = False
+            elif not c.isspace() and self._value_start is None:
+                # 数値・true/false/null の始まり
+                self._value_start = i
+        self._pos = len(buffer)
+        return events
+
+    def _child_path(self):
+        top = self._stack[-1]
+        return top.path + ((top.key,) if top.is_object else (top.index,))
+
+    def _end_string(self, start, end, events):
+        top = self._stack[-1]
+        if top.is_object and top.expect_key:
+            top.key = json.loads(self.buffer[start:end + 1])
+        else:
+            self._emit(self._child_path(), start, end, events)
+
+    def _end_scalar(self, end, events):
+        if self._value_start is None:
+            return
+        start, self._value_start = self._value_start, None
+        self._emit(self._child_path(), start, end - 1, events)
+
+    def _emit(self, path, start, end, events):
+        name = self._match(path)
+        if name is None:
+            return
+        try:
+            value = json.loads(self.buffer[start:end + 1])
+        except ValueError:
+            return
+        events.append((name, path[-1] if path else None, value))
+
+    def _match(self, path):
+        for pattern, name in self.patterns.items():
+            if len(pattern) == len(path) and all(p == "*" or p == k for p, k in zip(pattern, path)):
+                return name
+        return None
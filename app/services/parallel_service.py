@@ -0,0 +1,93 @@
+"""
+外部 API（Gemini・楽天トラベル）の呼び出しを並行して実行する。
+
+呼び出しはプロセスごとのスレッドプールで、それぞれ新しいアプリコンテキストの中で実行する
+（current_app.config や logger をそのまま使える。db.session は呼び出し元とは別になる）。
+contextvars は呼び出し元のものを引き継ぐ（AI 呼び出しの計測のトレースなど）。
+結果は呼び出しごとの CallResult で返し、1 つが失敗・タイムアウトしても他の結果は受け取れる。
+
+- PARALLEL_WORKERS: プロセスごとのスレッド数
+"""
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from flask import current_app
+
+_lock = threading.Lock()
+_executor = None
+_executor_pid = None
+
+
+class CallResult:
+    """並行実行した 1 件の結果。error が None なら value が戻り値。"""
+
+    __slots__ = ("value", "error", "elapsed")
+
+    def __init__(self, value=None, error=None, elapsed=0.0):
+        self.value = value
+        self.error = error
+        self.elapsed = elapsed
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        return f"CallResult(ok={self.ok}, elapsed={self.elapsed:.3f})"
+
+
+def _get_executor(app):
+    global _executor, _executor_pid
+    # gunicorn の fork 後はスレッドが引き継がれないため、プロセスごとに作る
+    if _executor_pid == os.getpid():
+        return _executor
+    with _lock:
+        if _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(
+                max_workers=app.config.get("PARALLEL_WORKERS", 8), thread_name_prefix="parallel-call"
+            )
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def _call_in_context(app, func):
+    started = time.monotonic()
+    with app.app_context():
+        return func(), time.monotonic() - started
+
+
+def run_concurrently(calls, timeouts=None):
+    """
+    calls: {名前: 引数なしで呼べる関数（functools.partial など）}
+    timeouts: {名前: 秒}（指定のない呼び出しは待ち続ける）
+    すべてを同時に開始して待ち合わせ、{名前: CallResult} を返す。
+    タイムアウトした呼び出しの error は TimeoutError（スレッドは応答が返るまで残る）。
+    """
+    app = current_app._get_current_object()
+    executor = _get_executor(app)
+    timeouts = timeouts or {}
+    started = time.monotonic()
+    futures = {
+        name: executor.submit(contextvars.copy_context().run, _call_in_context, app, func)
+        for name, func in calls.items()
+    }
+
+    results = {}
+    for name, future in futures.items():
+        timeout = timeouts.get(name)
+        remaining = None if timeout is None else max(0.0, started + timeout - time.monotonic())
+        try:
+            value, elapsed = future.result(timeout=remaining)
+            results[name] = CallResult(value=value, elapsed=elapsed)
+        except FutureTimeoutError:
+            future.cancel()
+            results[name] = CallResult(
+                error=TimeoutError(f"{name} が {timeout} 秒以内に応答しませんでした。"),
+                elapsed=time.monotonic() - started,
+            )
+        except Exception as e:
+            results[name] = CallResult(error=e, elapsed=time.monotonic() - started)
+    return results
@@ -0,0 +1,287 @@
+"""
+AI によるプラン生成ジョブ。
+
+作成画面（plan_create_form）は plan_generation_jobs に 1 行積んで job_id を返すだけにし、
+Gemini の呼び出し・楽天のホテル検索・DB への保存はワーカースレッドで行う。
+作成画面は /plans/jobs/<job_id>/events（SSE）で途中経過を受け取り、完了したら交通手段選択画面に進む
+（EventSource が使えない場合は /plans/jobs/<job_id> をポーリングする）。
+gunicorn の同期ワーカーが AI の応答待ちで塞がらないようにするためのもの。
+
+- PLAN_JOB_WORKERS: プロセスごとのワーカースレッド数。0 ならスレッドを使わず run() の明示呼び出しのみ
+- PLAN_AI_TIMEOUT / PLAN_HOTEL_TIMEOUT: AI の生成・ホテル検索を待つ秒数。
+  実行を始めてからこの合計を過ぎても終わらないジョブは失敗扱いにする（ワーカーが落ちた場合など）
+- PLAN_JOB_REQUEUE_SECONDS: これより長く queued のままのジョブは、状態を確かめたワーカーが拾い直す
+  （積んだワーカーが再起動して、スレッドのキューごと失われた場合）
+- PLAN_JOB_STALE_SECONDS: これより長く queued のままのジョブは失敗扱いにする
+- PLAN_JOB_STREAMING: AI の応答をストリーミングで受け取り、タイトル・交通手段・日程ができるたびに
+  plan_generation_jobs.progress に追記する（False なら応答全体を待つ）
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from functools import partial
+from uuid import uuid4
+
+from flask import current_app
+from sqlalchemy import select, update
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.extensions import db
+from app.models.plan import PlanGenerationJob
+from app.services import ai_service, hotel_service
+from app.services.ai_limiter import AIRateLimitError
+from app.services.ai_metrics import ai_metrics
+from app.services.checklist_prefetch import checklist_prefetch
+from app.services.db_service import PlanDBService
+from app.services.parallel_service import run_concurrently
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+JOB_FINISHED = (JOB_SUCCEEDED, JOB_FAILED)
+
+
+def format_json(ai_response):
+    """AI の応答を (タイトル, 交通手段候補, 日程) に分ける。"""
+    plan_title = ai_response.get("plan_title", "無題のプラン")
+    transit = ai_response.get("transport_options", {})
+    schedule = ai_response.get("itinerary", [])
+    return plan_title, transit, schedule
+
+
+def _consume_plan_stream(on_event, *args, **kwargs):
+    """ストリーミング生成を最後まで読み、途中経過を on_event に渡して全体を返す。"""
+    result = None
+    for name, key, value in ai_service.stream_plan_from_inputs(*args, **kwargs):
+        if name == "result":
+            result = value
+        else:
+            on_event(name, key, value)
+    return result
+
+
+def generate_plan(user_id, params, on_event=None):
+    """
+    入力値から AI でプランを生成し、プラン・交通手段候補・日程・ホテル候補を保存する。
+    AI の生成とホテル検索（目的地だけで検索できる）は同時に行う。
+    同じ条件の生成結果があれば AI は呼ばない（params["regenerate"] が真なら作り直す）。
+    ホテル検索が失敗・タイムアウトした場合はホテル候補なしで続ける。
+    on_event を渡すとストリーミングで生成し、途中経過ごとに on_event(名前, キー, 値) を呼ぶ。
+    戻り値: 作成したプランの ID
+    """
+    options = params.get("options") or []
+    travel_style_str = ", ".join(options) if options else "特になし"
+    if on_event is None:
+        generate = ai_service.generate_plan_from_inputs
+    else:
+        generate = partial(_consume_plan_stream, on_event)
+
+    results = run_concurrently(
+        {
+            "plan": partial(
+                generate,
+                params["destination"],
+                start_point=params["departure"],
+                days=params["days"],
+                purpose_raw=params.get("purpose_raw"),
+                travel_style=travel_style_str,
+                use_cache=not params.get("regenerate"),
+            ),
+            "hotels": partial(hotel_service.search_rakuten_hotels, params["destination"]),
+        },
+        timeouts={
+            "plan": current_app.config.get("PLAN_AI_TIMEOUT", 90),
+            "hotels": current_app.config.get("PLAN_HOTEL_TIMEOUT", 15),
+        },
+    )
+    if not results["plan"].ok:
+        raise results["plan"].error
+    if results["hotels"].ok:
+        simplified_hotels = results["hotels"].value
+    else:
+        current_app.logger.warning(f"ホテル検索に失敗したため、ホテル候補なしで続行します: {results['hotels'].error}")
+        simplified_hotels = []
+    current_app.logger.info(
+        f"Plan generation calls: plan={results['plan'].elapsed:.2f}s hotels={results['hotels'].elapsed:.2f}s"
+    )
+    plan_title, transit, schedule = format_json(ai_response=results["plan"].value)
+
+    # 1. プランの保存
+    plan_id = PlanDBService.create_plan(
+        user_id=user_id,
+        destination=params["destination"],
+        departure=params["departure"],
+        start_date=date.fromisoformat(params["start_date"]),
+        days=params["days"],
+        purpose=params.get("purpose_raw"),
+        options=options,
+        plan_title=plan_title,
+    )
+    # 2. 交通手段候補の保存
+    PlanDBService.create_transit(plan_id, transit)
+    # 3. 日程の保存
+    PlanDBService.create_schedule(plan_id=plan_id, ai_schedule=schedule)
+    # 4. ホテル候補の保存
+    PlanDBService.create_hotel(plan_id, simplified_hotels)
+    return plan_id
+
+
+class PlanGenerationQueue:
+    """Flask 拡張と同じく init_app で設定を読み込む、プラン生成ジョブの窓口。"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+        # このプロセスのワーカーに渡して、まだ終わっていないジョブ
+        self._dispatched = set()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.workers = app.config.get("PLAN_JOB_WORKERS", 2)
+        self.stale_seconds = app.config.get("PLAN_JOB_STALE_SECONDS", 600)
+        self.requeue_seconds = app.config.get("PLAN_JOB_REQUEUE_SECONDS", 30)
+        self.run_timeout = app.config.get("PLAN_AI_TIMEOUT", 90) + app.config.get("PLAN_HOTEL_TIMEOUT", 15)
+        self.streaming = app.config.get("PLAN_JOB_STREAMING", True)
+        app.extensions["plan_jobs"] = self
+
+    def submit(self, user_id, params):
+        """ジョブを積んでワーカーに渡す。戻り値: PlanGenerationJob"""
+        job = PlanGenerationJob(job_id=str(uuid4()), user_id=user_id, status=JOB_QUEUED, params=params)
+        db.session.add(job)
+        db.session.commit()
+        self._dispatch(job.job_id)
+        return job
+
+    def get(self, job_id, user_id):
+        """
+        本人のジョブを返す（なければ None）。
+        実行を始めてから PLAN_AI_TIMEOUT + PLAN_HOTEL_TIMEOUT を過ぎたジョブ、
+        PLAN_JOB_STALE_SECONDS を過ぎても始まらないジョブはここで失敗にする。
+        PLAN_JOB_REQUEUE_SECONDS を過ぎても始まらないジョブは、このプロセスのワーカーに渡し直す。
+        """
+        job = PlanGenerationJob.query.filter_by(job_id=job_id, user_id=user_id).first()
+        if job is None or job.status in JOB_FINISHED:
+            return job
+        now = datetime.utcnow()
+        if job.status == JOB_RUNNING:
+            expired = job.started_at is not None and job.started_at < now - timedelta(seconds=self.run_timeout)
+        else:
+            expired = bool(self.stale_seconds) and job.created_at < now - timedelta(seconds=self.stale_seconds)
+            if not expired and self.requeue_seconds and job.created_at < now - timedelta(seconds=self.requeue_seconds):
+                # 先に別のワーカーが実行を始めていれば、run() の queued → running の更新で弾かれる
+                self._dispatch(job.job_id)
+        if expired:
+            # ワーカーが同時に終わらせていれば、そちらの結果を残す
+            PlanGenerationJob.query.filter_by(job_id=job_id, status=job.status).update(
+                {"status": JOB_FAILED, "error": "プラン生成がタイムアウトしました。もう一度お試しください。", "finished_at": now}
+            )
+            db.session.commit()
+            db.session.refresh(job)
+        return job
+
+    def run(self, job_id):
+        """
+        ジョブを 1 件実行する（アプリコンテキスト内で呼ぶ）。
+        queued の行を running に更新できたワーカーだけが実行する。戻り値: 実行したかどうか
+        """
+        claimed = (
+            PlanGenerationJob.query.filter_by(job_id=job_id, status=JOB_QUEUED)
+            .update({"status": JOB_RUNNING, "started_at": datetime.utcnow()})
+        )
+        db.session.commit()
+        if not claimed:
+            return False
+
+        job = db.session.get(PlanGenerationJob, job_id)
+        user_id, params = job.user_id, job.params
+        plan_id = None
+        try:
+            on_event = partial(self.record_progress, job_id) if self.streaming else None
+            # ジョブの中の AI 呼び出しを 1 つのトレースにまとめる（app/services/ai_metrics.py）
+            with ai_metrics.trace("plan_job", trace_id=job_id):
+                plan_id = generate_plan(user_id, params, on_event=on_event)
+        except AIRateLimitError as e:
+            # AI の呼び出し枠が空かなかった（app/services/ai_limiter.py）。混雑していることをそのまま伝える
+            db.session.rollback()
+            self.app.logger.warning(f"Plan generation rate limited: job_id={job_id}")
+            values = {"status": JOB_FAILED, "error": str(e)}
+        except Exception as e:
+            db.session.rollback()
+            self.app.logger.error(f"Plan generation failed: job_id={job_id}", exc_info=True)
+            values = {"status": JOB_FAILED, "error": f"プラン生成中にエラーが発生しました: {e}"[:1000]}
+        else:
+            values = {"status": JOB_SUCCEEDED, "plan_id": plan_id}
+        # get() がタイムアウトで失敗にしたジョブは、あとから成功に変えない
+        finished = (
+            PlanGenerationJob.query.filter_by(job_id=job_id, status=JOB_RUNNING)
+            .update({**values, "finished_at": datetime.utcnow()})
+        )
+        db.session.commit()
+        if not finished:
+            self.app.logger.warning(f"Plan generation finished after the job expired: job_id={job_id} plan_id={plan_id}")
+        elif values["status"] == JOB_SUCCEEDED:
+            # 持ち物リストを先読みしておく（CHECKLIST_PREFETCH_ENABLED のときだけ。失敗してもジョブは成功のまま）
+            try:
+                checklist_prefetch.submit(plan_id)
+            except SQLAlchemyError as e:
+                db.session.rollback()
+                self.app.logger.warning(f"Checklist prefetch submit failed: plan_id={plan_id}: {e}")
+        return True
+
+    def record_progress(self, job_id, name, key, value):
+        """
+        ストリーミング生成の途中経過を 1 件追記する（AI 呼び出しのスレッドから呼ばれる）。
+        作り直しの reset も 1 件として追記する（SSE のイベント ID を位置で振っているため、消さずに続ける）。
+        実行中のジョブのセッションを commit しないよう、別の接続で書き込む。
+        """
+        table = PlanGenerationJob.__table__
+        try:
+            with db.engine.begin() as conn:
+                progress = conn.scalar(select(table.c.progress).where(table.c.job_id == job_id)) or []
+                progress = progress + [{"event": name, "key": key, "data": value}]
+                conn.execute(update(table).where(table.c.job_id == job_id).values(progress=progress))
+        except SQLAlchemyError as e:
+            self.app.logger.warning(f"Plan generation progress write failed: job_id={job_id}: {e}")
+
+    def _dispatch(self, job_id):
+        """ジョブをこのプロセスのワーカーに渡す（渡して終わっていないジョブは重ねて渡さない）。"""
+        executor = self._get_executor()
+        if executor is None:
+            return
+        with self._lock:
+            if job_id in self._dispatched:
+                return
+            self._dispatched.add(job_id)
+        executor.submit(self._run_in_context, job_id)
+
+    def _run_in_context(self, job_id):
+        try:
+            with self.app.app_context():
+                self.run(job_id)
+        except Exception as e:
+            self.app.logger.error(f"Plan generation worker error: job_id={job_id}: {e}")
+        finally:
+            with self._lock:
+                self._dispatched.discard(job_id)
+
+    def _get_executor(self):
+        # gunicorn の fork 後はスレッドが引き継がれないため、プロセスごとに作る
+        if self.app is None or not self.workers:
+            return None
+        if self._executor_pid == os.getpid():
+            return self._executor
+        with self._lock:
+            if self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="plan-generation")
+                self._executor_pid = os.getpid()
+                self._dispatched = set()
+            return self._executor
+
+
+plan_jobs = PlanGenerationQueue()
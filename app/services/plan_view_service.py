@@ -0,0 +1,152 @@
+"""
+プラン詳細（plan_detail）と共有ビュー（share_view）で共通の表示用データを組み立てる。
+
+Template・Plan・選択中の交通手段・選択中のホテルは 1 クエリ（joinedload）、
+チェックリストと項目は selectinload の 2 クエリで読み込み、以降は追加のクエリを発行しない。
+"""
+from sqlalchemy.orm import joinedload, selectinload
+
+from app.models.checklist import PREFETCH_STATUSES, Checklist, ChecklistItem
+from app.models.plan import HotelSnapshot, Plan, Share, Template, TransportSnapshot
+from app.services.db_service import PlanDBService, resolve_selected_hotel
+
+
+def _detail_options(template_attr=None):
+    """
+    Template（template_attr を指定した場合はその先の Template）から、
+    詳細表示に必要な関連をまとめて読み込むローダーオプション。
+    """
+    if template_attr is None:
+        plan_path = joinedload(Template.plan)
+    else:
+        plan_path = joinedload(template_attr).joinedload(Template.plan)
+    return [
+        # 選択中のものだけを読み込む（候補が多くても JOIN の行は増えない）
+        plan_path.joinedload(Plan.transport_candidates.and_(TransportSnapshot.is_selected.is_(True))),
+        plan_path.joinedload(Plan.hotel_candidates.and_(HotelSnapshot.is_selected.is_(True))),
+        plan_path.selectinload(Plan.checklists).selectinload(Checklist.items).joinedload(ChecklistItem.item),
+    ]
+
+
+def _outline_details(itinerary_outline):
+    """itinerary_outline_json を 1 回なめて (交通手段, 滞在場所) を重複なしで返す。"""
+    traffic_methods = []
+    stay_locations = []
+    days = itinerary_outline.get("days", []) if isinstance(itinerary_outline, dict) else []
+    for day in days:
+        if not isinstance(day, dict):
+            continue
+        if day.get("traffic_method"):
+            traffic_methods.append(day["traffic_method"])
+        stay_locations.extend(day.get("places", []) or [])
+    return list(dict.fromkeys(traffic_methods)), list(dict.fromkeys(stay_locations))
+
+
+class PlanDetailViewModel:
+    """plan/detail.html と plan/share_view.html に渡す値を組み立てる。"""
+
+    @staticmethod
+    def load_template(template_id):
+        """詳細表示に必要な関連を含めて Template を取得する。"""
+        return (
+            Template.query.options(*_detail_options())
+            .filter(Template.template_id == template_id)
+            .first()
+        )
+
+    @staticmethod
+    def load_share(token):
+        """詳細表示に必要な関連を含めて Share（と Template）を取得する。"""
+        if not token:
+            return None
+        return (
+            Share.query.options(*_detail_options(Share.template))
+            .filter(Share.url_token == token)
+            .first()
+        )
+
+    @staticmethod
+    def build(template, viewer_id=None, shared=False):
+        """
+        表示用の値を dict で返す（テンプレートへそのまま渡せる）。
+        shared=True は共有ビュー用で、チェックリストは保存済みの要約からチェックなしの形で作る。
+        """
+        plan = template.plan
+        is_owned = bool(viewer_id) and plan.user_id == viewer_id and not shared
+
+        traffic_methods, stay_locations = _outline_details(template.itinerary_outline_json)
+        selected_transit = next(iter(plan.transport_candidates), None) if plan.user_id == template.user_id else None
+        if selected_transit:
+            traffic_methods = [selected_transit.transport_method]
+
+        # --- 宿泊先（Plan.hotel JSON、なければ選択中の HotelSnapshot） ---
+        selected_hotel = resolve_selected_hotel(plan, next(iter(plan.hotel_candidates), None))
+        if selected_hotel and selected_hotel.get("name"):
+            accommodation_label = selected_hotel.get("name")
+            hotel_price = selected_hotel.get("price")
+        else:
+            accommodation_label = "選択中です"
+            hotel_price = None
+
+        # --- チェックリスト（テンプレート所有者のもの） ---
+        checklist = None
+        checklists = [c for c in plan.checklists if c.status not in PREFETCH_STATUSES]
+        if plan.user_id == template.user_id and checklists:
+            checklist = min(checklists, key=lambda c: c.checklist_id)
+        checklist_items = sorted(checklist.items, key=lambda i: i.checklist_item_id) if checklist else []
+
+        packing_summary = template.checklist_summary_json or {}
+        summary_from_checklist = False
+        if not packing_summary or (not packing_summary.get("essential") and not packing_summary.get("extra")):
+            summary = PlanDBService.build_checklist_summary(checklist_items)
+            if summary.get("items_total", 0) > 0:
+                packing_summary = summary
+                summary_from_checklist = True
+
+        if shared:
+            # 共有ビューでは常にチェックリスト形式で表示
+            checklist_display = {
+                group: [
+                    {
+                        "id": f"guest_{group}_{i}",
+                        "name": item["name"],
+                        "quantity": item.get("quantity", 1),
+                        "unit": item.get("unit", ""),
+                        "is_checked": False,
+                    }
+                    for i, item in enumerate(packing_summary.get(group, []))
+                ]
+                for group in ("essential", "extra")
+            }
+            items_total = len(checklist_display["essential"]) + len(checklist_display["extra"])
+        elif is_owned and checklist:
+            checklist_display = PlanDBService.build_checklist_display(checklist_items)
+            items_total = len(checklist_display["essential"]) + len(checklist_display["extra"])
+            if not items_total:
+                items_total = packing_summary.get("items_total", 0)
+        else:
+            # 所有者でない場合はテーブル表示
+            checklist_display = None
+            items_total = packing_summary.get("items_total", 0)
+
+        created_on = plan.created_at.strftime("%Y-%m-%d %H:%M") if getattr(plan, "created_at", None) else ""
+
+        return {
+            "template": template,
+            "plan": plan,
+            "is_owned": is_owned,
+            "template_days": template.days or plan.days,
+            "template_note": template.short_note or "説明が設定されていません。",
+            "display_title": template.public_title or plan.title or plan.destination or "プラン",
+            "traffic_methods": traffic_methods,
+            "accommodation_label": accommodation_label,
+            "stay_locations": stay_locations,
+            "packing_summary": packing_summary,
+            "summary_from_checklist": summary_from_checklist,
+            "checklist_display": checklist_display,
+            "meta": {
+                "created_on": created_on,
+                "price": f"{hotel_price}円 / 泊" if hotel_price is not None else "",
+                "items_total": items_total,
+            },
+        }
@@ -0,0 +1,156 @@
+"""
+持ち物リスト生成のプロンプトに入れる日程の要約。
+
+日程（schedules.daily_plan_json）をそのまま埋め込むと、時刻や transport_notes など
+持ち物に関係しない文字列まで AI に渡すことになり、長い旅行ほど入力トークンと応答時間が増える。
+ここでは持ち物に効く情報だけを残す。
+
+- 泊数
+- 日ごとの行き先・アクティビティのキーワード（括弧内の補足や重複は落とす）
+- 日ごとの屋外/屋内の傾向と、温泉・水辺・雪・山歩きなどのシーン
+- 主な移動手段（徒歩が多い・車・飛行機など）
+
+日程は AI の出力形式 [{"day": 1, "details": [{"time", "activity", "transport_notes"}]}] と、
+シードデータの {"days": 2, "details": [{"day": 1, "title", "place_name", "move_mode", "note"}]} の両方を受け付ける。
+"""
+import re
+
+# 1 日に残すキーワードの数と、1 つあたりの文字数の上限
+MAX_KEYWORDS_PER_DAY = 6
+MAX_KEYWORD_LENGTH = 16
+
+_BRACKETS = re.compile(r"[（(【\[][^）)】\]]*[）)】\]]")
+_SEPARATORS = re.compile(r"\s*(?:[:：]|&|＆|\+|＋|・|、|,|→|〜|~)\s*")
+_TIME = re.compile(r"\d{1,2}[:：]\d{2}")
+
+# 持ち物に結びつかない語（キーワードから取り除く）と、それだけならキーワードにしない語
+_FILLER = re.compile(r"到着|出発|移動|チェックイン|チェックアウト|帰路|帰宅")
+_STOP_WORDS = {"休憩", "自由時間", "ホテル", "宿", "観光", "朝食", "昼食", "ランチ", "夕食", "ディナー"}
+
+OUTDOOR_WORDS = (
+    "散策", "散歩", "公園", "庭園", "山", "岳", "峠", "高原", "滝", "渓谷", "川", "湖", "海", "浜", "ビーチ", "島", "岬",
+    "ハイキング", "登山", "トレッキング", "キャンプ", "スキー", "スノー", "雪", "花火", "祭", "牧場", "動物園", "遊園地",
+    "テーマパーク", "寺", "神社", "大社", "城", "展望", "クルーズ", "サイクリング", "ラフティング", "カヌー", "農園", "いちご狩り",
+    "walk", "park", "hike", "beach",
+)
+# 食事・宿泊はどの日にもあるため屋内には数えない
+INDOOR_WORDS = (
+    "美術館", "博物館", "資料館", "水族館", "記念館", "科学館", "映画", "ショッピング", "モール", "百貨店", "デパート",
+    "アウトレット", "市場", "劇場", "ライブ", "スパ", "工場見学", "体験教室",
+)
+# 持ち物に効くシーン（ラベル: 手がかりの語）
+SCENES = {
+    "温泉": ("温泉", "露天", "足湯", "湯めぐり", "入浴", "スパ", "銭湯"),
+    "水辺": ("海水浴", "海岸", "海辺", "浜", "ビーチ", "プール", "シュノーケル", "ダイビング", "マリン", "カヌー", "ラフティング", "川遊び"),
+    "山歩き": ("登山", "ハイキング", "トレッキング", "山頂", "高原", "峠", "滝", "渓谷"),
+    "雪": ("スキー", "スノー", "雪", "流氷", "樹氷"),
+    "夜間": ("夜景", "ナイト", "夜", "花火", "ライトアップ", "星空"),
+    "寺社": ("寺", "神社", "大社", "参拝", "御朱印"),
+    "テーマパーク": ("テーマパーク", "遊園地", "ユニバーサル", "ディズニー"),
+}
+# 移動手段（ラベル: 手がかりの語）
+MOVES = {
+    "徒歩": ("徒歩", "歩", "walk"),
+    "電車": ("電車", "新幹線", "JR", "地下鉄", "鉄道", "train", "subway"),
+    "バス": ("バス", "bus"),
+    "車": ("自家用車", "車で", "車移動", "マイカー", "レンタカー", "ドライブ", "タクシー", "car", "taxi", "drive"),
+    "飛行機": ("飛行機", "空港", "フライト", "plane", "flight"),
+    "船": ("船", "フェリー", "クルーズ", "ferry", "ship"),
+    "自転車": ("自転車", "サイクリング", "レンタサイクル", "bike", "bicycle"),
+}
+
+
+def _normalize_days(schedule_json):
+    """日程を [(日, [(アクティビティ, 移動の手がかり), ...]), ...] にそろえる。"""
+    if isinstance(schedule_json, dict):
+        days = {}
+        for detail in schedule_json.get("details") or []:
+            activity = "、".join(filter(None, [detail.get("title"), detail.get("place_name")]))
+            moves = " ".join(filter(None, [detail.get("move_mode"), detail.get("note")]))
+            days.setdefault(detail.get("day") or 1, []).append((activity, moves))
+        return sorted(days.items(), key=lambda item: item[0])
+
+    result = []
+    for index, day in enumerate(schedule_json or [], start=1):
+        if not isinstance(day, dict):
+            continue
+        entries = []
+        for detail in day.get("details") or []:
+            activity = detail.get("activity") or detail.get("title") or ""
+            moves = " ".join(filter(None, [detail.get("transport_notes"), detail.get("note"), detail.get("move_mode")]))
+            entries.append((activity, moves))
+        result.append((day.get("day") or index, entries))
+    return result
+
+
+def _keywords(activity):
+    text = _TIME.sub("", _BRACKETS.sub("", activity or ""))
+    for part in _SEPARATORS.split(text):
+        part = _FILLER.sub("", part).strip(" 　。.!！")
+        if len(part) > 1 and part not in _STOP_WORDS:
+            yield part[:MAX_KEYWORD_LENGTH]
+
+
+def _matches(text, words):
+    return any(word in text for word in words)
+
+
+def compact_schedule(schedule_json, days=None):
+    """
+    日程から持ち物に効く情報だけを取り出す。
+    戻り値: {"nights": 泊数, "days": [{"day", "keywords", "setting", "scenes", "moves"}, ...]}
+    setting は "屋外中心" / "屋内中心" / "屋内外" / "不明"。
+    """
+    normalized = _normalize_days(schedule_json)
+    total_days = days or (schedule_json.get("days") if isinstance(schedule_json, dict) else None) or len(normalized)
+    compacted = []
+    for day, entries in normalized:
+        keywords = []
+        outdoor = indoor = 0
+        scenes = []
+        moves = []
+        for activity, move_text in entries:
+            for keyword in _keywords(activity):
+                # 「道頓堀」と「道頓堀観光」のような重なりは先に出た方だけ残す
+                if not any(keyword in kept or kept in keyword for kept in keywords):
+                    keywords.append(keyword)
+            outdoor += _matches(activity, OUTDOOR_WORDS)
+            indoor += _matches(activity, INDOOR_WORDS)
+            for label, words in SCENES.items():
+                if label not in scenes and _matches(activity, words):
+                    scenes.append(label)
+            for label, words in MOVES.items():
+                if label not in moves and _matches(move_text, words):
+                    moves.append(label)
+
+        if outdoor > indoor:
+            setting = "屋外中心"
+        elif indoor > outdoor:
+            setting = "屋内中心"
+        elif outdoor:
+            setting = "屋内外"
+        else:
+            setting = "不明"
+        compacted.append(
+            {
+                "day": day,
+                "keywords": keywords[:MAX_KEYWORDS_PER_DAY],
+                "setting": setting,
+                "scenes": scenes,
+                "moves": moves,
+            }
+        )
+    return {"nights": max(int(total_days) - 1, 0) if total_days else 0, "days": compacted}
+
+
+def render_compact_schedule(compacted):
+    """compact_schedule() の結果をプロンプト用の数行のテキストにする。"""
+    lines = [f"{compacted['nights']}泊"]
+    for day in compacted["days"]:
+        parts = [", ".join(day["keywords"]) or "予定なし", day["setting"]]
+        if day["scenes"]:
+            parts.append("/".join(day["scenes"]))
+        if day["moves"]:
+            parts.append("移動:" + "/".join(day["moves"]))
+        lines.append(f"{day['day']}日目: " + " | ".join(parts))
+    return "\n".join(lines)
@@ -0,0 +1,174 @@
+"""
+テンプレート検索用の n-gram インデックス。
+
+日本語は空白で単語が区切られないため、テキストを正規化したうえで
+1 文字（unigram）と 2 文字（bigram）のトークンに分割し、空白区切りの文字列として
+template_search_documents.tokens に保存する。
+
+- PostgreSQL: to_tsvector('simple', tokens) の GIN インデックス + ts_rank
+- SQLite（開発用）: FTS5 仮想テーブル template_search_fts + bm25
+
+どちらも「クエリの n-gram をすべて含む」ものを一致とし、関連度順に返す。
+"""
+import re
+import unicodedata
+
+from sqlalchemy import and_, column, func, literal_column, select, table, text
+from sqlalchemy.orm import joinedload
+
+from app.extensions import db
+from app.models.plan import Plan, Template, TemplateSearchDocument
+
+_WORD_RUN = re.compile(r"\w+")
+
+# FTS5 の外部コンテンツテーブル（SQLite のみ）
+template_search_fts = table("template_search_fts", column("rowid"), column("tokens"))
+
+
+def normalize_text(value):
+    """全角/半角・大文字/小文字の揺れをなくす。"""
+    return unicodedata.normalize("NFKC", value or "").casefold()
+
+
+def tokenize(value, with_unigrams=True):
+    """
+    テキストを n-gram トークンのリストにする（重複は除く）。
+    インデックス側は unigram + bigram、検索クエリ側は bigram（1 文字の語のみ unigram）を使う。
+    """
+    tokens = []
+    for run in _WORD_RUN.findall(normalize_text(value)):
+        if len(run) == 1 or with_unigrams:
+            tokens.extend(run)
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return list(dict.fromkeys(tokens))
+
+
+def extract_place_names(itinerary_outline):
+    """itinerary_outline_json から地名・スポット名にあたる文字列を抜き出す。"""
+    names = []
+    if isinstance(itinerary_outline, dict):
+        days = itinerary_outline.get("days", [])
+    elif isinstance(itinerary_outline, list):
+        days = itinerary_outline
+    else:
+        days = []
+
+    for day in days:
+        if not isinstance(day, dict):
+            continue
+        for key in ("area", "place", "title"):
+            if isinstance(day.get(key), str):
+                names.append(day[key])
+        names.extend(p for p in day.get("places", []) or [] if isinstance(p, str))
+        for detail in day.get("details", []) or []:
+            if isinstance(detail, dict) and isinstance(detail.get("activity"), str):
+                names.append(detail["activity"])
+    return names
+
+
+def build_template_tokens(template):
+    """テンプレートの検索対象フィールドを n-gram トークン文字列にする。"""
+    parts = [
+        template.public_title,
+        template.short_note,
+        template.tags,
+        *extract_place_names(template.itinerary_outline_json),
+    ]
+    return " ".join(tokenize(" ".join(p for p in parts if p)))
+
+
+def refresh_template_document(template):
+    """
+    テンプレートの検索ドキュメントを作成・更新する（commit は呼び出し側で行う）。
+    SQLite ではトリガーで FTS5 側にも反映される。
+    """
+    tokens = build_template_tokens(template)
+    document = template.search_document
+    if document is None:
+        template.search_document = TemplateSearchDocument(tokens=tokens)
+    elif document.tokens != tokens:
+        document.tokens = tokens
+    return template.search_document
+
+
+def _match_and_rank(query_tokens):
+    """方言ごとに (一致条件, 関連度の式, 関連度の並び順) を返す。"""
+    if db.engine.dialect.name == "postgresql":
+        vector = func.to_tsvector(literal_column("'simple'"), TemplateSearchDocument.tokens)
+        ts_query = func.plainto_tsquery(literal_column("'simple'"), " ".join(query_tokens))
+        rank = func.ts_rank(vector, ts_query)
+        return vector.op("@@")(ts_query), rank, rank.desc()
+
+    # SQLite FTS5: bm25() は小さいほど関連度が高い
+    fts_query = " AND ".join('"{}"'.format(t.replace('"', '""')) for t in query_tokens)
+    match = and_(
+        template_search_fts.c.rowid == TemplateSearchDocument.template_id,
+        text("template_search_fts MATCH :fts_query").bindparams(fts_query=fts_query),
+    )
+    rank = literal_column("bm25(template_search_fts)")
+    return match, rank, rank.asc()
+
+
+def _search_base(query_tokens, columns, clauses=()):
+    """検索ドキュメントと templates を結合した SELECT に一致条件と追加の条件をつける。"""
+    match, _, _ = _match_and_rank(query_tokens)
+    documents = TemplateSearchDocument.__table__.join(
+        Template.__table__, Template.template_id == TemplateSearchDocument.template_id
+    )
+    base = select(*columns).select_from(documents)
+    if db.engine.dialect.name != "postgresql":
+        base = base.select_from(template_search_fts)
+    return base.where(match, *clauses)
+
+
+def matching_template_ids(q):
+    """
+    検索語に一致するテンプレート ID の SELECT を返す（IN 句のサブクエリ用）。
+    検索語からトークンが作れない場合は None。
+    """
+    query_tokens = tokenize(q, with_unigrams=False)
+    if not query_tokens:
+        return None
+    return _search_base(query_tokens, [Template.template_id])
+
+
+def search_templates(q, user_id=None, public_only=False, page=1, per_page=8, clauses=None):
+    """
+    n-gram インデックスでテンプレートを検索し、関連度順に 1 ページ分返す。
+    clauses には templates に対する追加の絞り込み条件（ファセットなど）を渡せる。
+    戻り値: (templates, total)
+    """
+    query_tokens = tokenize(q, with_unigrams=False)
+    if not query_tokens:
+        return [], 0
+
+    _, rank, rank_order = _match_and_rank(query_tokens)
+    filters = list(clauses or [])
+    if user_id is not None:
+        filters.append(Template.user_id == user_id)
+    if public_only:
+        filters.append(Template.visibility == "public")
+
+    base = _search_base(query_tokens, [Template.template_id, rank.label("rank")], filters)
+
+    total = db.session.scalar(select(func.count()).select_from(base.subquery()))
+    if not total:
+        return [], 0
+
+    page = max(1, page or 1)
+    rows = db.session.execute(
+        base.order_by(rank_order, Template.created_at.desc(), Template.template_id.desc())
+        .limit(per_page)
+        .offset((page - 1) * per_page)
+    ).all()
+    template_ids = [row.template_id for row in rows]
+    if not template_ids:
+        return [], total
+
+    templates = (
+        Template.query.options(joinedload(Template.plan).load_only(Plan.id, Plan.start_date))
+        .filter(Template.template_id.in_(template_ids))
+        .all()
+    )
+    by_id = {t.template_id: t for t in templates}
+    return [by_id[tid] for tid in template_ids if tid in by_id], total
@@ -0,0 +1,197 @@
+"""
+共有ページ（/plans/share/<token>）の静的スナップショット出力。
+
+公開テンプレートの共有ページを未ログイン向けに描画し、JSON と一緒に
+SHARE_EXPORT_DIR/<token>/index.html, plan.json として書き出す。
+Caddy はこのディレクトリにファイルがあればそれを返し、なければ gunicorn に回す（Caddyfile 参照）。
+
+テンプレートの保存・共有・交通手段/ホテルの選択・チェックリスト要約の更新のたびに書き直し、
+非公開化・削除で消す。書き出しに失敗しても元の操作は失敗させない（gunicorn 側で表示できるため）。
+書き直し・削除のたびに、gunicorn 側の未ログイン向けキャッシュ（SHARE_VIEWS_NAMESPACE）のエントリも消す。
+
+- SHARE_EXPORT_ENABLED: False なら書き出さない
+- SHARE_EXPORT_DIR: 出力先（既定は instance/share_export）
+- SHARE_EXPORT_BASE_URL: ページ内の絶対 URL に使うオリジン（例: https://example.com）。
+  未設定ならリクエストのホストを使う。リクエストの外（要約キューのワーカーなど）では
+  オリジンが分からないため書き出さず、古い出力を消して gunicorn での表示に任せる
+"""
+import json
+import os
+import re
+import shutil
+import tempfile
+
+from flask import current_app, has_request_context, render_template, request, url_for
+
+from app.services.cache_service import SHARE_VIEWS_NAMESPACE, page_cache
+
+_TOKEN_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+def export_dir(app=None):
+    app = app or current_app
+    return app.config.get("SHARE_EXPORT_DIR") or os.path.join(app.instance_path, "share_export")
+
+
+def _token_dir(app, token):
+    # ディレクトリ名に使うため、共有トークンの形式（uuid4）以外は扱わない
+    if not token or not _TOKEN_PATTERN.match(token):
+        return None
+    return os.path.join(export_dir(app), token)
+
+
+def build_share_payload(view, share_url):
+    """共有ページの内容を JSON で返すための dict。"""
+    template = view["template"]
+    plan = view["plan"]
+    checklist = view["checklist_display"] or {}
+    return {
+        "token_url": share_url,
+        "template_id": template.template_id,
+        "display_version": template.display_version,
+        "updated_at": template.updated_at.isoformat() if template.updated_at else None,
+        "title": view["display_title"],
+        "note": view["template_note"],
+        "start_date": plan.start_date.isoformat() if plan.start_date else None,
+        "days": view["template_days"],
+        "traffic_methods": view["traffic_methods"],
+        "accommodation": view["accommodation_label"],
+        "price": view["meta"]["price"],
+        "stay_locations": view["stay_locations"],
+        "checklist": {
+            group: [
+                {"name": item["name"], "quantity": item["quantity"], "unit": item["unit"]}
+                for item in checklist.get(group, [])
+            ]
+            for group in ("essential", "extra")
+        },
+        "items_total": view["meta"]["items_total"],
+    }
+
+
+def build_share_page(token, is_logged_in=False):
+    """
+    共有ページの HTML と JSON 用 dict を作る。共有が見つからなければ None。
+    戻り値: (html, payload, view)
+    """
+    # 循環 import を避けるため、ここで読み込む
+    from app.services.plan_view_service import PlanDetailViewModel
+
+    share = PlanDetailViewModel.load_share(token)
+    if not share or not share.template or not share.template.plan:
+        return None
+    view = PlanDetailViewModel.build(share.template, shared=True)
+    # キャッシュ・静的出力で使い回すため、クエリ文字列を含まない共有 URL にする
+    share_url = url_for("plan.share_view", token=token, _external=True)
+    html = render_template(
+        "plan/share_view.html",
+        template=view["template"],
+        plan=view["plan"],
+        share_url=share_url,
+        view_ping_url=url_for("plan.share_view_ping", token=token),
+        template_days=view["template_days"],
+        traffic_methods=view["traffic_methods"],
+        accommodation_label=view["accommodation_label"],
+        meta=view["meta"],
+        stay_locations=view["stay_locations"],
+        checklist_display=view["checklist_display"],
+        template_note=view["template_note"],
+        display_title=view["display_title"],
+        is_logged_in=is_logged_in,
+    )
+    return html, build_share_payload(view, share_url), view
+
+
+def _write_atomic(path, content):
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def export_share(token):
+    """
+    共有ページを未ログインの閲覧者として描画し、静的ファイルに書き出す。
+    公開テンプレートでなければ既存の出力を消す。戻り値: 書き出したかどうか
+    """
+    app = current_app._get_current_object()
+    # 書き出さない設定でも、表示内容が変わったので gunicorn 側のキャッシュは消す
+    page_cache.discard(SHARE_VIEWS_NAMESPACE, token)
+    if not app.config.get("SHARE_EXPORT_ENABLED", True):
+        return False
+    directory = _token_dir(app, token)
+    if directory is None:
+        return False
+
+    base_url = app.config.get("SHARE_EXPORT_BASE_URL") or (request.host_url if has_request_context() else None)
+    if base_url is None:
+        # http://localhost/ の URL を含むファイルを閲覧者に返さないよう、書き出さずに古い出力も消す
+        app.logger.warning(f"Share export skipped outside a request without SHARE_EXPORT_BASE_URL: token={token}")
+        remove_exports([token])
+        return False
+    # ログイン中のリクエストから呼ばれても未ログイン表示になるよう、新しいアプリコンテキストで描画する
+    with app.app_context(), app.test_request_context(f"/plans/share/{token}", base_url=base_url):
+        page = build_share_page(token, is_logged_in=False)
+        if page is None or page[2]["template"].visibility != "public":
+            remove_exports([token])
+            return False
+        html, payload, _ = page
+
+    os.makedirs(directory, exist_ok=True)
+    _write_atomic(os.path.join(directory, "plan.json"), json.dumps(payload, ensure_ascii=False))
+    _write_atomic(os.path.join(directory, "index.html"), html)
+    return True
+
+
+def remove_exports(tokens):
+    app = current_app._get_current_object()
+    for token in tokens:
+        page_cache.discard(SHARE_VIEWS_NAMESPACE, token)
+        directory = _token_dir(app, token)
+        if directory and os.path.isdir(directory):
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+def refresh_template_exports(templates):
+    """
+    テンプレートの共有ページの静的出力を作り直す（公開なら書き出し、非公開なら削除）。
+    commit 後に呼ぶ。失敗はログに残すだけで例外にしない。
+    """
+    for template in templates or []:
+        if template is None:
+            continue
+        try:
+            tokens = [share.url_token for share in template.shares]
+            if template.visibility == "public":
+                for token in tokens:
+                    export_share(token)
+            else:
+                remove_exports(tokens)
+        except Exception as e:
+            current_app.logger.warning(f"Share export failed: template_id={template.template_id}: {e}")
+
+
+def export_all_shares():
+    """
+    公開テンプレートの共有ページをすべて書き出し、対象外になったトークンの出力を消す（デプロイ直後の作り直し用）。
+    戻り値: 書き出した件数
+    """
+    from app.extensions import db
+    from app.models.plan import Share, Template
+
+    tokens = db.session.scalars(
+        db.select(Share.url_token).join(Template, Share.template_id == Template.template_id)
+        .where(Template.visibility == "public")
+    ).all()
+    keep = set(tokens)
+    directory = export_dir()
+    if os.path.isdir(directory):
+        remove_exports([name for name in os.listdir(directory) if name not in keep])
+    return sum(1 for token in tokens if export_share(token))
@@ -0,0 +1,180 @@
+"""
+テンプレートの閲覧数・コピー数の集計と人気スコア。
+
+閲覧（plan_detail / share_view）やコピー（copy_plan）のたびに DB へ書き込むと
+読み取り中心の画面に書き込みが増えるため、イベントはワーカーごとのメモリに溜め、
+バックグラウンドスレッドがまとめて template_stats に反映する。
+
+人気スコアは半減期つきの時間減衰で、対数で保存する（TemplateStats の docstring を参照）。
+- STATS_ENABLED: False なら記録しない
+- STATS_FLUSH_INTERVAL: 反映間隔（秒）。0 ならスレッドを起動せず flush() の明示呼び出しのみ
+- STATS_FLUSH_SIZE: 溜まったイベント数がこれを超えたら間隔を待たずに反映する
+- STATS_HALF_LIFE_HOURS: スコアの半減期（時間）
+"""
+import atexit
+import math
+import os
+import threading
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from app.extensions import db
+from app.models.plan import Template, TemplateStats
+
+# スコアの基準時刻（これより前のイベントは想定しない）
+SCORE_EPOCH = datetime(2025, 1, 1)
+
+VIEW_WEIGHT = 1.0
+COPY_WEIGHT = 5.0
+
+
+def event_score(weight, at, half_life_hours):
+    """重み weight のイベントが時刻 at に起きたときの対数スコア。"""
+    elapsed_hours = (at - SCORE_EPOCH).total_seconds() / 3600
+    return math.log(weight) + elapsed_hours / half_life_hours * math.log(2)
+
+
+def add_scores(a, b):
+    """対数スコア同士の和（log(exp(a) + exp(b))）をオーバーフローさせずに求める。"""
+    high, low = max(a, b), min(a, b)
+    return high + math.log1p(math.exp(low - high))
+
+
+def apply_counts(pending, at, half_life_hours):
+    """
+    {template_id: [views, copies]} を template_stats に加算し、スコアを更新する。
+    削除済みテンプレートのイベントは捨てる。戻り値: 反映したテンプレート数
+    """
+    template_ids = list(pending)
+    alive = set(db.session.scalars(select(Template.template_id).where(Template.template_id.in_(template_ids))))
+    rows = {
+        stats.template_id: stats
+        for stats in TemplateStats.query.filter(TemplateStats.template_id.in_(template_ids))
+        .with_for_update()
+        .all()
+    }
+
+    applied = 0
+    for template_id, (views, copies) in pending.items():
+        if template_id not in alive or not (views or copies):
+            continue
+        stats = rows.get(template_id)
+        if stats is None:
+            stats = TemplateStats(template_id=template_id, view_count=0, copy_count=0, score=0.0)
+            db.session.add(stats)
+
+        batch_score = event_score(views * VIEW_WEIGHT + copies * COPY_WEIGHT, at, half_life_hours)
+        has_events = (stats.view_count or 0) + (stats.copy_count or 0) > 0
+        stats.score = add_scores(stats.score, batch_score) if has_events else batch_score
+        stats.view_count = (stats.view_count or 0) + views
+        stats.copy_count = (stats.copy_count or 0) + copies
+        applied += 1
+
+    db.session.commit()
+    return applied
+
+
+class TemplateStatsBuffer:
+    """Flask 拡張と同じく init_app で設定を読み込む、ワーカー単位のイベントバッファ。"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = False
+        self._pending = {}
+        self._pending_events = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._thread_pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get("STATS_ENABLED", True)
+        self.flush_interval = app.config.get("STATS_FLUSH_INTERVAL", 30)
+        self.flush_size = app.config.get("STATS_FLUSH_SIZE", 200)
+        self.half_life_hours = app.config.get("STATS_HALF_LIFE_HOURS", 72)
+        app.extensions["template_stats"] = self
+        atexit.register(self.flush)
+
+    def record_view(self, template_id):
+        self._record(template_id, 0)
+
+    def record_copy(self, template_id):
+        self._record(template_id, 1)
+
+    def _record(self, template_id, index):
+        if not self.enabled or not template_id:
+            return
+        with self._lock:
+            counts = self._pending.setdefault(template_id, [0, 0])
+            counts[index] += 1
+            self._pending_events += 1
+            full = self._pending_events >= self.flush_size
+        self._ensure_worker()
+        if full:
+            self._wakeup.set()
+
+    def pending(self):
+        with self._lock:
+            return {template_id: list(counts) for template_id, counts in self._pending.items()}
+
+    def flush(self, now=None):
+        """溜まっているイベントを DB に反映する。失敗した分はバッファに戻す。"""
+        if self.app is None:
+            return 0
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._pending_events = 0
+        if not pending:
+            return 0
+
+        at = now or datetime.utcnow()
+        # リクエスト処理中のセッションを巻き込まないよう、専用のアプリコンテキストで書き込む
+        with self.app.app_context():
+            for _ in range(2):
+                try:
+                    return apply_counts(pending, at, self.half_life_hours)
+                except IntegrityError:
+                    # 別ワーカーが同じテンプレートの行を先に作った場合はやり直す
+                    db.session.rollback()
+                except SQLAlchemyError as e:
+                    db.session.rollback()
+                    self.app.logger.warning(f"Template stats flush failed: {e}")
+                    break
+            self._restore(pending)
+        return 0
+
+    def _restore(self, pending):
+        with self._lock:
+            for template_id, (views, copies) in pending.items():
+                counts = self._pending.setdefault(template_id, [0, 0])
+                counts[0] += views
+                counts[1] += copies
+                self._pending_events += views + copies
+
+    def _ensure_worker(self):
+        # gunicorn の fork 後はスレッドが引き継がれないため、プロセスごとに起動する
+        if not self.flush_interval or self._thread_pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread_pid == os.getpid():
+                return
+            self._thread_pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="template-stats-flusher", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                self.app.logger.error(f"Template stats flusher error: {e}")
+
+
+template_stats = TemplateStatsBuffer()
@@ -0,0 +1,134 @@
+"""
+テンプレートのチェックリスト要約の再計算キュー。
+
+GET（plan_detail / share_view）では要約を書き込まず、ここに積むだけにする。
+積まれたジョブは checklist_summary_jobs に plan_id 単位で 1 行だけ残り、
+ワーカースレッド（または manage_data.py の drain-summaries）がまとめて処理する。
+
+- SUMMARY_QUEUE_INTERVAL: ワーカーの処理間隔（秒）。0 ならスレッドを起動せず drain() の明示呼び出しのみ
+- SUMMARY_QUEUE_BATCH: 1 回に処理する件数
+- SUMMARY_QUEUE_MAX_ATTEMPTS: 失敗したジョブを再試行する回数
+"""
+import os
+import threading
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.extensions import db
+from app.models.checklist import ChecklistSummaryJob
+from app.services.db_service import PlanDBService
+
+
+def _insert_ignore(values):
+    """plan_id が既にあれば何もしない INSERT（同じプランのジョブは 1 件にまとめる）。"""
+    dialect = postgresql if db.engine.dialect.name == "postgresql" else sqlite
+    return (
+        dialect.insert(ChecklistSummaryJob.__table__)
+        .values(**values)
+        .on_conflict_do_nothing(index_elements=["plan_id"])
+    )
+
+
+class SummaryRecomputeQueue:
+    """Flask 拡張と同じく init_app で設定を読み込む、要約再計算キューの窓口。"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._thread_pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.interval = app.config.get("SUMMARY_QUEUE_INTERVAL", 5)
+        self.batch_size = app.config.get("SUMMARY_QUEUE_BATCH", 50)
+        self.max_attempts = app.config.get("SUMMARY_QUEUE_MAX_ATTEMPTS", 3)
+        app.extensions["summary_queue"] = self
+
+    def enqueue(self, plan_id, user_id):
+        """
+        要約の再計算を積む。リクエスト中のセッションを commit しないよう、別の接続で書き込む。
+        戻り値: 積めたかどうか（既に積まれている場合も True）
+        """
+        if not plan_id or not user_id:
+            return False
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(_insert_ignore({"plan_id": plan_id, "user_id": user_id, "attempts": 0}))
+        except SQLAlchemyError as e:
+            if self.app is not None:
+                self.app.logger.warning(f"Summary job enqueue failed: plan_id={plan_id}: {e}")
+            return False
+        self._ensure_worker()
+        self._wakeup.set()
+        return True
+
+    def pending_count(self):
+        return db.session.scalar(select(db.func.count()).select_from(ChecklistSummaryJob))
+
+    def drain(self, limit=None):
+        """
+        積まれているジョブを古い順に処理する（アプリコンテキスト内で呼ぶ）。
+        ジョブは先に削除して「取得」するため、複数ワーカーが同時に動いても二重には処理しない。
+        戻り値: 処理したジョブ数
+        """
+        jobs = db.session.execute(
+            select(ChecklistSummaryJob.plan_id, ChecklistSummaryJob.user_id, ChecklistSummaryJob.attempts)
+            .order_by(ChecklistSummaryJob.enqueued_at.asc(), ChecklistSummaryJob.plan_id.asc())
+            .limit(limit or self.batch_size)
+        ).all()
+        db.session.rollback()
+
+        processed = 0
+        for job in jobs:
+            claimed = db.session.execute(
+                delete(ChecklistSummaryJob).where(ChecklistSummaryJob.plan_id == job.plan_id)
+            ).rowcount
+            db.session.commit()
+            if not claimed:
+                continue
+            try:
+                PlanDBService.update_template_checklist_summary(job.plan_id, job.user_id)
+                processed += 1
+            except Exception as e:
+                db.session.rollback()
+                if job.attempts + 1 < self.max_attempts:
+                    db.session.execute(
+                        _insert_ignore({
+                            "plan_id": job.plan_id,
+                            "user_id": job.user_id,
+                            "attempts": job.attempts + 1,
+                            "last_error": str(e)[:1000],
+                        })
+                    )
+                    db.session.commit()
+                self.app.logger.warning(f"Summary recompute failed: plan_id={job.plan_id}: {e}")
+        return processed
+
+    def _ensure_worker(self):
+        # gunicorn の fork 後はスレッドが引き継がれないため、プロセスごとに起動する
+        if self.app is None or not self.interval or self._thread_pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread_pid == os.getpid():
+                return
+            self._thread_pid = os.getpid()
+            threading.Thread(target=self._run, name="summary-recompute", daemon=True).start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                with self.app.app_context():
+                    while self.drain() >= self.batch_size:
+                        pass
+            except Exception as e:
+                self.app.logger.error(f"Summary recompute worker error: {e}")
+
+
+summary_queue = SummaryRecomputeQueue()
@@ -35,15 +35,26 @@ document.addEventListener('DOMContentLoaded', () => {
       generateBtn.disabled = true;
       const originalText = generateBtn.textContent;
 
+      const requestGenerate = (wait) => fetch('/plans/checklists/generate', {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({ wait })
+      });
+
       try {
-        const response = await fetch('/plans/checklists/generate', {
-          method: 'POST',
-          headers: {
-            'Content-Type': 'application/json'
-          }
-        });
+        const startedAt = Date.now();
+        let response = await requestGenerate(true);
+        let data = await response.json();
 
-        const data = await response.json();
+        // 先読み中(202)は間をおいて送り直す。待ちきれなければ先読みを取り消してその場で生成してもらう
+        while (response.status === 202) {
+          await new Promise((resolve) => setTimeout(resolve, (data.retry_after || 1) * 1000));
+          const wait = Date.now() - startedAt < (data.wait_seconds || 0) * 1000;
+          response = await requestGenerate(wait);
+          data = await response.json();
+        }
 
         if (!response.ok) {
           // 既に存在する場合(409)はメッセージを表示してリダイレクト
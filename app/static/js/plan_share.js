@@ -1,6 +1,12 @@
-// Share link copy on plan detail page
+// Share link copy on plan detail page / view count on the shared page
 
 document.addEventListener('DOMContentLoaded', () => {
+  // 人気順のための閲覧数。Caddy が静的スナップショットを返した場合も数えるよう、表示後に送る
+  const viewPing = document.querySelector('[data-share-view-url]')
+  if (viewPing?.dataset.shareViewUrl && navigator.sendBeacon) {
+    navigator.sendBeacon(viewPing.dataset.shareViewUrl)
+  }
+
   const shareBox = document.querySelector('[data-share-box]')
   if (!shareBox) return
 
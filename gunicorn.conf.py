@@ -0,0 +1,22 @@
+# gunicorn.conf.py
+# gunicorn はカレントディレクトリ（/app）のこのファイルを自動で読み込む
+
+# プラン生成の途中経過を SSE（/plans/jobs/<job_id>/events）で送る間、
+# 同期ワーカーだとプロセスごと塞がるため、スレッドで複数の接続を扱う
+worker_class = "gthread"
+threads = 8
+
+
+def post_worker_init(worker):
+    """ワーカーがアプリを読み込んだ直後（fork 後）にページキャッシュの設定を確かめ、AI プロバイダ（Gemini のクライアント）を準備する。"""
+    from app.services.ai_provider import ai_provider
+    from app.services.ai_service import SYSTEM_PROMPTS
+    from app.services.cache_service import page_cache
+
+    if page_cache.use_workers(worker.cfg.workers):
+        worker.log.warning("PAGE_CACHE_BACKEND=memory is not shared between workers; page caching is disabled")
+
+    try:
+        ai_provider.warm_up(SYSTEM_PROMPTS)
+    except Exception as e:
+        worker.log.warning(f"Gemini warm-up failed: {e}")
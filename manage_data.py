@@ -4,8 +4,9 @@ from datetime import date, datetime
 from app import create_app
 from app.extensions import db
 from app.models.user import User
-from app.models.plan import Plan, TransportSnapshot, HotelSnapshot, Schedule, Template, Share
-from app.models.checklist import Checklist, ChecklistItem, Item, Category
+from app.models.plan import Plan, TransportSnapshot, HotelSnapshot, Schedule, Template, TemplateSearchDocument, TemplateTag, Tag, TemplateStats, Share
+from app.models.checklist import Checklist, ChecklistItem, Item, Category, PREFETCH_STATUSES
+from app.services.db_service import PlanDBService
 
 app = create_app()
 
@@ -149,8 +150,10 @@ def dump():
                 "updated_at": tmpl.updated_at
             })
 
-        # Checklist
-        checklists = Checklist.query.filter_by(plan_id=latest_plan.id).all()
+        # Checklist（先読み中・先読み済みでまだ使われていないものは書き出さない）
+        checklists = Checklist.query.filter(
+            Checklist.plan_id == latest_plan.id, Checklist.status.notin_(PREFETCH_STATUSES)
+        ).all()
         checklist_ids = []
         for cl in checklists:
             checklist_ids.append(cl.checklist_id)
@@ -240,6 +243,10 @@ def seed(force):
         db.session.query(Category).delete()
         
         db.session.query(Share).delete()
+        db.session.query(TemplateSearchDocument).delete()
+        db.session.query(TemplateTag).delete()
+        db.session.query(TemplateStats).delete()
+        db.session.query(Tag).delete()
         db.session.query(Template).delete()
         db.session.query(Schedule).delete()
         db.session.query(HotelSnapshot).delete()
@@ -328,11 +335,198 @@ def seed(force):
                     pass
             
             db.session.commit()
+
+            # 一覧カード要約・タグ・検索インデックスの作り直し
+            PlanDBService.refresh_template_summaries(Template.query.all())
+            PlanDBService.refresh_template_tags()
+            PlanDBService.ensure_template_stats()
+            PlanDBService.refresh_search_index()
             print("✅ データのインポートが完了しました！")
 
         except Exception as e:
             db.session.rollback()
             print(f"❌ エラーが発生しました: {e}")
 
+@cli.command("reindex-search")
+def reindex_search():
+    """テンプレート検索用の n-gram インデックスを全件作り直します。"""
+    with app.app_context():
+        count = PlanDBService.refresh_search_index()
+        print(f"🔎 {count} 件のテンプレートを検索インデックスに登録しました。")
+
+@cli.command("reindex-tags")
+def reindex_tags():
+    """テンプレートの tags 文字列からタグテーブル（ファセット用）を作り直し、使われていないタグを削除します。"""
+    with app.app_context():
+        count = PlanDBService.refresh_template_tags()
+        print(f"🏷  {count} 件のテンプレートのタグを登録しました。")
+
+@cli.command("drain-summaries")
+def drain_summaries():
+    """積まれているチェックリスト要約の再計算ジョブをすべて処理します。"""
+    from app.services.summary_queue import summary_queue
+
+    with app.app_context():
+        total = 0
+        while True:
+            processed = summary_queue.drain()
+            total += processed
+            if processed < summary_queue.batch_size:
+                break
+        print(f"🧮 {total} 件のテンプレート要約を再計算しました（残り {summary_queue.pending_count()} 件）。")
+
+@cli.command("export-shares")
+def export_shares():
+    """公開中の共有ページの静的スナップショット（Caddy が直接返すファイル）をすべて書き出し直します。"""
+    from app.services.share_export import export_all_shares, export_dir
+
+    with app.app_context():
+        count = export_all_shares()
+        print(f"📦 {count} 件の共有ページを {export_dir()} に書き出しました。")
+
+@cli.command("ai-cache")
+@click.option('--purge', is_flag=True, help="期限切れのエントリを削除します")
+@click.option('--clear', is_flag=True, help="すべてのエントリを削除します（次回はすべて AI で生成）")
+def ai_cache_command(purge, clear):
+    """AI 生成結果キャッシュの件数を種類ごとに表示します。"""
+    from app.models.plan import AIGenerationCacheEntry
+
+    with app.app_context():
+        if clear or purge:
+            query = AIGenerationCacheEntry.query
+            if not clear:
+                query = query.filter(AIGenerationCacheEntry.expires_at <= datetime.utcnow())
+            deleted = query.delete(synchronize_session=False)
+            db.session.commit()
+            print(f"🧹 {deleted} 件のエントリを削除しました。")
+
+        now = datetime.utcnow()
+        rows = db.session.execute(
+            db.select(
+                AIGenerationCacheEntry.kind,
+                db.func.count(),
+                db.func.sum(db.case((AIGenerationCacheEntry.expires_at <= now, 1), else_=0)),
+            ).group_by(AIGenerationCacheEntry.kind)
+        ).all()
+        if not rows:
+            print("AI 生成結果のキャッシュはありません。")
+        for kind, total, expired in rows:
+            print(f"{kind}: entries={total} expired={expired or 0}")
+
+@cli.command("cache-stats")
+def cache_stats():
+    """描画キャッシュのヒット率を表示します（sqlite バックエンドはワーカー全体の集計）。"""
+    from app.services.cache_service import page_cache
+
+    stats = page_cache.stats()
+    if not stats:
+        print("キャッシュの統計情報はありません。")
+        return
+    for namespace, values in stats.items():
+        print(f"{namespace}: hits={values['hits']} misses={values['misses']} hit_ratio={values['hit_ratio']:.1%}")
+
+@cli.command("ai-metrics")
+@click.option('--hours', default=24, show_default=True, help="集計する期間（直近の時間数）")
+@click.option('--purge', is_flag=True, help="先に AI_METRICS_RETENTION_DAYS より古い記録を削除する（cron での定期実行用）")
+def ai_metrics_command(hours, purge):
+    """AI 呼び出しの所要時間・TTFB・解析時間・枠待ちの p50/p95/p99 と結果の内訳を関数・モデルごとに表示します。"""
+    from datetime import timedelta
+    from app.models.plan import AICallMetric
+    from app.services.ai_limiter import ai_limiter
+    from app.services.ai_metrics import ai_metrics, percentile
+
+    with app.app_context():
+        if purge:
+            count = ai_metrics.purge()
+            print(f"🧹 {ai_metrics.retention_days} 日より古い AI 呼び出しの記録を {count} 件削除しました。")
+
+        if ai_limiter.enabled:
+            snapshot = ai_limiter.snapshot()
+            tokens = "-" if snapshot["tokens"] is None else f"{snapshot['tokens']:.1f}"
+            print(f"rate limiter [{ai_limiter.name}] tokens={tokens} running={snapshot['running']} waiting={snapshot['waiting']}")
+
+        rows = AICallMetric.query.filter(
+            AICallMetric.created_at >= datetime.utcnow() - timedelta(hours=hours)
+        ).all()
+        if not rows:
+            print(f"直近 {hours} 時間の AI 呼び出しの記録はありません。")
+            return
+
+        groups = {}
+        for row in rows:
+            groups.setdefault((row.function, row.model), []).append(row)
+
+        def fmt(values):
+            values = [v for v in values if v is not None]
+            if not values:
+                return "-"
+            return "/".join(f"{percentile(values, q):.3f}" for q in (0.5, 0.95, 0.99))
+
+        def avg(values):
+            values = [v for v in values if v is not None]
+            return f"{sum(values) / len(values):.0f}" if values else "-"
+
+        for (function, model), group in sorted(groups.items()):
+            outcomes = {}
+            for row in group:
+                outcomes[row.outcome] = outcomes.get(row.outcome, 0) + 1
+            print(f"{function} [{model}] calls={len(group)} " + " ".join(f"{k}={v}" for k, v in sorted(outcomes.items())))
+            print(f"  wall p50/p95/p99={fmt(r.wall_seconds for r in group)}s")
+            print(f"  ttfb p50/p95/p99={fmt(r.ttfb_seconds for r in group)}s")
+            print(f"  json.loads p50/p95/p99={fmt(r.parse_seconds for r in group)}s")
+            print(f"  queue p50/p95/p99={fmt(r.queue_seconds for r in group)}s")
+            print(
+                f"  avg prompt={avg(r.prompt_chars for r in group)} chars/{avg(r.prompt_tokens for r in group)} tokens"
+                f" response={avg(r.response_chars for r in group)} chars/{avg(r.response_tokens for r in group)} tokens"
+            )
+
+@cli.command("bench-checklist-prompt")
+@click.option('--fixtures', default="tests/fixtures/checklist_schedules.json", show_default=True, help="記録済みの日程（JSON）")
+@click.option('--repeat', default=3, show_default=True, help="1 つの日程・方式あたりの呼び出し回数（0 ならプロンプトの大きさだけ比べる）")
+def bench_checklist_prompt(fixtures, repeat):
+    """持ち物リスト生成のプロンプトを、日程そのまま（raw）と要約（compact）で比べます（AI_PROVIDER のプロバイダを呼びます）。"""
+    import statistics
+    import time
+    from types import SimpleNamespace
+    from app.services import ai_service
+    from app.services.ai_metrics import ai_metrics
+    from app.services.ai_provider import ai_provider
+
+    with open(fixtures, encoding="utf-8") as f:
+        recorded = json.load(f)
+
+    with app.app_context():
+        # 計測値はここで表示するので、ai_call_metrics には書き込まない
+        ai_metrics.enabled = False
+        print(f"provider={ai_provider.current.name} model={ai_provider.current.model_name} repeat={repeat}")
+        for fixture in recorded:
+            plan = SimpleNamespace(**fixture["plan"])
+            results = {}
+            for compact in (False, True):
+                prompt = ai_service.build_checklist_prompt(plan, fixture["schedule"], compact=compact)
+                walls, tokens = [], []
+                for _ in range(repeat):
+                    with ai_metrics.trace("bench-checklist-prompt") as trace:
+                        started = time.perf_counter()
+                        try:
+                            ai_service._generate_item_list_from_plan(plan, fixture["schedule"], compact=compact)
+                        except Exception as e:
+                            print(f"  {fixture['name']} {'compact' if compact else 'raw'}: {e}")
+                            continue
+                        walls.append(time.perf_counter() - started)
+                    tokens.extend(span.prompt_tokens for span in trace.spans if span.prompt_tokens)
+                results[compact] = (len(prompt), tokens, walls)
+
+            print(f"{fixture['name']} (days={plan.days})")
+            for compact, (chars, tokens, walls) in results.items():
+                line = f"  {'compact' if compact else 'raw':8s} prompt={chars} chars"
+                if tokens:
+                    line += f" / {statistics.median(tokens):.0f} tokens"
+                if walls:
+                    line += f"  latency median={statistics.median(walls):.3f}s min={min(walls):.3f}s"
+                print(line)
+            raw_chars, compact_chars = results[False][0], results[True][0]
+            print(f"  prompt size: -{1 - compact_chars / raw_chars:.0%}")
+
 if __name__ == "__main__":
     cli()
\ No newline at end of file
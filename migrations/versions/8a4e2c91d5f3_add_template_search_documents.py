@@ -0,0 +1,124 @@
+"""add template search documents
+
+Revision ID: 8a4e2c91d5f3
+Revises: 3f1c8a2d7b64
+Create Date: 2026-10-18 11:03:27.554910
+
+"""
+import re
+import unicodedata
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a4e2c91d5f3'
+down_revision = '3f1c8a2d7b64'
+branch_labels = None
+depends_on = None
+
+# このリビジョン時点の DDL とトークン化（app のコードを変えてもこのリビジョンの内容が変わらないよう、ここに固定する）
+FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS template_search_fts USING fts5("
+    "tokens, content='template_search_documents', content_rowid='template_id')",
+    "CREATE TRIGGER IF NOT EXISTS template_search_documents_ai AFTER INSERT ON template_search_documents BEGIN "
+    "INSERT INTO template_search_fts(rowid, tokens) VALUES (new.template_id, new.tokens); END",
+    "CREATE TRIGGER IF NOT EXISTS template_search_documents_ad AFTER DELETE ON template_search_documents BEGIN "
+    "INSERT INTO template_search_fts(template_search_fts, rowid, tokens) VALUES ('delete', old.template_id, old.tokens); END",
+    "CREATE TRIGGER IF NOT EXISTS template_search_documents_au AFTER UPDATE ON template_search_documents BEGIN "
+    "INSERT INTO template_search_fts(template_search_fts, rowid, tokens) VALUES ('delete', old.template_id, old.tokens); "
+    "INSERT INTO template_search_fts(rowid, tokens) VALUES (new.template_id, new.tokens); END",
+]
+
+_WORD_RUN = re.compile(r"\w+")
+
+
+def _tokenize(value):
+    tokens = []
+    for run in _WORD_RUN.findall(unicodedata.normalize("NFKC", value or "").casefold()):
+        tokens.extend(run)
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return list(dict.fromkeys(tokens))
+
+
+def _place_names(itinerary_outline):
+    names = []
+    if isinstance(itinerary_outline, dict):
+        days = itinerary_outline.get("days", [])
+    elif isinstance(itinerary_outline, list):
+        days = itinerary_outline
+    else:
+        days = []
+    for day in days:
+        if not isinstance(day, dict):
+            continue
+        for key in ("area", "place", "title"):
+            if isinstance(day.get(key), str):
+                names.append(day[key])
+        names.extend(p for p in day.get("places", []) or [] if isinstance(p, str))
+        for detail in day.get("details", []) or []:
+            if isinstance(detail, dict) and isinstance(detail.get("activity"), str):
+                names.append(detail["activity"])
+    return names
+
+
+def _build_tokens(row):
+    parts = [row['public_title'], row['short_note'], row['tags'], *_place_names(row['itinerary_outline_json'])]
+    return " ".join(_tokenize(" ".join(p for p in parts if p)))
+
+
+def upgrade():
+    op.create_table('template_search_documents',
+    sa.Column('template_id', sa.Integer(), nullable=False),
+    sa.Column('tokens', sa.Text(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['template_id'], ['templates.template_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('template_id')
+    )
+
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.execute(
+            "CREATE INDEX ix_template_search_documents_tsv ON template_search_documents "
+            "USING gin (to_tsvector('simple', tokens))"
+        )
+    elif bind.dialect.name == 'sqlite':
+        for statement in FTS_DDL:
+            op.execute(statement)
+
+    # 既存テンプレートの検索ドキュメントを作成する
+    templates = sa.table(
+        'templates',
+        sa.column('template_id', sa.Integer),
+        sa.column('public_title', sa.String),
+        sa.column('short_note', sa.String),
+        sa.column('tags', sa.String),
+        sa.column('itinerary_outline_json', sa.JSON),
+    )
+    documents = sa.table(
+        'template_search_documents',
+        sa.column('template_id', sa.Integer),
+        sa.column('tokens', sa.Text),
+        sa.column('updated_at', sa.DateTime),
+    )
+    rows = bind.execute(sa.select(templates)).mappings().all()
+    if rows:
+        from datetime import datetime
+
+        now = datetime.utcnow()
+        op.bulk_insert(documents, [
+            {
+                'template_id': row['template_id'],
+                'tokens': _build_tokens(row),
+                'updated_at': now,
+            }
+            for row in rows
+        ])
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite':
+        op.execute("DROP TABLE IF EXISTS template_search_fts")
+    op.drop_table('template_search_documents')
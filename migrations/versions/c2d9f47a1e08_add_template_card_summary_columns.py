@@ -0,0 +1,163 @@
+"""add template card summary columns
+
+Revision ID: c2d9f47a1e08
+Revises: 8a4e2c91d5f3
+Create Date: 2026-10-18 13:41:09.207615
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2d9f47a1e08'
+down_revision = '8a4e2c91d5f3'
+branch_labels = None
+depends_on = None
+
+
+# 以下はこのリビジョン時点の要約の組み立て（app/services/db_service.py の build_template_summary）を固定したもの。
+# app のコードを変えてもこのリビジョンの内容が変わらないよう、ここに写しておく
+def _outline_days(itinerary_outline):
+    return itinerary_outline.get("days", []) if isinstance(itinerary_outline, dict) else []
+
+
+def _traffic_methods(itinerary_outline):
+    methods = []
+    for d in _outline_days(itinerary_outline):
+        tm = d.get("traffic_method")
+        if tm and tm not in methods:
+            methods.append(tm)
+    return methods
+
+
+def _stay_locations(itinerary_outline):
+    locations = []
+    for d in _outline_days(itinerary_outline):
+        locations.extend(d.get("places", []))
+    return list(dict.fromkeys(locations))
+
+
+def _selected_hotel(plan_hotel, selected_snapshot):
+    hotel_json = plan_hotel or {}
+    candidates = hotel_json.get("candidates", []) or []
+    selected_id = hotel_json.get("selected_id")
+
+    selected = None
+    if selected_id is not None:
+        selected = next((c for c in candidates if str(c.get("id")) == str(selected_id)), None)
+    if not selected:
+        selected = next((c for c in candidates if c.get("is_selected")), None)
+    if not selected and selected_snapshot:
+        selected = {"name": selected_snapshot.name, "price": selected_snapshot.price}
+    return selected
+
+
+def _build_summary(itinerary_outline, plan, selected_transit, selected_hotel_snapshot):
+    if selected_transit:
+        transport = selected_transit.transport_method or ""
+        transport_type = selected_transit.type
+    else:
+        transport = " / ".join(_traffic_methods(itinerary_outline or {}))
+        transport_type = None
+
+    selected_hotel = _selected_hotel(plan.hotel, selected_hotel_snapshot) if plan else None
+    if selected_hotel and selected_hotel.get("name"):
+        hotel_name = selected_hotel["name"]
+    elif selected_hotel or (plan and plan.hotel):
+        hotel_name = "選択中"
+    else:
+        hotel_name = None
+    try:
+        hotel_price = int(selected_hotel.get("price")) if selected_hotel and selected_hotel.get("price") not in (None, "", "None") else None
+    except (TypeError, ValueError):
+        hotel_price = None
+
+    return {
+        "summary_transport": transport if plan else "",
+        "summary_transport_type": transport_type if plan else None,
+        "summary_hotel_name": hotel_name or None,
+        "summary_hotel_price": hotel_price,
+        "summary_stay_locations": _stay_locations(itinerary_outline or {}),
+    }
+
+
+def upgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    with op.batch_alter_table('templates', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('summary_transport', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('summary_transport_type', sa.String(length=50), nullable=True))
+        batch_op.add_column(sa.Column('summary_hotel_name', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('summary_hotel_price', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('summary_stay_locations', sa.JSON(), nullable=True))
+
+    # ### end Alembic commands ###
+
+    # 既存テンプレートの要約を埋める
+    bind = op.get_bind()
+    templates = sa.table(
+        'templates',
+        sa.column('template_id', sa.Integer),
+        sa.column('plan_id', sa.Integer),
+        sa.column('itinerary_outline_json', sa.JSON),
+        sa.column('summary_transport', sa.String),
+        sa.column('summary_transport_type', sa.String),
+        sa.column('summary_hotel_name', sa.String),
+        sa.column('summary_hotel_price', sa.Integer),
+        sa.column('summary_stay_locations', sa.JSON),
+    )
+    plans = sa.table('plans', sa.column('id', sa.Integer), sa.column('hotel', sa.JSON))
+    transports = sa.table(
+        'transport_snapshots',
+        sa.column('id', sa.Integer),
+        sa.column('plan_id', sa.Integer),
+        sa.column('type', sa.String),
+        sa.column('transport_method', sa.String),
+        sa.column('is_selected', sa.Boolean),
+    )
+    hotels = sa.table(
+        'hotel_snapshots',
+        sa.column('id', sa.Integer),
+        sa.column('plan_id', sa.Integer),
+        sa.column('name', sa.String),
+        sa.column('price', sa.Integer),
+        sa.column('is_selected', sa.Boolean),
+    )
+
+    plans_by_id = {row.id: row for row in bind.execute(sa.select(plans.c.id, plans.c.hotel))}
+    selected_transits = {}
+    for row in bind.execute(
+        sa.select(transports).where(transports.c.is_selected.is_(True)).order_by(transports.c.id)
+    ):
+        selected_transits.setdefault(row.plan_id, row)
+    selected_hotels = {}
+    for row in bind.execute(
+        sa.select(hotels).where(hotels.c.is_selected.is_(True)).order_by(hotels.c.id)
+    ):
+        selected_hotels.setdefault(row.plan_id, row)
+
+    rows = bind.execute(
+        sa.select(templates.c.template_id, templates.c.plan_id, templates.c.itinerary_outline_json)
+    ).all()
+    for row in rows:
+        summary = _build_summary(
+            row.itinerary_outline_json,
+            plans_by_id.get(row.plan_id),
+            selected_transits.get(row.plan_id),
+            selected_hotels.get(row.plan_id),
+        )
+        bind.execute(
+            templates.update().where(templates.c.template_id == row.template_id).values(**summary)
+        )
+
+
+def downgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    with op.batch_alter_table('templates', schema=None) as batch_op:
+        batch_op.drop_column('summary_stay_locations')
+        batch_op.drop_column('summary_hotel_price')
+        batch_op.drop_column('summary_hotel_name')
+        batch_op.drop_column('summary_transport_type')
+        batch_op.drop_column('summary_transport')
+
+    # ### end Alembic commands ###
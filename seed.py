@@ -18,9 +18,15 @@ from app.models.plan import (
     Schedule,
     # ScheduleDetail, # Removed: Not in plan.py
     Template,
+    TemplateSearchDocument,
+    TemplateTag,
+    Tag,
+    TemplateStats,
     Share,
 )
 from app.models.checklist import Checklist, ChecklistItem, Item, Category
+from app.services import search_service
+from app.services.db_service import PlanDBService
 
 
 def run_seed():
@@ -30,6 +36,10 @@ def run_seed():
     with app.app_context():
         # Clean up existing data (Child -> Parent order to avoid FK errors)
         Share.query.delete()
+        TemplateSearchDocument.query.delete()
+        TemplateTag.query.delete()
+        Tag.query.delete()
+        TemplateStats.query.delete()
         Template.query.delete()
         
         # Checklist related
@@ -304,6 +314,12 @@ def run_seed():
             display_version=1,
         )
         db.session.add(template2)
+        search_service.refresh_template_document(template1)
+        search_service.refresh_template_document(template2)
+        PlanDBService.sync_template_tags(template1)
+        PlanDBService.sync_template_tags(template2)
+        template1.stats = TemplateStats()
+        template2.stats = TemplateStats()
         db.session.flush()
 
         share = Share(
@@ -342,6 +358,8 @@ def run_seed():
             is_selected=True,
         )
         db.session.add_all([transport_snapshot, hotel_snapshot])
+        db.session.flush()
+        PlanDBService.refresh_template_summaries([template1, template2])
 
         db.session.commit()
         print("Seed data insertion completed successfully.")
@@ -0,0 +1,133 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+from flask import Flask
+from sqlalchemy import event
+
+from app.extensions import db
+from app.models.user import User
+from app.models.plan import Plan, Template
+
+
+@pytest.fixture
+def app(tmp_path):
+    """SQLite のインメモリ DB を使うテスト用アプリ（テンプレート・静的ファイルは app/ のものを使う）。"""
+    app = Flask("app", instance_path=str(tmp_path / "instance"))
+    app.config.update(
+        TESTING=True,
+        SQLALCHEMY_DATABASE_URI="sqlite:///:memory:",
+        SQLALCHEMY_TRACK_MODIFICATIONS=False,
+    )
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app, monkeypatch):
+    """
+    ルートを通すテスト用のクライアント。create_app と同じ Blueprint とログインを組み込み、
+    ページキャッシュはプロセス内のものを使う（共有ページの静的出力は行わない）。
+    """
+    from app.extensions import login_manager
+    from app.routes.auth_routes import auth_bp
+    from app.routes.plan_routes import plan_bp
+    from app.routes.root_routes import root_bp
+    from app.services.cache_service import page_cache
+
+    app.config.update(
+        SECRET_KEY="test",
+        BRAND_NAME="motilist",
+        PAGE_CACHE_BACKEND="memory",
+        SHARE_EXPORT_ENABLED=False,
+    )
+    login_manager.init_app(app)
+    login_manager.user_loader(lambda user_id: db.session.get(User, int(user_id)))
+    app.register_blueprint(plan_bp)
+    app.register_blueprint(auth_bp)
+    app.register_blueprint(root_bp)
+    monkeypatch.setattr(page_cache, "store", None)
+    page_cache.init_app(app)
+    return app.test_client()
+
+
+@pytest.fixture
+def login(client):
+    """login(user) でクライアントをログイン中にする（Flask-Login のセッションを直接書く）。"""
+
+    def _login(user):
+        with client.session_transaction() as session:
+            session["_user_id"] = str(user.user_id)
+            session["_fresh"] = True
+            session["user_id"] = user.user_id
+
+    return _login
+
+
+@pytest.fixture
+def user(app):
+    user = User(display_name="テストユーザー", email="test@example.com", passwordHash="x")
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+@pytest.fixture
+def make_template(user):
+    """Plan と Template を 1 件ずつ作成するファクトリ。"""
+    base = datetime(2025, 1, 1)
+    counter = {"n": 0}
+
+    def _make(public_title="プラン", visibility="private", owner=None, **kwargs):
+        counter["n"] += 1
+        owner = owner or user
+        plan = Plan(
+            user_id=owner.user_id,
+            title=public_title,
+            destination=kwargs.pop("destination", "京都"),
+            departure="東京",
+            start_date=date(2025, 4, 1),
+            days=kwargs.pop("days", 2),
+        )
+        db.session.add(plan)
+        db.session.flush()
+        template = Template(
+            user_id=owner.user_id,
+            plan_id=plan.id,
+            public_title=public_title,
+            itinerary_outline_json=kwargs.pop("itinerary_outline_json", {}),
+            checklist_summary_json={},
+            visibility=visibility,
+            created_at=kwargs.pop("created_at", None) or base + timedelta(minutes=counter["n"]),
+            **kwargs,
+        )
+        db.session.add(template)
+        db.session.commit()
+        return template
+
+    return _make
+
+
+@pytest.fixture
+def count_queries(app):
+    """with count_queries() as counter: ... で発行された SELECT/INSERT 等の件数を数える。"""
+    from contextlib import contextmanager
+
+    @contextmanager
+    def _count():
+        statements = []
+
+        def _before_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        engine = db.engine
+        event.listen(engine, "before_cursor_execute", _before_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, "before_cursor_execute", _before_execute)
+
+    return _count
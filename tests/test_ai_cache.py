@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta
+
+from app.extensions import db
+from app.models.plan import AIGenerationCacheEntry, Plan
+from app.services import ai_service
+from app.services.ai_cache import AIGenerationCache, make_key
+
+
+def _cache(app, **config):
+    app.config.update({"AI_CACHE_ENABLED": True, "AI_CACHE_TTL": 3600, "AI_CACHE_MAXSIZE": 100, **config})
+    return AIGenerationCache(app)
+
+
+def test_key_ignores_width_case_whitespace_and_order():
+    assert make_key("plan", destination="京都 ", travel_style=["グルメ", "歴史"], days=2) == make_key(
+        "plan", destination="京都", travel_style=["歴史", "グルメ"], days=2
+    )
+    assert make_key("plan", destination="ＴＯＫＹＯ　タワー") == make_key("plan", destination="tokyo タワー")
+    assert make_key("plan", destination="京都", days=2) != make_key("plan", destination="京都", days=3)
+    assert make_key("plan", destination="京都") != make_key("checklist", destination="京都")
+
+
+def test_hit_skips_generation_and_survives_process_restart(app):
+    cache = _cache(app)
+    calls = []
+
+    def generate():
+        calls.append(1)
+        return {"plan_title": "京都旅"}
+
+    assert cache.get_or_generate("plan", "k", generate) == {"plan_title": "京都旅"}
+    assert cache.get_or_generate("plan", "k", generate) == {"plan_title": "京都旅"}
+    # 別プロセス（メモリが空）でもテーブルから読める
+    cache.clear_memory()
+    assert cache.get_or_generate("plan", "k", generate) == {"plan_title": "京都旅"}
+
+    assert len(calls) == 1
+    stats = cache.stats()["plan"]
+    assert (stats["misses"], stats["memory_hits"], stats["db_hits"], stats["stores"]) == (1, 1, 1, 1)
+
+
+def test_bypass_regenerates_and_overwrites(app):
+    cache = _cache(app)
+    cache.get_or_generate("plan", "k", lambda: {"v": 1})
+
+    assert cache.get_or_generate("plan", "k", lambda: {"v": 2}, bypass=True) == {"v": 2}
+    cache.clear_memory()
+    assert cache.get_or_generate("plan", "k", lambda: {"v": 3}) == {"v": 2}
+    assert cache.stats()["plan"]["bypass"] == 1
+
+
+def test_expired_entries_are_not_used_and_size_is_bounded(app):
+    cache = _cache(app, AI_CACHE_MAXSIZE=2)
+    cache.set("plan", "old", {"v": "old"})
+    db.session.get(AIGenerationCacheEntry, "old").expires_at = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+    cache.clear_memory()
+    assert cache.get("plan", "old") is None
+
+    for key in ("a", "b", "c"):
+        cache.set("plan", key, {"v": key})
+    assert sorted(db.session.scalars(db.select(AIGenerationCacheEntry.cache_key))) == ["b", "c"]
+
+
+def test_generate_plan_from_inputs_uses_cache(app, monkeypatch):
+    monkeypatch.setattr(ai_service, "ai_cache", _cache(app))
+    calls = []
+    monkeypatch.setattr(
+        ai_service, "_generate_plan_from_inputs", lambda *args, **kwargs: calls.append(args) or {"plan_title": "T", "itinerary": [{"day": 1}]}
+    )
+
+    ai_service.generate_plan_from_inputs("京都", start_point="東京", days=2, purpose_raw="観光", travel_style="グルメ, 歴史")
+    ai_service.generate_plan_from_inputs("京都", start_point="東京", days="2", purpose_raw="観光", travel_style="歴史、グルメ")
+    assert len(calls) == 1
+
+    ai_service.generate_plan_from_inputs(
+        "京都", start_point="東京", days=2, purpose_raw="観光", travel_style="グルメ, 歴史", use_cache=False
+    )
+    assert len(calls) == 2
+
+
+def test_checklist_generation_is_shared_by_identical_plans(app, user, monkeypatch):
+    monkeypatch.setattr(ai_service, "ai_cache", _cache(app))
+    calls = []
+
+    def generate(plan, schedule, **kwargs):
+        calls.append(plan.id)
+        if len(calls) == 1:
+            return {"error": "broken"}
+        return {"checklist": [{"category": "衣類", "items": ["下着"]}]}
+
+    monkeypatch.setattr(ai_service, "_generate_item_list_from_plan", generate)
+
+    def make_plan(title):
+        plan = Plan(
+            user_id=user.user_id, title=title, destination="京都", departure="東京",
+            start_date=datetime(2025, 4, 1).date(), days=2, purpose="観光", options=["グルメ", "歴史"],
+        )
+        db.session.add(plan)
+        db.session.commit()
+        return plan
+
+    schedule = [{"day": 1, "details": [{"time": "09:00", "activity": "清水寺"}]}]
+    source, copied = make_plan("元のプラン"), make_plan("元のプラン のコピー")
+
+    # 形式の崩れた応答は保存しない
+    assert ai_service.generate_item_list_from_plan(source, schedule) == {"error": "broken"}
+    assert "checklist" in ai_service.generate_item_list_from_plan(source, schedule)
+    assert "checklist" in ai_service.generate_item_list_from_plan(copied, [dict(day) for day in schedule])
+    assert calls == [source.id, source.id]
+
+    # 日程の順序が変われば別の生成になる
+    ai_service.generate_item_list_from_plan(copied, [{"day": 2, "details": []}] + schedule)
+    ai_service.generate_item_list_from_plan(copied, schedule + [{"day": 2, "details": []}])
+    assert len(calls) == 4
@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.extensions import db
+from app.models.plan import AICallMetric, AIRateLease, AIRateLimit
+from app.services import ai_service
+from app.services.ai_limiter import LEASE_RUNNING, AIRateLimiter, AIRateLimitError
+from app.services.ai_metrics import AIMetrics
+from app.services.ai_provider import StubProvider
+
+
+def _limiter(app, **config):
+    settings = {
+        "AI_RATE_LIMIT_ENABLED": True,
+        "AI_RATE_PER_MINUTE": 60,
+        "AI_RATE_BURST": 2,
+        "AI_MAX_IN_FLIGHT": 0,
+        "AI_RATE_MAX_WAIT": 0,
+    }
+    app.config.update(settings, **config)
+    return AIRateLimiter(app)
+
+
+def test_token_bucket_rejects_over_burst_and_refills(app):
+    limiter = _limiter(app)
+
+    for _ in range(2):
+        with limiter.slot():
+            pass
+    with pytest.raises(AIRateLimitError) as excinfo:
+        with limiter.slot():
+            pass
+    assert excinfo.value.retry_after >= 1
+
+    # 1 分たてば 1 分あたりの回数（バケットの大きさまで）戻る
+    row = db.session.get(AIRateLimit, "gemini")
+    row.refilled_at -= timedelta(seconds=60)
+    db.session.commit()
+    with limiter.slot():
+        pass
+
+    stats = limiter.stats()
+    assert (stats["acquired"], stats["rejected"], stats["waiting"]) == (3, 1, 0)
+    assert AIRateLease.query.count() == 0
+
+
+def test_in_flight_cap_is_shared_and_expired_leases_are_ignored(app):
+    limiter = _limiter(app, AI_RATE_PER_MINUTE=0, AI_MAX_IN_FLIGHT=1)
+    # 別のワーカー（インスタンス）からも同じ枠を数える
+    other = AIRateLimiter(app)
+
+    with limiter.slot():
+        assert other.snapshot()["running"] == 1
+        with pytest.raises(AIRateLimitError):
+            other.acquire()
+    with other.slot():
+        pass
+
+    # 返却されないまま期限を過ぎた枠（落ちたワーカーのもの）は数えない
+    db.session.add(AIRateLease(lease_id="crashed", name="gemini", state=LEASE_RUNNING, expires_at=datetime.utcnow() - timedelta(seconds=1)))
+    db.session.commit()
+    with limiter.slot():
+        pass
+
+
+def test_waits_for_refill_within_max_wait(app):
+    limiter = _limiter(app, AI_RATE_PER_MINUTE=600, AI_RATE_BURST=1, AI_RATE_MAX_WAIT=2)
+
+    limiter.acquire()
+    lease_id, waited = limiter.acquire()
+
+    assert lease_id is not None
+    assert 0.05 < waited < 2
+    assert limiter.stats()["queue_seconds"]["count"] == 2
+
+
+def test_rejected_generation_is_recorded_and_not_wrapped(app, monkeypatch):
+    metrics = AIMetrics(app)
+    limiter = _limiter(app, AI_RATE_BURST=1)
+    monkeypatch.setattr(ai_service, "ai_metrics", metrics)
+    monkeypatch.setattr(ai_service, "ai_limiter", limiter)
+    monkeypatch.setattr(ai_service.ai_cache, "enabled", False)
+    monkeypatch.setattr(ai_service.ai_provider, "current", StubProvider(latency=0))
+
+    ai_service.generate_plan_from_inputs("京都", start_point="東京", days=2, purpose_raw="観光")
+    with pytest.raises(AIRateLimitError):
+        ai_service.generate_plan_from_inputs("京都", start_point="東京", days=2, purpose_raw="観光")
+
+    assert metrics.stats()[("generate_plan_from_inputs", "stub")]["outcomes"] == {"ok": 1, "rate_limited": 1}
+    ok = AICallMetric.query.filter_by(outcome="ok").one()
+    assert ok.queue_seconds is not None
@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.extensions import db
+from app.models.plan import AICallMetric
+from app.services import ai_service
+from app.services.ai_metrics import AIMetrics, Histogram
+from app.services.ai_provider import StubProvider
+
+
+def _metrics(app, monkeypatch):
+    metrics = AIMetrics(app)
+    monkeypatch.setattr(ai_service, "ai_metrics", metrics)
+    monkeypatch.setattr(ai_service.ai_cache, "enabled", False)
+    return metrics
+
+
+def test_histogram_quantiles_interpolate_within_buckets():
+    histogram = Histogram((1, 2, 4))
+    for value in (0.5, 1.5, 1.5, 3, 10):
+        histogram.observe(value)
+
+    summary = histogram.summary()
+    assert summary["count"] == 5
+    assert summary["buckets"] == {"1": 1, "2": 2, "4": 1, "+Inf": 1}
+    assert 1 < summary["p50"] <= 2
+    assert 4 < summary["p99"] <= 10
+
+
+def test_generation_records_span_histograms_and_row(app, monkeypatch):
+    metrics = _metrics(app, monkeypatch)
+    monkeypatch.setattr(ai_service.ai_provider, "current", StubProvider(latency=0))
+
+    with metrics.trace("plan_job", trace_id="job-1") as trace:
+        ai_service.generate_plan_from_inputs("京都", start_point="東京", days=2, purpose_raw="観光")
+
+    stats = metrics.stats()[("generate_plan_from_inputs", "stub")]
+    assert stats["outcomes"] == {"ok": 1}
+    assert stats["wall_seconds"]["count"] == 1
+    assert stats["response_chars"]["sum"] > 0
+    assert stats["parse_seconds"]["count"] == 1
+
+    row = AICallMetric.query.one()
+    assert (row.function, row.provider, row.outcome, row.trace_id) == ("generate_plan_from_inputs", "stub", "ok", "job-1")
+    assert row.prompt_chars > 0 and row.ttfb_seconds is not None
+    assert [span.function for span in trace.spans] == ["generate_plan_from_inputs"]
+
+
+def test_invalid_json_and_errors_are_classified(app, monkeypatch):
+    metrics = _metrics(app, monkeypatch)
+    app.config["AI_RESPONSE_RETRIES"] = 0
+
+    class BrokenProvider(StubProvider):
+        def generate_text(self, task, system_prompt, user_prompt, inputs, span=None):
+            return '{"plan_title": '
+
+    monkeypatch.setattr(ai_service.ai_provider, "current", BrokenProvider(latency=0))
+    with pytest.raises(Exception):
+        ai_service.generate_plan_from_inputs("京都", start_point="東京", days=2, purpose_raw="観光")
+
+    monkeypatch.setattr(ai_service.ai_provider, "current", StubProvider(latency=0, error_rate=1.0))
+    with pytest.raises(Exception):
+        ai_service.generate_plan_from_inputs("京都", start_point="東京", days=2, purpose_raw="観光")
+
+    assert metrics.stats()[("generate_plan_from_inputs", "stub")]["outcomes"] == {"invalid_json": 1, "error": 1}
+    assert sorted(row.outcome for row in AICallMetric.query.all()) == ["error", "invalid_json"]
+
+
+def test_old_rows_are_purged_separately_from_recording(app, monkeypatch):
+    app.config["AI_METRICS_RETENTION_DAYS"] = 30
+    metrics = _metrics(app, monkeypatch)
+    monkeypatch.setattr(ai_service.ai_provider, "current", StubProvider(latency=0))
+    old = AICallMetric(function="generate_plan_from_inputs", provider="stub", outcome="ok", wall_seconds=1.0,
+                       created_at=datetime.utcnow() - timedelta(days=31))
+    db.session.add(old)
+    db.session.commit()
+
+    # 記録のたびには消さない
+    ai_service.generate_plan_from_inputs("京都", start_point="東京", days=2, purpose_raw="観光")
+    assert AICallMetric.query.count() == 2
+
+    assert metrics.purge() == 1
+    assert [row.outcome for row in AICallMetric.query.all()] == ["ok"]
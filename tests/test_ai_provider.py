@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+from app.services import ai_service
+from app.services.ai_provider import AIProviderManager, StubProvider, StubProviderError, TASK_CHECKLIST, TASK_PLAN
+
+INPUTS = {"destination": "京都", "start_point": "東京", "days": 3, "purpose": "観光", "travel_style": "グルメ"}
+
+
+def test_stub_plan_is_deterministic_and_matches_plan_schema():
+    provider = StubProvider(latency=0)
+
+    text = provider.generate_text(TASK_PLAN, "system", "prompt", INPUTS)
+    plan = json.loads(text)
+
+    assert text == StubProvider(latency=0).generate_text(TASK_PLAN, "system", "prompt", INPUTS)
+    assert plan["plan_title"]
+    assert set(plan["transport_options"]) == {"価格重視", "速度重視", "おすすめ", "車利用"}
+    assert all({"method", "estimated_cost", "estimated_time"} <= set(o) for o in plan["transport_options"].values())
+    assert [day["day"] for day in plan["itinerary"]] == [1, 2, 3]
+    assert all(d["time"] and d["activity"] for day in plan["itinerary"] for d in day["details"])
+
+
+def test_stub_stream_joins_to_the_same_document():
+    provider = StubProvider(latency=0, chunks=9)
+
+    chunks = list(provider.stream_text(TASK_CHECKLIST, "system", "prompt", INPUTS))
+
+    assert len(chunks) == 9
+    checklist = json.loads("".join(chunks))["checklist"]
+    assert [c["category"] for c in checklist] == ["貴重品", "衣類", "バス用品、コスメ", "その他"]
+
+
+def test_stub_error_rate_is_reproducible_with_seed():
+    def outcomes(seed):
+        provider = StubProvider(latency=0, error_rate=0.5, seed=seed)
+        results = []
+        for _ in range(20):
+            try:
+                provider.generate_text(TASK_PLAN, "system", "prompt", INPUTS)
+                results.append(True)
+            except StubProviderError:
+                results.append(False)
+        return results
+
+    assert outcomes(7) == outcomes(7)
+    assert True in outcomes(7) and False in outcomes(7)
+
+
+def test_configured_stub_drives_plan_generation(app, monkeypatch):
+    app.config.update(AI_PROVIDER="stub", AI_STUB_LATENCY=0)
+    monkeypatch.setattr(ai_service, "ai_provider", AIProviderManager(app))
+    monkeypatch.setattr(ai_service.ai_cache, "enabled", False)
+
+    plan = ai_service.generate_plan_from_inputs("京都", start_point="東京", days=2, purpose_raw="観光")
+
+    assert len(plan["itinerary"]) == 2
+
+
+def test_unknown_provider_is_rejected(app):
+    app.config.update(AI_PROVIDER="nope")
+
+    with pytest.raises(ValueError):
+        AIProviderManager(app)
@@ -0,0 +1,152 @@
+import json
+
+import pytest
+
+from app.services import ai_service
+from app.services.ai_metrics import AIMetrics
+from app.services.ai_provider import GeminiProvider, StubProvider, TASK_CHECKLIST, TASK_PLAN
+from app.services.ai_response import (
+    AIResponseError,
+    parse_checklist_response,
+    parse_plan_response,
+    repair_json,
+)
+
+PLAN = {
+    "plan_title": "京都グルメ旅",
+    "transport_options": {
+        "おすすめ": {"method": "新幹線", "estimated_cost": 14000, "estimated_time": 140, "departure_time": "07:00"},
+    },
+    "itinerary": [
+        {"day": 1, "details": [{"time": "09:00", "activity": "清水寺", "transport_notes": "バス"}]},
+        {"day": 2, "details": [{"time": "10:00", "activity": "嵐山"}]},
+    ],
+}
+
+
+def test_repair_json_handles_fences_trailing_commas_and_truncation():
+    assert repair_json('{"a": 1}') == ({"a": 1}, False)
+    assert repair_json('```json\n{"a": [1, 2,],}\n```') == ({"a": [1, 2]}, True)
+    assert repair_json('以下です。{"a": 1} 以上') == ({"a": 1}, True)
+
+    text = json.dumps(PLAN, ensure_ascii=False)
+    truncated = text[: text.index("嵐山")]
+    value, repaired = repair_json(truncated)
+    assert repaired
+    assert value["itinerary"][0] == PLAN["itinerary"][0]
+
+    with pytest.raises(AIResponseError):
+        repair_json("申し訳ありません。")
+
+
+def test_plan_types_are_coerced_and_invalid_parts_dropped():
+    data = {
+        "plan_title": "京都",
+        "transport_options": {
+            "価格重視": {"method": "夜行バス", "estimated_cost": "約8,000円", "estimated_time": "8時間", "departure_time": 22},
+            "速度重視": {"method": "新幹線", "estimated_cost": 14000.0, "estimated_time": "2時間15分", "arrival_time": "9:30"},
+            "車利用": {"estimated_cost": 12000},
+        },
+        "itinerary": [
+            {"day": "1", "details": [{"time": 9, "activity": "清水寺"}, {"time": "12:00"}]},
+            {"day": 2, "details": []},
+            "3日目",
+        ],
+    }
+
+    plan, issues = parse_plan_response(json.dumps(data, ensure_ascii=False))
+
+    assert plan["transport_options"] == {
+        "価格重視": {"method": "夜行バス", "estimated_cost": 8000, "estimated_time": 480, "departure_time": "22:00"},
+        "速度重視": {"method": "新幹線", "estimated_cost": 14000, "estimated_time": 135, "arrival_time": "09:30"},
+    }
+    assert plan["itinerary"] == [{"day": 1, "details": [{"time": "09:00", "activity": "清水寺"}]}]
+    assert "交通手段 車利用 を除外しました" in issues
+    assert "日程 2 件目を除外しました" in issues
+
+
+def test_valid_responses_report_no_issues_and_unusable_ones_raise():
+    assert parse_plan_response(json.dumps(PLAN, ensure_ascii=False)) == (PLAN, [])
+    checklist = {"checklist": [{"category": "貴重品", "required_items": ["財布"], "items": ["モバイルバッテリー"]}]}
+    assert parse_checklist_response(json.dumps(checklist, ensure_ascii=False)) == (checklist, [])
+
+    with pytest.raises(AIResponseError):
+        parse_plan_response('{"plan_title": "京都", "itinerary": []}')
+    with pytest.raises(AIResponseError):
+        parse_checklist_response('{"checklist": [{"category": "貴重品", "items": []}]}')
+
+
+def test_checklist_items_are_coerced():
+    data = {"checklist": [{"category": "衣類", "required_items": "下着、靴下", "items": [{"name": "帽子"}, "下着", 3]}]}
+
+    checklist, issues = parse_checklist_response(json.dumps(data, ensure_ascii=False))
+
+    assert checklist == {"checklist": [{"category": "衣類", "required_items": ["下着", "靴下"], "items": ["帽子", "3"]}]}
+    assert issues == ["型を修正しました"]
+
+
+class _SequenceProvider(StubProvider):
+    def __init__(self, responses):
+        super().__init__(latency=0)
+        self.responses = list(responses)
+        self.calls = 0
+
+    def generate_text(self, task, system_prompt, user_prompt, inputs, span=None):
+        self.calls += 1
+        return self.responses.pop(0)
+
+    def stream_text(self, task, system_prompt, user_prompt, inputs, span=None):
+        self.calls += 1
+        yield self.responses.pop(0)
+
+
+def _setup(app, monkeypatch, provider):
+    metrics = AIMetrics(app)
+    monkeypatch.setattr(ai_service, "ai_metrics", metrics)
+    monkeypatch.setattr(ai_service.ai_cache, "enabled", False)
+    monkeypatch.setattr(ai_service.ai_provider, "current", provider)
+    return metrics
+
+
+def test_only_unrecoverable_responses_are_regenerated(app, monkeypatch):
+    text = json.dumps(PLAN, ensure_ascii=False)
+    provider = _SequenceProvider([text[:-40], "", text])
+    metrics = _setup(app, monkeypatch, provider)
+
+    # 途中で切れていても使える日程があれば作り直さない
+    plan = ai_service.generate_plan_from_inputs("京都", start_point="東京", days=2, purpose_raw="観光")
+    assert provider.calls == 1
+    assert plan["itinerary"] == PLAN["itinerary"][:1]
+
+    # 空の応答は作り直す
+    assert ai_service.generate_plan_from_inputs("京都", start_point="東京", days=2, purpose_raw="観光") == PLAN
+    assert provider.calls == 3
+    assert metrics.stats()[("generate_plan_from_inputs", "stub")]["outcomes"] == {"repaired": 1, "empty": 1, "ok": 1}
+
+
+def test_streaming_skips_invalid_parts_and_resets_before_retry(app, monkeypatch):
+    broken = {"plan_title": "京都", "transport_options": {"おすすめ": {"estimated_cost": 1}}, "itinerary": []}
+    provider = _SequenceProvider([json.dumps(broken, ensure_ascii=False), json.dumps(PLAN, ensure_ascii=False)])
+    _setup(app, monkeypatch, provider)
+
+    events = list(ai_service.stream_plan_from_inputs("京都", start_point="東京", days=2, purpose_raw="観光"))
+
+    assert provider.calls == 2
+    # 1 回目の応答で送ったタイトルは reset で取り消し、2 回目の応答の途中経過を最初から送る（日程のキーは何日目か）
+    assert [(name, key) for name, key, value in events] == [
+        ("title", "plan_title"), ("reset", None),
+        ("title", "plan_title"), ("transport", "おすすめ"), ("day", 1), ("day", 2), ("result", None),
+    ]
+    assert events[0][2] == "京都"
+    assert events[2][2] == "京都グルメ旅"
+    assert events[-1][2] == PLAN
+
+
+def test_gemini_config_carries_schema_and_output_limit():
+    provider = GeminiProvider(max_output_tokens={TASK_PLAN: 8192})
+
+    config = provider._config(TASK_PLAN)
+    assert config.response_schema["required"] == ["plan_title", "transport_options", "itinerary"]
+    assert config.max_output_tokens == 8192
+    assert provider._config(TASK_CHECKLIST).max_output_tokens is None
+    assert GeminiProvider(response_schema=False)._config(TASK_PLAN).response_schema is None
@@ -0,0 +1,88 @@
+from app.extensions import db
+from app.models.checklist import CHECKLIST_PREFETCHED, CHECKLIST_PREFETCHING, Checklist, ChecklistItem
+from app.models.plan import Schedule
+from app.services import checklist_prefetch as prefetch_module
+from app.services.checklist_prefetch import TAKE_NONE, TAKE_PENDING, TAKE_READY, ChecklistPrefetcher
+from app.services.db_service import PlanDBService
+
+AI_CHECKLIST = {"checklist": [{"category": "貴重品", "required_items": ["財布"], "items": ["モバイルバッテリー"]}]}
+
+
+def _prefetcher(app):
+    app.config.update(CHECKLIST_PREFETCH_ENABLED=True, CHECKLIST_PREFETCH_WORKERS=0, CHECKLIST_PREFETCH_WAIT=10)
+    return ChecklistPrefetcher(app)
+
+
+def _plan(make_template):
+    plan = make_template("京都旅行").plan
+    db.session.add(Schedule(plan_id=plan.id, daily_plan_json=[{"day": 1, "details": [{"activity": "清水寺"}]}]))
+    db.session.commit()
+    return plan
+
+
+def test_prefetched_checklist_is_hidden_until_taken(app, user, make_template, monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        prefetch_module.ai_service, "generate_item_list_from_plan",
+        lambda plan, schedule_json: calls.append(plan.id) or AI_CHECKLIST,
+    )
+    prefetcher = _prefetcher(app)
+    plan = _plan(make_template)
+
+    checklist = prefetcher.submit(plan.id)
+    assert checklist.status == CHECKLIST_PREFETCHING
+    # 既に先読みがあれば積まない
+    assert prefetcher.submit(plan.id) is None
+
+    assert prefetcher.run(checklist.checklist_id)
+    assert calls == [plan.id]
+    assert db.session.get(Checklist, checklist.checklist_id).status == CHECKLIST_PREFETCHED
+    assert ChecklistItem.query.filter_by(checklist_id=checklist.checklist_id).count() == 2
+    assert PlanDBService.get_checklist_by_id(plan.id, user.user_id) is None
+
+    status, taken = prefetcher.take(plan.id)
+    assert status == TAKE_READY
+    assert taken.checklist_id == checklist.checklist_id
+    assert taken.status == "draft"
+    assert PlanDBService.get_checklist_by_id(plan.id, user.user_id).checklist_id == checklist.checklist_id
+    assert prefetcher.take(plan.id) == (TAKE_NONE, None)
+
+
+def test_cancel_during_generation_discards_result(app, user, make_template, monkeypatch):
+    prefetcher = _prefetcher(app)
+    plan = _plan(make_template)
+    checklist = prefetcher.submit(plan.id)
+    checklist_id = checklist.checklist_id
+
+    def generate(plan, schedule_json):
+        # 生成中に日程が編集された
+        assert prefetcher.cancel(plan.id) == 1
+        return AI_CHECKLIST
+
+    monkeypatch.setattr(prefetch_module.ai_service, "generate_item_list_from_plan", generate)
+
+    assert not prefetcher.run(checklist_id)
+    assert Checklist.query.filter_by(plan_id=plan.id).count() == 0
+    assert ChecklistItem.query.count() == 0
+
+
+def test_take_does_not_wait_for_unfinished_prefetch(app, user, make_template):
+    prefetcher = _prefetcher(app)
+    plan = _plan(make_template)
+    prefetcher.submit(plan.id)
+
+    # 先読み中なら待たずに返し、呼び出し元がやり直す
+    assert prefetcher.take(plan.id) == (TAKE_PENDING, None)
+    assert Checklist.query.filter_by(plan_id=plan.id).count() == 1
+
+    # 待たない場合は先読みを取り消し、呼び出し元がその場で生成する
+    assert prefetcher.take(plan.id, wait=False) == (TAKE_NONE, None)
+    assert Checklist.query.filter_by(plan_id=plan.id).count() == 0
+
+
+def test_disabled_prefetch_does_nothing(app, user, make_template):
+    prefetcher = ChecklistPrefetcher(app)
+    plan = _plan(make_template)
+
+    assert prefetcher.submit(plan.id) is None
+    assert Checklist.query.count() == 0
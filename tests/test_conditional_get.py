@@ -0,0 +1,95 @@
+from datetime import datetime
+
+from app.extensions import db
+from app.models.checklist import Checklist, ChecklistItem
+from app.models.plan import Share
+from app.routes.plan_routes import build_etag, latest_timestamp, not_modified_response, set_validators
+from app.services.db_service import PlanDBService
+from flask import make_response
+
+
+def test_not_modified_matches_etag_and_last_modified(app):
+    etag = build_etag("share", "tok", 1, datetime(2025, 1, 1))
+    last_modified = latest_timestamp(datetime(2025, 1, 1, 9, 0, 0, 123), None, datetime(2025, 1, 2))
+
+    with app.test_request_context(headers={"If-None-Match": f'W/"{etag}"'}):
+        response = not_modified_response(etag, last_modified)
+        assert response.status_code == 304
+        assert response.get_etag() == (etag, True)
+        assert "no-cache" in response.headers["Cache-Control"]
+
+    with app.test_request_context(headers={"If-None-Match": '"other"', "If-Modified-Since": "Fri, 03 Jan 2025 00:00:00 GMT"}):
+        # If-None-Match がある場合は If-Modified-Since を見ない
+        assert not_modified_response(etag, last_modified) is None
+
+    with app.test_request_context(headers={"If-Modified-Since": "Thu, 02 Jan 2025 00:00:00 GMT"}):
+        assert not_modified_response(etag, last_modified).status_code == 304
+
+    with app.test_request_context():
+        assert not_modified_response(etag, last_modified) is None
+        response = set_validators(make_response("body"), etag, last_modified)
+        assert response.headers["Last-Modified"] == "Thu, 02 Jan 2025 00:00:00 GMT"
+        assert "Cookie" in response.headers["Vary"]
+
+
+def test_template_version_changes_with_template(make_template, count_queries):
+    template = make_template(public_title="A", visibility="public")
+    db.session.add(Share(template_id=template.template_id, url_token="tok"))
+    db.session.commit()
+
+    with count_queries() as statements:
+        version = PlanDBService.get_template_version(token="tok")
+    assert len(statements) == 1
+    assert version["template_id"] == template.template_id
+    assert version == PlanDBService.get_template_version(template_id=template.template_id)
+
+    template.display_version = 2
+    db.session.commit()
+    assert PlanDBService.get_template_version(token="tok")["display_version"] == 2
+    assert PlanDBService.get_template_version(token="missing") is None
+    assert PlanDBService.get_checklist_version(template.plan_id) == (None, None)
+
+
+def test_checklist_version_changes_within_the_same_second(make_template):
+    template = make_template(public_title="A", visibility="public")
+    item = ChecklistItem(quantity=1)
+    db.session.add(Checklist(plan_id=template.plan_id, title="持ち物リスト", items=[item]))
+    db.session.commit()
+    before = PlanDBService.get_checklist_version(template.plan_id)
+
+    # updated_at が同じ秒のままでも、チェックや個数を変えれば ETag が変わる
+    stamp = before[1]
+    item.is_checked = True
+    item.updated_at = stamp
+    db.session.commit()
+    checked = PlanDBService.get_checklist_version(template.plan_id)
+    assert checked[1] == stamp and checked[0] != before[0]
+
+    item.is_checked = False
+    item.quantity = 2
+    item.updated_at = stamp
+    db.session.commit()
+    assert PlanDBService.get_checklist_version(template.plan_id)[0] not in (before[0], checked[0])
+
+
+def test_plan_detail_returns_304_for_matching_etag(client, login, make_template, user, monkeypatch):
+    from app.routes import plan_routes
+
+    template = make_template(public_title="A", visibility="public")
+    login(user)
+    first = client.get(f"/plans/{template.template_id}")
+    assert first.status_code == 200
+    etag = first.get_etag()[0]
+
+    # 一致すれば Template を読み込まず（描画せず）に 304 を返す
+    loads = []
+    monkeypatch.setattr(plan_routes.PlanDetailViewModel, "load_template", staticmethod(lambda template_id: loads.append(template_id)))
+    response = client.get(f"/plans/{template.template_id}", headers={"If-None-Match": f'W/"{etag}"'})
+    assert response.status_code == 304
+    assert response.get_etag() == (etag, True)
+    assert loads == []
+
+    template.public_title = "B"
+    db.session.commit()
+    monkeypatch.undo()
+    assert client.get(f"/plans/{template.template_id}", headers={"If-None-Match": f'W/"{etag}"'}).status_code == 200
@@ -0,0 +1,61 @@
+import pytest
+from google.api_core import exceptions as google_exceptions
+
+from app.services import gemini_client as gemini_module
+from app.services.gemini_client import GeminiClientManager
+
+
+class FakeModel:
+    def __init__(self, model_name, system_instruction):
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+        self.calls = []
+
+    def generate_content(self, prompt, generation_config=None, stream=False, request_options=None):
+        self.calls.append(request_options)
+        if prompt == "hang":
+            raise google_exceptions.DeadlineExceeded("deadline")
+        return f"{self.system_instruction}:{prompt}"
+
+
+@pytest.fixture
+def fake_genai(monkeypatch):
+    configured = []
+    monkeypatch.setattr(gemini_module.genai, "configure", lambda api_key: configured.append(api_key))
+    monkeypatch.setattr(gemini_module.genai, "GenerativeModel", FakeModel)
+    return configured
+
+
+def _manager(app):
+    app.config.update(GEMINI_API_KEY="key", GEMINI_MODEL="test-model", GEMINI_TIMEOUT=12)
+    return GeminiClientManager(app)
+
+
+def test_models_are_built_once_per_prompt_and_process(app, fake_genai, monkeypatch):
+    manager = _manager(app)
+
+    assert manager.generate("plan", "a") == "plan:a"
+    assert manager.generate("plan", "b") == "plan:b"
+    assert manager.generate("checklist", "c") == "checklist:c"
+    assert fake_genai == ["key"]
+    assert manager.get_model("plan").calls == [{"timeout": 12}, {"timeout": 12}]
+    assert manager.stats()["models_built"] == 2
+
+    # fork 後（pid が変わった）は設定とモデルを作り直す
+    monkeypatch.setattr(gemini_module.os, "getpid", lambda: -1)
+    manager.generate("plan", "d")
+    assert fake_genai == ["key", "key"]
+    stats = manager.stats()
+    assert (stats["configures"], stats["models_built"], stats["calls"]) == (2, 3, 4)
+
+
+def test_timeouts_are_counted_and_missing_key_is_reported(app, fake_genai):
+    manager = _manager(app)
+    with pytest.raises(google_exceptions.DeadlineExceeded):
+        manager.generate("plan", "hang")
+    assert manager.stats()["timeouts"] == 1
+
+    app.config["GEMINI_API_KEY"] = ""
+    assert manager.warm_up(["plan"]) == 0.0
+    with pytest.raises(ValueError, match="GEMINI_API_KEY"):
+        GeminiClientManager(app).get_model("plan")
@@ -0,0 +1,53 @@
+import json
+
+from app.services.json_stream import IncrementalJSONParser
+
+PATTERNS = {
+    ("plan_title",): "title",
+    ("transport_options", "*"): "transport",
+    ("itinerary", "*"): "day",
+}
+
+DOC = {
+    "plan_title": "京都 \"満喫\" 旅 {day}",
+    "transport_options": {
+        "価格重視": {"method": "夜行バス", "estimated_cost": 8000, "estimated_time": None},
+        "速度重視": {"method": "新幹線, 電車", "estimated_cost": 25000, "estimated_time": 180},
+    },
+    "itinerary": [
+        {"day": 1, "details": [{"time": "09:00", "activity": "清水寺 [拝観]"}]},
+        {"day": 2, "details": []},
+    ],
+}
+
+
+def _feed_all(text, size):
+    parser = IncrementalJSONParser(PATTERNS)
+    events = []
+    for i in range(0, len(text), size):
+        events.extend(parser.feed(text[i:i + size]))
+    return events
+
+
+def test_emits_each_value_once_complete_regardless_of_chunking():
+    text = json.dumps(DOC, ensure_ascii=False, indent=2)
+    expected = [
+        ("title", "plan_title", DOC["plan_title"]),
+        ("transport", "価格重視", DOC["transport_options"]["価格重視"]),
+        ("transport", "速度重視", DOC["transport_options"]["速度重視"]),
+        ("day", 0, DOC["itinerary"][0]),
+        ("day", 1, DOC["itinerary"][1]),
+    ]
+    for size in (1, 3, 16, len(text)):
+        assert _feed_all(text, size) == expected
+
+
+def test_day_is_emitted_before_the_document_ends():
+    text = json.dumps(DOC, ensure_ascii=False)
+    cut = text.index('{"day": 2')
+    parser = IncrementalJSONParser(PATTERNS)
+
+    events = parser.feed(text[:cut])
+
+    assert [name for name, _, _ in events] == ["title", "transport", "transport", "day"]
+    assert parser.feed(text[cut:])[-1] == ("day", 1, DOC["itinerary"][1])
@@ -0,0 +1,158 @@
+import pytest
+
+from app.services.cache_service import PageCache
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def cache(app, request, tmp_path):
+    app.config.update(
+        PAGE_CACHE_BACKEND=request.param,
+        PAGE_CACHE_TTL=60,
+        PAGE_CACHE_MAXSIZE=2,
+        PAGE_CACHE_PATH=str(tmp_path / "page_cache.sqlite3"),
+        PAGE_CACHE_TOUCH_INTERVAL=0,
+    )
+    return PageCache(app)
+
+
+def test_get_or_render_caches_and_counts(cache):
+    calls = []
+
+    def render():
+        calls.append(1)
+        return "<p>一覧</p>"
+
+    assert cache.get_or_render("public_plans", "cursor=", render) == "<p>一覧</p>"
+    assert cache.get_or_render("public_plans", "cursor=", render) == "<p>一覧</p>"
+    assert len(calls) == 1
+    assert cache.stats()["public_plans"] == {"hits": 1, "misses": 1, "hit_ratio": 0.5}
+
+
+def test_invalidate_only_clears_namespace(cache):
+    cache.get_or_render("public_plans", "a", lambda: "old")
+    cache.get_or_render("other", "a", lambda: "kept")
+
+    cache.invalidate("public_plans")
+
+    assert cache.get_or_render("public_plans", "a", lambda: "new") == "new"
+    assert cache.get_or_render("other", "a", lambda: "unused") == "kept"
+
+
+def test_discard_clears_one_key_and_none_is_not_stored(cache):
+    cache.get_or_render("share_views", "a", lambda: "old")
+    cache.get_or_render("share_views", "b", lambda: "kept")
+
+    cache.discard("share_views", "a")
+
+    assert cache.get_or_render("share_views", "a", lambda: "new") == "new"
+    assert cache.get_or_render("share_views", "b", lambda: "unused") == "kept"
+    assert cache.get_or_render("share_views", "missing", lambda: None) is None
+    assert cache.get_or_render("share_views", "missing", lambda: "rendered") == "rendered"
+
+
+def test_store_is_size_bounded(cache):
+    for key in ("a", "b", "c"):
+        cache.get_or_render("public_plans", key, lambda key=key: key)
+
+    assert cache.get_or_render("public_plans", "a", lambda: "re-rendered") == "re-rendered"
+
+
+def test_sqlite_store_is_shared_between_instances(app, tmp_path):
+    app.config.update(PAGE_CACHE_BACKEND="sqlite", PAGE_CACHE_PATH=str(tmp_path / "shared.sqlite3"))
+    worker_a, worker_b = PageCache(app), PageCache(app)
+
+    worker_a.get_or_render("public_plans", "k", lambda: "from a")
+    assert worker_b.get_or_render("public_plans", "k", lambda: "from b") == "from a"
+
+    worker_b.invalidate("public_plans")
+    assert worker_a.get_or_render("public_plans", "k", lambda: "fresh") == "fresh"
+
+
+def test_store_evicts_least_recently_used(cache):
+    cache.get_or_render("public_plans", "a", lambda: "a")
+    cache.get_or_render("public_plans", "b", lambda: "b")
+    # a を読むと、次に追い出されるのは b
+    assert cache.get_or_render("public_plans", "a", lambda: "re-rendered") == "a"
+    cache.get_or_render("public_plans", "c", lambda: "c")
+
+    assert cache.get_or_render("public_plans", "a", lambda: "re-rendered") == "a"
+    assert cache.get_or_render("public_plans", "b", lambda: "re-rendered") == "re-rendered"
+
+
+def test_sqlite_is_default_and_memory_is_disabled_with_several_workers(app, tmp_path):
+    app.config.update(PAGE_CACHE_PATH=str(tmp_path / "default.sqlite3"))
+    assert PageCache(app).use_workers(3) is False
+
+    app.config.update(PAGE_CACHE_BACKEND="memory")
+    cache = PageCache(app)
+    assert cache.use_workers(3) is True
+    assert cache.get_or_render("public_plans", "k", lambda: "rendered") == "rendered"
+    assert cache.stats() == {}
+
+
+def test_sqlite_hits_do_not_write(app, tmp_path):
+    app.config.update(
+        PAGE_CACHE_BACKEND="sqlite",
+        PAGE_CACHE_PATH=str(tmp_path / "hits.sqlite3"),
+        PAGE_CACHE_TTL=60,
+        PAGE_CACHE_STATS_FLUSH_INTERVAL=3600,
+    )
+    cache = PageCache(app)
+    cache.get_or_render("public_plans", "k", lambda: "v")
+
+    statements = []
+    conn = cache.store._connect()
+    conn.set_trace_callback(statements.append)
+    for _ in range(3):
+        assert cache.get_or_render("public_plans", "k", lambda: "re-rendered") == "v"
+    conn.set_trace_callback(None)
+
+    # 読み出しだけで、last_used も回数も書き込まない
+    assert all(statement.lstrip().upper().startswith("SELECT") for statement in statements)
+    assert cache.stats()["public_plans"] == {"hits": 3, "misses": 1, "hit_ratio": 0.75}
+
+    # 回数はまとめて書き込まれ、別のワーカーからも見える
+    cache.store.flush_stats()
+    assert PageCache(app).stats()["public_plans"]["hits"] == 3
+
+
+def test_public_plan_list_is_cached_until_a_template_changes(client, login, make_template, user, monkeypatch):
+    from app.extensions import db
+    from app.models.plan import Plan
+    from app.routes import plan_routes
+    from app.services.cache_service import PUBLIC_PLANS_NAMESPACE, page_cache
+    from app.services.db_service import PlanDBService
+
+    make_template(public_title="京都旅", visibility="public")
+    login(user)
+    renders = []
+    render = plan_routes.render_template
+
+    def counting(name, **context):
+        if name == "plan/_public_results.html":
+            renders.append(name)
+        return render(name, **context)
+
+    monkeypatch.setattr(plan_routes, "render_template", counting)
+
+    def get_list():
+        response = client.get("/plans/public")
+        assert response.status_code == 200
+        return response.get_data(as_text=True)
+
+    assert "京都旅" in get_list()
+    assert "京都旅" in get_list()
+    assert len(renders) == 1
+    assert page_cache.stats()[PUBLIC_PLANS_NAMESPACE]["hits"] == 1
+
+    # テンプレートの保存で無効化される
+    plan = db.session.get(Plan, make_template(public_title="非公開").plan_id)
+    template = PlanDBService.save_template(plan, None, "大阪旅", visibility="public")
+    assert template
+    assert "大阪旅" in get_list()
+    assert len(renders) == 2
+
+    # 削除でも無効化される
+    assert client.post(f"/plans/{template.template_id}/delete").status_code == 302
+    assert "大阪旅" not in get_list()
+    assert len(renders) == 3
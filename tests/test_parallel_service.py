@@ -0,0 +1,43 @@
+import time
+from functools import partial
+
+from flask import current_app
+
+from app.services.parallel_service import run_concurrently
+
+
+def _sleep_and_return(seconds, value):
+    time.sleep(seconds)
+    return value
+
+
+def test_calls_run_together_in_app_context(app):
+    app.config["MARKER"] = "ok"
+    started = time.monotonic()
+    results = run_concurrently({
+        "a": partial(_sleep_and_return, 0.3, "A"),
+        "b": partial(_sleep_and_return, 0.3, "B"),
+        "config": lambda: current_app.config["MARKER"],
+    })
+
+    assert time.monotonic() - started < 0.55
+    assert {name: result.value for name, result in results.items()} == {"a": "A", "b": "B", "config": "ok"}
+    assert all(result.ok for result in results.values())
+
+
+def test_timeout_and_error_do_not_hide_other_results(app):
+    def fail():
+        raise ValueError("boom")
+
+    results = run_concurrently(
+        {
+            "slow": partial(_sleep_and_return, 1.0, "late"),
+            "fast": partial(_sleep_and_return, 0.0, "ok"),
+            "broken": fail,
+        },
+        timeouts={"slow": 0.1},
+    )
+
+    assert isinstance(results["slow"].error, TimeoutError)
+    assert results["fast"].value == "ok"
+    assert isinstance(results["broken"].error, ValueError)
@@ -0,0 +1,72 @@
+from app.extensions import db
+from app.models.checklist import Category, Checklist, ChecklistItem, Item
+from app.models.plan import HotelSnapshot, Share, TransportSnapshot
+from app.services.plan_view_service import PlanDetailViewModel
+
+
+def _make_detail(make_template, items=6):
+    template = make_template(
+        public_title="京都旅",
+        visibility="public",
+        itinerary_outline_json={"days": [{"traffic_method": "徒歩", "places": ["清水寺", "祇園"]}]},
+    )
+    plan_id = template.plan_id
+    db.session.add_all([
+        TransportSnapshot(plan_id=plan_id, type="おすすめ", transport_method="新幹線", is_selected=True),
+        TransportSnapshot(plan_id=plan_id, type="価格重視", transport_method="夜行バス"),
+        HotelSnapshot(plan_id=plan_id, name="ホテルA", price=9000, is_selected=True),
+        HotelSnapshot(plan_id=plan_id, name="ホテルB", price=7000),
+    ])
+    category = Category(name="衣類")
+    checklist = Checklist(plan_id=plan_id, title="持ち物リスト")
+    db.session.add_all([category, checklist])
+    db.session.flush()
+    for i in range(items):
+        item = Item(name=f"持ち物{i}", category_id=category.category_id, unit="個")
+        db.session.add(item)
+        db.session.flush()
+        db.session.add(ChecklistItem(
+            checklist_id=checklist.checklist_id,
+            item_id=item.item_id,
+            category_id=category.category_id,
+            is_required=i % 2 == 0,
+        ))
+    db.session.add(Share(template_id=template.template_id, url_token="tok"))
+    db.session.commit()
+    return template
+
+
+def test_detail_view_loads_everything_in_three_queries(make_template, user, count_queries):
+    template_id = _make_detail(make_template).template_id
+    user_id = user.user_id
+    db.session.expire_all()
+
+    with count_queries() as statements:
+        template = PlanDetailViewModel.load_template(template_id)
+        view = PlanDetailViewModel.build(template, viewer_id=user_id)
+    # Template+Plan+選択中の交通手段/ホテル、チェックリスト、チェックリスト項目+Item
+    assert len(statements) == 3
+
+    assert view["is_owned"]
+    assert view["traffic_methods"] == ["新幹線"]
+    assert view["accommodation_label"] == "ホテルA"
+    assert view["meta"]["price"] == "9000円 / 泊"
+    assert view["stay_locations"] == ["清水寺", "祇園"]
+    assert len(view["checklist_display"]["essential"]) == 3
+    assert view["meta"]["items_total"] == 6
+    assert view["summary_from_checklist"]
+
+
+def test_share_view_uses_same_builder(make_template, count_queries):
+    _make_detail(make_template, items=20)
+    db.session.expire_all()
+
+    with count_queries() as statements:
+        share = PlanDetailViewModel.load_share("tok")
+        view = PlanDetailViewModel.build(share.template, shared=True)
+    assert len(statements) == 3
+
+    assert not view["is_owned"]
+    assert view["checklist_display"]["extra"][0]["id"] == "guest_extra_0"
+    assert view["meta"]["items_total"] == 20
+    assert PlanDetailViewModel.load_share("missing") is None
@@ -0,0 +1,184 @@
+import json
+from datetime import datetime, timedelta
+
+from app.extensions import db
+from app.services import ai_service
+from app.services.ai_provider import AIProvider
+from app.models.plan import HotelSnapshot, Plan, PlanGenerationJob, Schedule, TransportSnapshot
+from app.services import plan_job_service
+from app.services.plan_job_service import JOB_FAILED, JOB_QUEUED, JOB_RUNNING, JOB_SUCCEEDED, PlanGenerationQueue
+
+PARAMS = {
+    "destination": "京都",
+    "departure": "東京",
+    "start_date": "2025-04-01",
+    "days": 2,
+    "purpose_raw": "観光",
+    "options": ["グルメ"],
+}
+
+AI_RESPONSE = {
+    "plan_title": "京都グルメ旅",
+    "transport_options": {"おすすめ": {"method": "新幹線", "estimated_cost": 14000, "estimated_time": 140}},
+    "itinerary": [{"day": 1, "details": [{"time": "09:00", "activity": "清水寺"}]}],
+}
+
+
+def _queue(app):
+    app.config.update(PLAN_JOB_WORKERS=0, PLAN_JOB_STALE_SECONDS=600, PLAN_JOB_STREAMING=False)
+    return PlanGenerationQueue(app)
+
+
+def test_submit_only_enqueues_and_run_saves_plan(app, user, monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        plan_job_service.ai_service, "generate_plan_from_inputs",
+        lambda destination, **kwargs: calls.append((destination, kwargs)) or AI_RESPONSE,
+    )
+    monkeypatch.setattr(
+        plan_job_service.hotel_service, "search_rakuten_hotels",
+        lambda destination: [{"id": 1, "name": "ホテルA", "price": 9000}],
+    )
+    queue = _queue(app)
+
+    job = queue.submit(user.user_id, PARAMS)
+    assert job.status == JOB_QUEUED
+    assert calls == []
+
+    assert queue.run(job.job_id)
+    # 2 回目は queued ではないので実行しない
+    assert not queue.run(job.job_id)
+
+    job = queue.get(job.job_id, user.user_id)
+    assert job.status == JOB_SUCCEEDED
+    assert calls == [("京都", {"start_point": "東京", "days": 2, "purpose_raw": "観光", "travel_style": "グルメ", "use_cache": True})]
+    plan = db.session.get(Plan, job.plan_id)
+    assert plan.title == "京都グルメ旅"
+    assert TransportSnapshot.query.filter_by(plan_id=plan.id).count() == 1
+    assert Schedule.query.filter_by(plan_id=plan.id).count() == 1
+    assert HotelSnapshot.query.filter_by(plan_id=plan.id).count() == 1
+
+
+def test_failed_generation_is_recorded(app, user, monkeypatch):
+    def fail(*args, **kwargs):
+        raise ValueError("GEMINI_API_KEYが設定されていません。")
+
+    monkeypatch.setattr(plan_job_service.ai_service, "generate_plan_from_inputs", fail)
+    queue = _queue(app)
+
+    job = queue.submit(user.user_id, PARAMS)
+    assert queue.run(job.job_id)
+
+    job = queue.get(job.job_id, user.user_id)
+    assert job.status == JOB_FAILED
+    assert "GEMINI_API_KEY" in job.error
+    assert Plan.query.count() == 0
+
+
+def test_hotel_search_failure_keeps_plan(app, user, monkeypatch):
+    def fail(destination):
+        raise TimeoutError("楽天API")
+
+    monkeypatch.setattr(plan_job_service.ai_service, "generate_plan_from_inputs", lambda *args, **kwargs: AI_RESPONSE)
+    monkeypatch.setattr(plan_job_service.hotel_service, "search_rakuten_hotels", fail)
+    queue = _queue(app)
+
+    job = queue.submit(user.user_id, PARAMS)
+    assert queue.run(job.job_id)
+
+    job = queue.get(job.job_id, user.user_id)
+    assert job.status == JOB_SUCCEEDED
+    assert HotelSnapshot.query.filter_by(plan_id=job.plan_id).count() == 0
+
+
+def test_get_is_scoped_to_owner_and_expires_stale_jobs(app, user):
+    queue = _queue(app)
+    job = queue.submit(user.user_id, PARAMS)
+
+    assert queue.get(job.job_id, user.user_id + 1) is None
+
+    job.created_at = datetime.utcnow() - timedelta(seconds=601)
+    db.session.commit()
+    assert queue.get(job.job_id, user.user_id).status == JOB_FAILED
+    assert db.session.get(PlanGenerationJob, job.job_id).finished_at is not None
+
+
+def test_running_jobs_expire_after_the_call_timeouts(app, user):
+    app.config.update(PLAN_AI_TIMEOUT=90, PLAN_HOTEL_TIMEOUT=15)
+    queue = _queue(app)
+    job = queue.submit(user.user_id, PARAMS)
+    # 積んでから時間がたっていても、実行を始めたばかりなら待つ
+    job.created_at = datetime.utcnow() - timedelta(seconds=3600)
+    job.status = JOB_RUNNING
+    job.started_at = datetime.utcnow() - timedelta(seconds=100)
+    db.session.commit()
+    assert queue.get(job.job_id, user.user_id).status == JOB_RUNNING
+
+    job.started_at = datetime.utcnow() - timedelta(seconds=106)
+    db.session.commit()
+    assert queue.get(job.job_id, user.user_id).status == JOB_FAILED
+
+
+def test_expired_job_is_not_flipped_to_succeeded(app, user, monkeypatch):
+    queue = _queue(app)
+    job = queue.submit(user.user_id, PARAMS)
+
+    def slow_generation(*args, **kwargs):
+        # 生成中に get() がタイムアウトで失敗にした
+        job = db.session.get(PlanGenerationJob, job_id)
+        job.started_at = datetime.utcnow() - timedelta(seconds=queue.run_timeout + 1)
+        db.session.commit()
+        assert queue.get(job_id, user.user_id).status == JOB_FAILED
+        return AI_RESPONSE
+
+    job_id = job.job_id
+    monkeypatch.setattr(plan_job_service.ai_service, "generate_plan_from_inputs", slow_generation)
+    monkeypatch.setattr(plan_job_service.hotel_service, "search_rakuten_hotels", lambda destination: [])
+    assert queue.run(job_id)
+
+    db.session.expire_all()
+    job = db.session.get(PlanGenerationJob, job_id)
+    assert (job.status, job.plan_id) == (JOB_FAILED, None)
+
+
+def test_orphaned_queued_job_is_dispatched_again(app, user, monkeypatch):
+    queue = _queue(app)
+    job = queue.submit(user.user_id, PARAMS)
+    dispatched = []
+    monkeypatch.setattr(queue, "_dispatch", dispatched.append)
+
+    queue.get(job.job_id, user.user_id)
+    assert dispatched == []
+
+    job.created_at = datetime.utcnow() - timedelta(seconds=31)
+    db.session.commit()
+    assert queue.get(job.job_id, user.user_id).status == JOB_QUEUED
+    assert dispatched == [job.job_id]
+
+
+class _ChunkedProvider(AIProvider):
+    def __init__(self, text):
+        self.text = text
+
+    def stream_text(self, task, system_prompt, user_prompt, inputs, span=None):
+        for i in range(0, len(self.text), 7):
+            yield self.text[i:i + 7]
+
+
+def test_streaming_generation_records_progress(app, user, monkeypatch):
+    text = json.dumps(AI_RESPONSE, ensure_ascii=False)
+    monkeypatch.setattr(ai_service.ai_cache, "enabled", False)
+    monkeypatch.setattr(ai_service.ai_provider, "current", _ChunkedProvider(text))
+    monkeypatch.setattr(plan_job_service.hotel_service, "search_rakuten_hotels", lambda destination: [])
+    queue = _queue(app)
+    queue.streaming = True
+
+    job = queue.submit(user.user_id, PARAMS)
+    assert queue.run(job.job_id)
+
+    db.session.expire_all()
+    job = queue.get(job.job_id, user.user_id)
+    assert job.status == JOB_SUCCEEDED
+    assert [(p["event"], p["key"]) for p in job.progress] == [("title", "plan_title"), ("transport", "おすすめ"), ("day", 1)]
+    assert job.progress[2]["data"] == AI_RESPONSE["itinerary"][0]
+    assert db.session.get(Plan, job.plan_id).title == "京都グルメ旅"
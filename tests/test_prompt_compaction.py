@@ -0,0 +1,59 @@
+import json
+from pathlib import Path
+from types import SimpleNamespace
+
+from app.services import ai_service
+from app.services.prompt_compaction import compact_schedule, render_compact_schedule
+
+FIXTURES = json.loads((Path(__file__).parent / "fixtures" / "checklist_schedules.json").read_text(encoding="utf-8"))
+
+
+def test_compact_prompt_is_smaller_for_recorded_schedules(app):
+    for fixture in FIXTURES:
+        plan = SimpleNamespace(**fixture["plan"])
+        raw = ai_service.build_checklist_prompt(plan, fixture["schedule"], compact=False)
+        compact = ai_service.build_checklist_prompt(plan, fixture["schedule"], compact=True)
+
+        assert len(compact) < len(raw)
+        assert "transport_notes" not in compact
+
+
+def test_compact_schedule_keeps_packing_signals():
+    okinawa = next(f for f in FIXTURES if f["name"] == "okinawa_4days")
+
+    compacted = compact_schedule(okinawa["schedule"], days=4)
+
+    assert compacted["nights"] == 3
+    assert [day["day"] for day in compacted["days"]] == [1, 2, 3, 4]
+    assert "水辺" in compacted["days"][1]["scenes"]
+    assert compacted["days"][1]["setting"] == "屋外中心"
+    assert "車" in compacted["days"][1]["moves"]
+    assert all(":" not in keyword for day in compacted["days"] for keyword in day["keywords"])
+
+
+def test_seed_schedule_shape_is_supported():
+    schedule = {
+        "days": 2,
+        "details": [
+            {"day": 1, "title": "移動 & チェックイン", "place_name": "新大阪〜梅田周辺", "move_mode": "train"},
+            {"day": 1, "title": "道頓堀観光", "place_name": "道頓堀", "move_mode": "walk"},
+        ],
+    }
+
+    text = render_compact_schedule(compact_schedule(schedule))
+
+    assert text.splitlines() == ["1泊", "1日目: 新大阪, 梅田周辺, 道頓堀観光 | 不明 | 移動:電車/徒歩"]
+
+
+def test_checklist_cache_key_ignores_time_only_edits(app, monkeypatch):
+    calls = []
+    monkeypatch.setattr(ai_service.ai_cache, "enabled", True)
+    monkeypatch.setattr(ai_service.ai_cache, "get", lambda kind, key: calls.append(key))
+    monkeypatch.setattr(ai_service.ai_cache, "set", lambda kind, key, value: None)
+    monkeypatch.setattr(ai_service, "_generate_item_list_from_plan", lambda *args, **kwargs: {"checklist": []})
+    plan = SimpleNamespace(destination="京都", departure="東京", days=2, purpose="観光", options=["グルメ"])
+
+    ai_service.generate_item_list_from_plan(plan, [{"day": 1, "details": [{"time": "09:00", "activity": "清水寺"}]}])
+    ai_service.generate_item_list_from_plan(plan, [{"day": 1, "details": [{"time": "10:30", "activity": "清水寺"}]}])
+
+    assert calls[0] == calls[1]
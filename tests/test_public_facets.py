@@ -0,0 +1,85 @@
+from flask import request
+
+from app.extensions import db
+from app.models.plan import Tag
+from app.routes.plan_routes import parse_public_filters
+from app.services.db_service import PlanDBService, split_tags
+
+
+def _public(make_template, title, tags, days=2, destination="京都"):
+    template = make_template(public_title=title, visibility="public", tags=tags, days=days, destination=destination)
+    template.days = days
+    PlanDBService.sync_template_tags(template)
+    db.session.commit()
+    return template
+
+
+def test_split_tags_normalizes_and_dedupes():
+    assert split_tags("温泉, ＃グルメ、 温泉,,\n子連れ ") == ["温泉", "グルメ", "子連れ"]
+    assert split_tags(None) == []
+
+
+def test_sync_template_tags_replaces_links(make_template):
+    template = _public(make_template, "A", "温泉, グルメ")
+    assert sorted(link.tag.name for link in template.tag_links) == ["グルメ", "温泉"]
+
+    template.tags = "グルメ, 紅葉"
+    PlanDBService.sync_template_tags(template)
+    db.session.commit()
+    assert sorted(link.tag.name for link in template.tag_links) == ["グルメ", "紅葉"]
+
+
+def test_existing_tags_are_reused_and_unused_tags_pruned(make_template):
+    template = _public(make_template, "A", "温泉")
+    other = make_template(public_title="B", visibility="public", tags="温泉, 紅葉")
+    # 別のリクエストが先に同じタグを作っていても一意制約違反にならない
+    db.session.add(Tag(name="紅葉"))
+    db.session.flush()
+    PlanDBService.sync_template_tags(other)
+    db.session.commit()
+    assert Tag.query.count() == 2
+
+    template.tags = "グルメ"
+    other.tags = "グルメ"
+    assert PlanDBService.refresh_template_tags() == 2
+    assert [tag.name for tag in Tag.query.all()] == ["グルメ"]
+
+
+def test_tag_filter_is_normalized_like_stored_tags(app, make_template):
+    _public(make_template, "A", "温泉")
+
+    with app.test_request_context("/?tag=%EF%BC%83%E6%B8%A9%E6%B3%89%20"):
+        filters = parse_public_filters(request.args)
+    assert filters == {"tag": "温泉"}
+    templates, _, _ = PlanDBService.get_public_templates_page(filters={"tag": "#温泉"})
+    assert [t.public_title for t in templates] == ["A"]
+
+
+def test_facet_counts_exclude_own_filter(make_template):
+    _public(make_template, "A", "温泉, グルメ", days=2, destination="京都")
+    _public(make_template, "B", "温泉", days=3, destination="箱根")
+    _public(make_template, "C", "グルメ", days=2, destination="大阪")
+    make_template(public_title="非公開", visibility="private", tags="温泉", days=2)
+
+    facets = PlanDBService.get_public_facets()
+    assert facets["days"] == [(2, 2), (3, 1)]
+    assert facets["tags"] == [("グルメ", 2), ("温泉", 2)]
+    assert sorted(facets["destinations"]) == [("京都", 1), ("大阪", 1), ("箱根", 1)]
+
+    facets = PlanDBService.get_public_facets({"tag": "温泉"})
+    # タグ自身の件数は他のタグも選べるよう絞り込まない
+    assert facets["tags"] == [("グルメ", 2), ("温泉", 2)]
+    assert facets["days"] == [(2, 1), (3, 1)]
+    assert sorted(facets["destinations"]) == [("京都", 1), ("箱根", 1)]
+
+
+def test_public_page_applies_filters(make_template):
+    _public(make_template, "A", "温泉, グルメ", days=2, destination="京都")
+    _public(make_template, "B", "温泉", days=3, destination="箱根")
+    _public(make_template, "C", "グルメ", days=2, destination="大阪")
+
+    templates, _, _ = PlanDBService.get_public_templates_page(filters={"tag": "温泉", "days": 2})
+    assert [t.public_title for t in templates] == ["A"]
+
+    templates, _, _ = PlanDBService.get_public_templates_page(filters={"destination": "大阪"})
+    assert [t.public_title for t in templates] == ["C"]
@@ -0,0 +1,38 @@
+from datetime import datetime
+
+from app.services.db_service import PlanDBService, decode_cursor
+
+
+def _titles(templates):
+    return [t.public_title for t in templates]
+
+
+def test_public_pages_walk_forward_and_back(make_template):
+    same_time = datetime(2025, 6, 1)
+    for i in range(7):
+        # created_at が同じでも template_id で順序が決まること
+        make_template(public_title=f"公開{i}", visibility="public", created_at=same_time if i in (2, 3, 4) else None)
+    make_template(public_title="非公開", visibility="private")
+
+    first, prev_cursor, next_cursor = PlanDBService.get_public_templates_page(per_page=3)
+    assert prev_cursor is None and next_cursor
+
+    second, prev_cursor_2, next_cursor_2 = PlanDBService.get_public_templates_page(next_cursor, per_page=3)
+    third, _, last_next = PlanDBService.get_public_templates_page(next_cursor_2, per_page=3)
+    assert last_next is None
+    walked = _titles(first) + _titles(second) + _titles(third)
+    assert sorted(walked) == sorted(f"公開{i}" for i in range(7))
+    assert len(set(walked)) == 7
+
+    back, back_prev, back_next = PlanDBService.get_public_templates_page(prev_cursor_2, per_page=3)
+    assert _titles(back) == _titles(first)
+    assert back_prev is None and back_next
+
+
+def test_invalid_cursor_falls_back_to_first_page(make_template):
+    make_template(public_title="公開", visibility="public")
+
+    assert decode_cursor("not-a-cursor") is None
+    templates, prev_cursor, next_cursor = PlanDBService.get_public_templates_page("%%%", per_page=3)
+    assert _titles(templates) == ["公開"]
+    assert prev_cursor is None and next_cursor is None
@@ -0,0 +1,90 @@
+import json
+import os
+
+import pytest
+
+from app.extensions import db
+from app.models.plan import Share
+from app.routes.plan_routes import plan_bp
+from app.services import share_export
+from app.services.share_export import export_all_shares, export_share, refresh_template_exports
+
+
+@pytest.fixture
+def export_app(app, tmp_path, monkeypatch):
+    app.config.update(SHARE_EXPORT_DIR=str(tmp_path), SHARE_EXPORT_BASE_URL="https://motilist.example")
+    app.register_blueprint(plan_bp)
+    # レイアウト全体の描画はここでは確認しない（渡される値だけを見る）
+    monkeypatch.setattr(
+        share_export, "render_template",
+        lambda name, **context: f"<h1>{context['display_title']}</h1>{context['is_logged_in']}",
+    )
+    return app
+
+
+def _share(template, token):
+    db.session.add(Share(template_id=template.template_id, issuer_user_id=template.user_id, url_token=token))
+    db.session.commit()
+
+
+def test_export_writes_html_and_json_for_public_share(export_app, make_template, tmp_path):
+    template = make_template(public_title="京都旅", visibility="public")
+    _share(template, "tok-a")
+
+    assert export_share("tok-a")
+
+    html = (tmp_path / "tok-a" / "index.html").read_text(encoding="utf-8")
+    payload = json.loads((tmp_path / "tok-a" / "plan.json").read_text(encoding="utf-8"))
+    assert html == "<h1>京都旅</h1>False"
+    assert payload["title"] == "京都旅"
+    assert payload["display_version"] == template.display_version
+
+
+def test_export_removed_when_template_becomes_private(export_app, make_template, tmp_path):
+    template = make_template(public_title="京都旅", visibility="public")
+    _share(template, "tok-a")
+    refresh_template_exports([template])
+    assert (tmp_path / "tok-a" / "index.html").exists()
+
+    template.visibility = "private"
+    db.session.commit()
+    refresh_template_exports([template])
+    assert not (tmp_path / "tok-a").exists()
+
+
+def test_export_all_skips_private_and_removes_stale(export_app, make_template, tmp_path):
+    _share(make_template(public_title="公開", visibility="public"), "tok-public")
+    _share(make_template(public_title="非公開", visibility="private"), "tok-private")
+    os.makedirs(tmp_path / "tok-deleted")
+
+    assert export_all_shares() == 1
+    assert sorted(os.listdir(tmp_path)) == ["tok-public"]
+
+
+def test_invalid_token_is_not_used_as_path(export_app, tmp_path):
+    assert not export_share("../etc")
+    assert os.listdir(tmp_path) == []
+
+
+def test_export_outside_request_uses_configured_origin(export_app, make_template, tmp_path):
+    _share(make_template(public_title="京都旅", visibility="public"), "tok-a")
+
+    # 要約キューのワーカーと同じく、リクエストの外から書き出す
+    assert export_share("tok-a")
+
+    payload = json.loads((tmp_path / "tok-a" / "plan.json").read_text(encoding="utf-8"))
+    assert payload["token_url"] == "https://motilist.example/plans/share/tok-a"
+
+
+def test_export_outside_request_without_origin_removes_snapshot(export_app, make_template, tmp_path):
+    _share(make_template(public_title="京都旅", visibility="public"), "tok-a")
+    assert export_share("tok-a")
+
+    export_app.config["SHARE_EXPORT_BASE_URL"] = None
+    assert not export_share("tok-a")
+    assert not (tmp_path / "tok-a").exists()
+
+    with export_app.test_request_context("/", base_url="https://request.example/"):
+        assert export_share("tok-a")
+    payload = json.loads((tmp_path / "tok-a" / "plan.json").read_text(encoding="utf-8"))
+    assert payload["token_url"] == "https://request.example/plans/share/tok-a"
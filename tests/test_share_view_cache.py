@@ -0,0 +1,127 @@
+from app.extensions import db
+from app.models.plan import HotelSnapshot, Share, TransportSnapshot
+from app.routes import plan_routes
+from app.services.cache_service import SHARE_VIEWS_NAMESPACE, page_cache
+from app.services.db_service import PlanDBService
+
+
+def _share(make_template, token="tok"):
+    template = make_template(public_title="京都旅", visibility="public")
+    db.session.add(Share(template_id=template.template_id, issuer_user_id=template.user_id, url_token=token))
+    db.session.commit()
+    return template
+
+
+def test_share_page_carries_view_ping_and_ping_counts_view(client, make_template, monkeypatch):
+    template = _share(make_template)
+    views = []
+    monkeypatch.setattr(plan_routes.template_stats, "record_view", views.append)
+
+    response = client.get("/plans/share/tok")
+    assert response.status_code == 200
+    assert b'data-share-view-url="/plans/share/tok/view"' in response.data
+    # ページの表示では数えず、表示後の ping で数える（静的スナップショットから返した場合も同じ）
+    assert views == []
+
+    assert client.post("/plans/share/tok/view").status_code == 204
+    assert views == [template.template_id]
+    assert client.post("/plans/share/missing/view").status_code == 404
+
+
+def test_selection_bumps_display_version_only_when_summary_changes(make_template, user):
+    template = make_template(public_title="A", visibility="public")
+    db.session.add_all([
+        TransportSnapshot(plan_id=template.plan_id, type="おすすめ", transport_method="新幹線"),
+        HotelSnapshot(plan_id=template.plan_id, name="ホテルA", price=9000),
+    ])
+    db.session.commit()
+    assert template.display_version == 1
+
+    assert PlanDBService.select_transit(template.plan_id, "おすすめ", user_id=user.user_id)
+    assert template.display_version == 2
+
+    # 同じ選択をやり直しても表示は変わらないのでバージョンはそのまま
+    assert PlanDBService.select_transit(template.plan_id, "おすすめ", user_id=user.user_id)
+    assert template.display_version == 2
+
+    hotel = HotelSnapshot.query.filter_by(plan_id=template.plan_id).first()
+    assert PlanDBService.select_hotel(template.plan_id, hotel.id, user_id=user.user_id)
+    assert template.display_version == 3
+
+
+def test_checklist_summary_update_bumps_display_version(make_template, user):
+    template = make_template(public_title="A", visibility="public")
+
+    assert PlanDBService.update_template_checklist_summary(template.plan_id, user.user_id)
+    assert template.display_version == 2
+    assert PlanDBService.get_template_version(template_id=template.template_id)["display_version"] == 2
+
+
+def _count_renders(monkeypatch):
+    calls = []
+    build = plan_routes.build_share_page
+
+    def counting(token, is_logged_in=False):
+        calls.append(is_logged_in)
+        return build(token, is_logged_in=is_logged_in)
+
+    monkeypatch.setattr(plan_routes, "build_share_page", counting)
+    return calls
+
+
+def test_anonymous_share_view_is_served_from_cache_without_queries(client, make_template, monkeypatch, count_queries):
+    _share(make_template)
+    calls = _count_renders(monkeypatch)
+
+    first = client.get("/plans/share/tok")
+    with count_queries() as statements:
+        second = client.get("/plans/share/tok")
+
+    assert first.status_code == second.status_code == 200
+    assert second.data == first.data
+    assert second.get_etag() == first.get_etag()
+    # 2 回目はキャッシュから返し、描画もバージョンの問い合わせもしない
+    assert calls == [False]
+    assert statements == []
+    assert page_cache.stats()[SHARE_VIEWS_NAMESPACE]["hits"] == 1
+
+    # キャッシュから返す場合も、ETag が一致すれば 304
+    etag = first.get_etag()[0]
+    assert client.get("/plans/share/tok", headers={"If-None-Match": f'W/"{etag}"'}).status_code == 304
+    assert calls == [False]
+
+
+def test_logged_in_share_view_bypasses_cache(client, login, make_template, user, monkeypatch):
+    _share(make_template)
+    calls = _count_renders(monkeypatch)
+    login(user)
+
+    assert client.get("/plans/share/tok").status_code == 200
+    assert client.get("/plans/share/tok").status_code == 200
+    assert calls == [True, True]
+    assert SHARE_VIEWS_NAMESPACE not in page_cache.stats()
+
+
+def test_share_view_is_rerendered_after_selection_or_summary_change(client, make_template, user, monkeypatch):
+    template = _share(make_template)
+    db.session.add(TransportSnapshot(plan_id=template.plan_id, type="おすすめ", transport_method="新幹線"))
+    db.session.commit()
+    calls = _count_renders(monkeypatch)
+
+    first = client.get("/plans/share/tok")
+    assert PlanDBService.select_transit(template.plan_id, "おすすめ", user_id=user.user_id)
+    selected = client.get("/plans/share/tok")
+    assert len(calls) == 2
+    assert selected.get_etag() != first.get_etag()
+    assert "新幹線" in selected.get_data(as_text=True)
+
+    assert PlanDBService.update_template_checklist_summary(template.plan_id, user.user_id)
+    summarized = client.get("/plans/share/tok")
+    assert len(calls) == 3
+    assert summarized.get_etag() not in (first.get_etag(), selected.get_etag())
+
+
+def test_missing_share_redirects_and_is_not_cached(client):
+    assert client.get("/plans/share/missing").status_code == 302
+    assert client.get("/plans/share/missing").status_code == 302
+    assert page_cache.stats()[SHARE_VIEWS_NAMESPACE]["hits"] == 0
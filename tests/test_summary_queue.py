@@ -0,0 +1,58 @@
+from app.extensions import db
+from app.models.checklist import Category, Checklist, ChecklistItem, ChecklistSummaryJob, Item
+from app.services.summary_queue import SummaryRecomputeQueue
+
+
+def _queue(app):
+    app.config.update(SUMMARY_QUEUE_INTERVAL=0)
+    return SummaryRecomputeQueue(app)
+
+
+def _add_checklist(plan_id, names):
+    category = Category(name="衣類")
+    checklist = Checklist(plan_id=plan_id, title="持ち物リスト")
+    db.session.add_all([category, checklist])
+    db.session.flush()
+    for name in names:
+        item = Item(name=name, category_id=category.category_id)
+        db.session.add(item)
+        db.session.flush()
+        db.session.add(ChecklistItem(checklist_id=checklist.checklist_id, item_id=item.item_id, is_required=True))
+    db.session.commit()
+
+
+def test_enqueue_dedupes_and_drain_updates_template(app, make_template, user):
+    queue = _queue(app)
+    template = make_template(public_title="A")
+    _add_checklist(template.plan_id, ["傘", "タオル"])
+
+    assert queue.enqueue(template.plan_id, user.user_id)
+    assert queue.enqueue(template.plan_id, user.user_id)
+    assert queue.pending_count() == 1
+    # GET 側のセッションの状態は変えない
+    assert template.checklist_summary_json == {}
+
+    assert queue.drain() == 1
+    assert queue.pending_count() == 0
+    db.session.refresh(template)
+    assert template.checklist_summary_json["items_total"] == 2
+    assert template.items_count == 2
+    assert template.display_version == 2
+
+
+def test_failed_jobs_are_retried_then_dropped(app, make_template, user, monkeypatch):
+    queue = _queue(app)
+    template = make_template(public_title="A")
+
+    def boom(plan_id, user_id):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr("app.services.summary_queue.PlanDBService.update_template_checklist_summary", boom)
+    queue.enqueue(template.plan_id, user.user_id)
+
+    assert queue.drain() == 0
+    job = db.session.get(ChecklistSummaryJob, template.plan_id)
+    assert job.attempts == 1 and job.last_error == "boom"
+    queue.drain()
+    queue.drain()
+    assert queue.pending_count() == 0
@@ -0,0 +1,102 @@
+from app.extensions import db
+from app.models.plan import HotelSnapshot, Template, TransportSnapshot
+from app.routes.plan_routes import attach_card_fields
+from app.services.db_service import PlanDBService
+
+
+def _add_snapshots(template, index):
+    db.session.add(TransportSnapshot(plan_id=template.plan_id, type="おすすめ", transport_method=f"新幹線{index}"))
+    db.session.add(TransportSnapshot(plan_id=template.plan_id, type="価格重視", transport_method="夜行バス"))
+    db.session.add(HotelSnapshot(plan_id=template.plan_id, name=f"ホテル{index}", price=9000))
+    db.session.commit()
+
+
+def test_summary_refresh_query_count_does_not_grow(make_template, count_queries):
+    for i in range(8):
+        make_template(public_title=f"プラン{i}")
+
+    for limit in (2, 8):
+        db.session.expire_all()
+        templates = Template.query.order_by(Template.template_id).limit(limit).all()
+        with count_queries() as statements:
+            PlanDBService.get_template_cards(templates)
+        # Plan / 選択中の交通手段 / 選択中のホテル の 3 本で固定
+        assert len(statements) == 3
+
+
+def test_selection_updates_summary_and_list_needs_single_select(make_template, user, count_queries):
+    templates = [make_template(public_title=f"プラン{i}") for i in range(3)]
+    for i, tpl in enumerate(templates):
+        _add_snapshots(tpl, i)
+        assert PlanDBService.select_transit(tpl.plan_id, "おすすめ", user_id=user.user_id)
+        hotel = HotelSnapshot.query.filter_by(plan_id=tpl.plan_id).first()
+        assert PlanDBService.select_hotel(tpl.plan_id, hotel.id, user_id=user.user_id)
+
+    user_id = user.user_id
+    db.session.expire_all()
+    with count_queries() as statements:
+        page = PlanDBService.get_templates_page_by_user_id(user_id, page=1, per_page=8)
+        attach_card_fields(page)
+        start_dates = [tpl.plan.start_date for tpl in page]
+
+    assert len(statements) == 1
+    assert all(start_dates)
+    assert [tpl.transport_summary for tpl in page] == ["新幹線2", "新幹線1", "新幹線0"]
+    assert [tpl.hotel_name for tpl in page] == ["ホテル2", "ホテル1", "ホテル0"]
+    assert page[0].summary_hotel_price == 9000
+
+    attach_card_fields(page, transit_label="type")
+    assert page[0].transport_summary == "おすすめ"
+
+
+def test_summary_falls_back_to_outline(make_template):
+    template = make_template(
+        itinerary_outline_json={"days": [{"traffic_method": "徒歩", "places": ["難波", "道頓堀"]}]}
+    )
+    PlanDBService.refresh_template_summaries([template])
+
+    assert template.summary_transport == "徒歩"
+    assert template.summary_hotel_name is None
+    assert template.summary_stay_locations == ["難波", "道頓堀"]
+
+    attach_card_fields([template], hotel_fallback="未設定")
+    assert template.hotel_name == "未設定"
+
+
+def test_hotel_without_name_keeps_pending_label(make_template):
+    # 名前のないホテルが選ばれている・候補だけある場合は、公開一覧でも「選択中」と出す
+    unnamed = make_template()
+    unnamed.plan.hotel = {"candidates": [{"id": 1, "price": 8000}], "selected_id": 1}
+    candidates_only = make_template()
+    candidates_only.plan.hotel = {"candidates": [{"id": 1, "name": "ホテルA"}]}
+    PlanDBService.refresh_template_summaries([unnamed, candidates_only])
+
+    attach_card_fields([unnamed, candidates_only], hotel_fallback="未設定")
+    assert [unnamed.hotel_name, candidates_only.hotel_name] == ["選択中", "選択中"]
+    assert unnamed.summary_hotel_price == 8000
+
+
+def test_stay_backfill_on_get_leaves_summary_and_exports_alone(client, login, make_template, user, monkeypatch):
+    from app.routes import plan_routes
+
+    template = make_template(public_title="京都", visibility="public")
+    db.session.add(HotelSnapshot(plan_id=template.plan_id, name="ホテルA", price=9000, is_selected=True))
+    db.session.commit()
+    PlanDBService.refresh_template_summaries([template])
+    db.session.commit()
+    summary = (template.summary_hotel_name, template.summary_hotel_price, template.display_version)
+    exported = []
+    monkeypatch.setattr(plan_routes, "refresh_template_exports", exported.append)
+    login(user)
+    with client.session_transaction() as session:
+        session["plan_id"] = template.plan_id
+
+    response = client.get("/plans/stay/?reselect=1")
+
+    assert response.status_code == 200
+    db.session.expire_all()
+    template = db.session.get(Template, template.template_id)
+    # 候補は Plan.hotel に移るが、一覧カード・共有ページの表示は HotelSnapshot のときと同じ
+    assert template.plan.hotel["candidates"][0]["name"] == "ホテルA"
+    assert (template.summary_hotel_name, template.summary_hotel_price, template.display_version) == summary
+    assert exported == []
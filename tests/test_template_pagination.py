@@ -0,0 +1,28 @@
+from app.routes.plan_routes import resolve_page
+from app.services.db_service import PlanDBService
+
+
+def test_templates_page_is_filtered_ordered_and_sliced_in_sql(make_template, user):
+    for i in range(10):
+        make_template(public_title=f"Kyoto trip {i}")
+    make_template(public_title="Osaka trip")
+
+    assert PlanDBService.count_templates_by_user_id(user.user_id) == 11
+    assert PlanDBService.count_templates_by_user_id(user.user_id, "KYOTO") == 10
+
+    page_2 = PlanDBService.get_templates_page_by_user_id(user.user_id, "kyoto", page=2, per_page=4)
+    assert [t.public_title for t in page_2] == ["Kyoto trip 5", "Kyoto trip 4", "Kyoto trip 3", "Kyoto trip 2"]
+
+
+def test_templates_page_escapes_like_wildcards(make_template, user):
+    make_template(public_title="100% 満喫")
+    make_template(public_title="1000 満喫")
+
+    assert PlanDBService.count_templates_by_user_id(user.user_id, "100%") == 1
+    assert PlanDBService.count_templates_by_user_id(user.user_id, "_") == 0
+
+
+def test_resolve_page_clamps_to_total_pages():
+    assert resolve_page(0, 5, 8) == (1, 1)
+    assert resolve_page(17, 5, 8) == (3, 3)
+    assert resolve_page(17, None, 8) == (1, 3)
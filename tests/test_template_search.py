@@ -0,0 +1,64 @@
+from app.extensions import db
+from app.models.plan import Template
+from app.services import search_service
+from app.services.db_service import PlanDBService
+
+
+def _index(template):
+    search_service.refresh_template_document(template)
+    db.session.commit()
+    return template
+
+
+def test_tokenize_builds_unigrams_and_bigrams_for_japanese():
+    assert search_service.tokenize("京都旅") == ["京", "都", "旅", "京都", "都旅"]
+    assert search_service.tokenize("京都旅", with_unigrams=False) == ["京都", "都旅"]
+    # 全角英数字・大文字小文字は正規化される
+    assert search_service.tokenize("ＵＳＪ", with_unigrams=False) == search_service.tokenize("usj", with_unigrams=False)
+
+
+def test_search_matches_title_note_tags_and_places(make_template, user):
+    _index(make_template(public_title="京都 紅葉めぐり"))
+    _index(make_template(public_title="週末旅", short_note="嵐山で川下り"))
+    _index(make_template(public_title="食い倒れ", tags="グルメ, 大阪"))
+    _index(make_template(
+        public_title="北の旅",
+        itinerary_outline_json=[{"day": 1, "details": [{"time": "09:00", "activity": "札幌時計台 見学"}]}],
+    ))
+
+    def titles(q):
+        templates, total = PlanDBService.search_templates(q, user_id=user.user_id)
+        assert total == len(templates)
+        return [t.public_title for t in templates]
+
+    assert titles("紅葉") == ["京都 紅葉めぐり"]
+    assert titles("嵐山") == ["週末旅"]
+    assert titles("グルメ") == ["食い倒れ"]
+    assert titles("時計台") == ["北の旅"]
+    assert titles("京") == ["京都 紅葉めぐり"]
+    assert titles("存在しない") == []
+
+
+def test_search_is_ranked_paginated_and_scoped(make_template, user):
+    _index(make_template(public_title="大阪", short_note="大阪 大阪 大阪城", visibility="public"))
+    _index(make_template(public_title="神戸", short_note="ついでに大阪", visibility="public"))
+    _index(make_template(public_title="大阪 非公開", visibility="private"))
+
+    public, total = PlanDBService.search_templates("大阪", public_only=True, per_page=1)
+    assert total == 2
+    assert [t.public_title for t in public] == ["大阪"]
+    second, _ = PlanDBService.search_templates("大阪", public_only=True, page=2, per_page=1)
+    assert [t.public_title for t in second] == ["神戸"]
+
+
+def test_save_template_keeps_index_up_to_date(make_template, user):
+    template = make_template(public_title="旧タイトル")
+    plan = template.plan
+
+    PlanDBService.save_template(plan, None, "沖縄 ダイビング")
+    assert [t.template_id for t in PlanDBService.search_templates("沖縄", user_id=user.user_id)[0]] == [template.template_id]
+    assert PlanDBService.search_templates("旧タイトル", user_id=user.user_id)[1] == 0
+
+    db.session.delete(db.session.get(Template, template.template_id))
+    db.session.commit()
+    assert PlanDBService.search_templates("沖縄", user_id=user.user_id)[1] == 0
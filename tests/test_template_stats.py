@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta
+
+from app.extensions import db
+from app.models.plan import TemplateStats
+from app.services.db_service import PlanDBService
+from app.services.stats_service import TemplateStatsBuffer
+
+
+def _buffer(app):
+    app.config.update(STATS_FLUSH_INTERVAL=0, STATS_HALF_LIFE_HOURS=72)
+    return TemplateStatsBuffer(app)
+
+
+def _public(make_template, title):
+    template = make_template(public_title=title, visibility="public")
+    template.stats = TemplateStats()
+    db.session.commit()
+    return template
+
+
+def test_events_are_buffered_until_flush(app, make_template):
+    buffer = _buffer(app)
+    template = _public(make_template, "A")
+
+    buffer.record_view(template.template_id)
+    buffer.record_view(template.template_id)
+    buffer.record_copy(template.template_id)
+    assert buffer.pending() == {template.template_id: [2, 1]}
+    assert db.session.get(TemplateStats, template.template_id).view_count == 0
+
+    assert buffer.flush() == 1
+    assert buffer.pending() == {}
+    db.session.expire_all()
+    stats = db.session.get(TemplateStats, template.template_id)
+    assert (stats.view_count, stats.copy_count) == (2, 1)
+    assert stats.score > 0
+
+
+def test_recent_events_outrank_old_ones(app, make_template):
+    buffer = _buffer(app)
+    old = _public(make_template, "昔の人気")
+    recent = _public(make_template, "最近の人気")
+    quiet = _public(make_template, "閲覧なし")
+    now = datetime(2026, 6, 1)
+
+    for _ in range(10):
+        buffer.record_view(old.template_id)
+    buffer.flush(now=now - timedelta(days=30))
+    for _ in range(2):
+        buffer.record_view(recent.template_id)
+    buffer.flush(now=now)
+
+    templates, _, _ = PlanDBService.get_public_templates_page(sort="popular")
+    assert [t.public_title for t in templates] == ["最近の人気", "昔の人気", "閲覧なし"]
+    assert quiet.stats.score == 0.0
+
+
+def test_popular_pages_walk_with_cursor(app, make_template):
+    buffer = _buffer(app)
+    templates = [_public(make_template, f"公開{i}") for i in range(5)]
+    for i, template in enumerate(templates):
+        for _ in range(i + 1):
+            buffer.record_view(template.template_id)
+    buffer.flush()
+
+    first, prev_cursor, next_cursor = PlanDBService.get_public_templates_page(per_page=2, sort="popular")
+    second, _, next_cursor_2 = PlanDBService.get_public_templates_page(next_cursor, per_page=2, sort="popular")
+    third, _, last = PlanDBService.get_public_templates_page(next_cursor_2, per_page=2, sort="popular")
+    walked = [t.public_title for t in first + second + third]
+    assert walked == ["公開4", "公開3", "公開2", "公開1", "公開0"]
+    assert prev_cursor is None and last is None
+
+
+def test_events_for_deleted_templates_are_dropped(app, make_template):
+    buffer = _buffer(app)
+    template = _public(make_template, "A")
+    buffer.record_view(template.template_id)
+    buffer.record_view(9999)
+
+    assert buffer.flush() == 1
+    assert db.session.get(TemplateStats, 9999) is None